@@ -0,0 +1,127 @@
+"""Cumulative replication acknowledgements.
+
+Replicas used to publish an ``update_confirmation`` on the status channel
+for every add, remove and tick. Nothing read them, but every replica still
+decoded them. Instead, each replica now writes the last seq it applied into
+the ``acks:<pond>`` hash every ACK_INTERVAL, and only when that seq changed.
+One ack covers everything up to it.
+
+The primary reads the whole hash at the same rate. From it the primary
+knows each live replica's lag: how many mutations behind it is, and how
+long ago the oldest mutation it has not applied was stamped.
+``caught_up_to`` is the highest seq every live replica has applied. When it
+advances, ``caught_up`` is emitted on replica.events, and
+wait_caught_up() blocks until it reaches a given seq.
+"""
+import threading
+import time
+
+ACK_INTERVAL = 0.5  # Seconds between ack reports, and between the primary's reads
+
+
+class Acknowledgements:
+    def __init__(self, replica, redis_client, interval=ACK_INTERVAL):
+        self.replica = replica
+        self.redis_client = redis_client
+        self.key = f"acks:{replica.name}"
+        self.interval = interval
+        self.reported = None
+        self.acked = {}  # Live replica id -> last seq it applied, as of the last read
+        self.caught_up_to = 0
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.counters = {"reports": 0, "reads": 0, "errors": 0}
+        replica.events.subscribe("member_left", self.forget)
+
+    def report(self):
+        """Tell the primary how far we got, if that moved since we last said"""
+        seq = self.replica.last_seq
+        if seq == self.reported or self.replica.is_primary:
+            return
+        self.redis_client.hset(self.key, self.replica.replica_id, seq)
+        self.reported = seq
+        self.counters["reports"] += 1
+
+    def read(self):
+        """Primary: fetch every replica's ack and work out what all of them have applied"""
+        acks = self.redis_client.hgetall(self.key)
+        self.counters["reads"] += 1
+        live = set(self.replica.known_replicas) - {self.replica.replica_id}
+        acked = {}
+        for member, seq in acks.items():
+            rid = member.decode("utf-8")
+            if rid in live:
+                acked[rid] = int(seq)
+        self.acked = acked
+        # A replica that has not acked anything yet has not caught up to anything
+        caught_up_to = min([acked.get(rid, 0) for rid in live] or [self.replica.last_seq])
+        with self.condition:
+            advanced = caught_up_to > self.caught_up_to
+            self.caught_up_to = caught_up_to
+            self.condition.notify_all()
+        if advanced:
+            self.replica.events.emit("caught_up", {"seq": caught_up_to, "replicas": len(live)})
+        return caught_up_to
+
+    def wait_caught_up(self, seq, timeout=None):
+        """Block until every live replica has applied seq, returns False on timeout"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.caught_up_to >= seq, timeout)
+
+    def lag(self):
+        """Per live replica: (mutations behind, seconds since the oldest one it has not applied)"""
+        replica = self.replica
+        now = time.time()
+        lags = {}
+        with replica.log_lock:
+            last_seq = replica.last_seq
+            log = replica.replication_log
+            oldest_seq = log[0][0]["seq"] if log else last_seq + 1
+            for rid, seq in self.acked.items():
+                behind = max(0, last_seq - seq)
+                seconds = 0.0
+                if behind and log:
+                    # Entries older than the log were stamped before its oldest one
+                    first_missing = log[min(max(0, seq + 1 - oldest_seq), len(log) - 1)][0]
+                    seconds = max(0.0, now - first_missing.get("timestamp", now))
+                lags[rid] = (behind, seconds)
+        return lags
+
+    def forget(self, data):
+        """Drop a departed replica's ack from the hash"""
+        if self.replica.is_primary:
+            self.redis_client.hdel(self.key, data["replica_id"])
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            time.sleep(self.interval)
+            if not self.running:
+                break
+            try:
+                self.report()
+                if self.replica.is_primary:
+                    self.read()
+                else:
+                    self.acked = {}
+            except Exception as e:
+                self.counters["errors"] += 1
+                print(f"Ack error: {e}")
+
+    def stop(self):
+        self.running = False
+
+    def stats(self):
+        lags = self.lag() if self.replica.is_primary else {}
+        return {
+            "caught_up_to": self.caught_up_to,
+            "replicas_acked": len(self.acked),
+            "max_lag": max((behind for behind, _ in lags.values()), default=0),
+            "max_lag_seconds": max((seconds for _, seconds in lags.values()), default=0.0),
+            **self.counters
+        }
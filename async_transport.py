@@ -0,0 +1,315 @@
+"""asyncio replication transport on redis.asyncio.
+
+One event loop thread owns the Redis connection:
+  - a reader task moves pub/sub messages into a bounded inbound queue;
+    when the replica falls behind and the queue is full, the reader stops
+    reading the socket (backpressure) and counts a stall
+  - a dispatcher thread drains the inbound queue into the replica handler,
+    so slow message handling never blocks the event loop
+  - a writer task pipelines everything queued for publishing per round trip;
+    producers never block, and get TransportBackpressure once the bounded
+    outbound queue is full
+
+Reconnects retry in a loop with exponential backoff and resubscribe, then
+call ``on_reconnect`` so the replica can catch up on anything missed.
+
+AsyncMqttClient offers the paho client calls PondReplica makes on top of
+aiomqtt (optional dependency) running on the same loop.
+"""
+import asyncio
+import queue
+import threading
+
+import redis.asyncio as aioredis
+
+from transport import TransportBackpressure, RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY
+
+INBOUND_QUEUE_SIZE = 10000
+OUTBOUND_QUEUE_SIZE = 10000
+MAX_FLUSH = 500  # Messages per pipelined write
+
+
+class AsyncioTransport:
+    name = "asyncio"
+
+    def __init__(self, channels, host="localhost", port=6379, client_factory=None,
+                 inbound_size=INBOUND_QUEUE_SIZE, outbound_size=OUTBOUND_QUEUE_SIZE):
+        self.channels = list(channels)
+        self.client_factory = client_factory or (lambda: aioredis.Redis(host=host, port=port))
+        self.inbound = queue.Queue(inbound_size)
+        self.outbound_size = outbound_size
+        self.outbound_slots = threading.BoundedSemaphore(outbound_size)
+        self.handler = None
+        self.on_reconnect = None
+        self.running = False
+        self.loop = None
+        self.counters = {
+            "published": 0, "received": 0, "reconnects": 0, "handler_errors": 0,
+            "inbound_stalls": 0, "outbound_rejected": 0, "flushes": 0, "publish_errors": 0
+        }
+
+    # Lifecycle
+
+    def start(self, handler, on_reconnect=None):
+        """Start the loop and dispatcher threads, returns once subscribed"""
+        self.handler = handler
+        self.on_reconnect = on_reconnect
+        self.running = True
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result(timeout=10)
+        threading.Thread(target=self._dispatch, daemon=True).start()
+
+    async def _start(self):
+        self.client = self.client_factory()
+        self.outbound = asyncio.Queue()
+        await self._subscribe()
+        self.tasks = [
+            asyncio.ensure_future(self._read()),
+            asyncio.ensure_future(self._write()),
+        ]
+
+    async def _subscribe(self):
+        self.pubsub = self.client.pubsub()
+        await self.pubsub.subscribe(*self.channels)
+
+    def close(self):
+        self.running = False
+        if self.loop is None:
+            return
+
+        async def shutdown():
+            for task in self.tasks:
+                task.cancel()
+            try:
+                await self.pubsub.aclose()
+                await self.client.aclose()
+            except Exception:
+                pass
+
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout=5)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.inbound.put(None)  # Wake the dispatcher
+
+    # Inbound
+
+    async def _read(self):
+        while self.running:
+            try:
+                while self.running:
+                    message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None:
+                        continue
+                    self.counters["received"] += 1
+                    item = (message["channel"].decode("utf-8"), message["data"])
+                    if self.inbound.full():
+                        # The replica is behind: stop reading until it catches up
+                        self.counters["inbound_stalls"] += 1
+                        while self.inbound.full() and self.running:
+                            await asyncio.sleep(0.001)
+                    self.inbound.put_nowait(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not self.running:
+                    return
+                print(f"Error in async replication listener: {e}")
+            await self._reconnect()
+
+    async def _reconnect(self):
+        """Resubscribe with exponential backoff, iteratively"""
+        delay = RECONNECT_MIN_DELAY
+        while self.running:
+            await asyncio.sleep(delay)
+            try:
+                try:
+                    await self.pubsub.aclose()
+                except Exception:
+                    pass
+                await self._subscribe()
+                break
+            except Exception as e:
+                print(f"Async replication reconnect failed: {e}")
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+        if self.running:
+            self.counters["reconnects"] += 1
+            if self.on_reconnect:
+                self.inbound.put(("__reconnect__", None))
+
+    def _dispatch(self):
+        while self.running:
+            item = self.inbound.get()
+            if item is None:
+                return
+            channel, payload = item
+            try:
+                if channel == "__reconnect__":
+                    self.on_reconnect()
+                else:
+                    self.handler(channel, payload)
+            except Exception as e:
+                self.counters["handler_errors"] += 1
+                print(f"Error handling message on {channel}: {e}")
+
+    # Outbound
+
+    def publish(self, channel, payload):
+        self.publish_many([(channel, payload)])
+
+    def publish_many(self, messages):
+        """Queue messages for the writer without blocking, or raise TransportBackpressure"""
+        acquired = 0
+        for _ in messages:
+            if not self.outbound_slots.acquire(blocking=False):
+                for _ in range(acquired):
+                    self.outbound_slots.release()
+                self.counters["outbound_rejected"] += len(messages)
+                raise TransportBackpressure(f"outbound queue full ({self.outbound_size} messages)")
+            acquired += 1
+        self.loop.call_soon_threadsafe(self._enqueue, messages)
+
+    def _enqueue(self, messages):
+        for message in messages:
+            self.outbound.put_nowait(message)
+
+    async def _write(self):
+        while True:
+            batch = [await self.outbound.get()]
+            while len(batch) < MAX_FLUSH and not self.outbound.empty():
+                batch.append(self.outbound.get_nowait())
+            delay = RECONNECT_MIN_DELAY
+            while True:
+                try:
+                    pipe = self.client.pipeline(transaction=False)
+                    for channel, payload in batch:
+                        pipe.publish(channel, payload)
+                    await pipe.execute()
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Hold the batch and retry; replicas fill any gap via catch-up anyway
+                    self.counters["publish_errors"] += 1
+                    print(f"Async publish failed, retrying: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, RECONNECT_MAX_DELAY)
+            self.counters["published"] += len(batch)
+            self.counters["flushes"] += 1
+            for _ in batch:
+                self.outbound_slots.release()
+
+    def stats(self):
+        return dict(
+            self.counters,
+            transport=self.name,
+            inbound_depth=self.inbound.qsize(),
+            outbound_depth=self.outbound.qsize() if self.loop else 0
+        )
+
+    def prune(self, live):
+        """Pub/sub keeps nothing in Redis per replica"""
+
+    def mqtt_client(self, *args, **kwargs):
+        """MQTT client factory for PondReplica, running on this transport's loop"""
+        return AsyncMqttClient(self.loop)
+
+
+class PublishResult:
+    """The part of paho's MQTTMessageInfo that callers use"""
+    def __init__(self, future):
+        self.future = future
+        self.rc = 0 if future is not None else 4  # 4 == MQTT_ERR_NO_CONN
+
+    def wait_for_publish(self, timeout=None):
+        if self.future is None:
+            raise RuntimeError("The client is not currently connected.")
+        self.future.result(timeout)
+
+    def is_published(self):
+        return self.future is not None and self.future.done() and self.future.exception() is None
+
+
+class AsyncMqttMessage:
+    def __init__(self, message):
+        self.topic = str(message.topic)
+        self.payload = message.payload
+        self.qos = message.qos
+        self.retain = message.retain
+        self.dup = False
+
+
+class AsyncMqttClient:
+    """paho-style facade over aiomqtt on an existing event loop"""
+    def __init__(self, loop):
+        import aiomqtt  # Optional, only needed when the primary uses the asyncio transport
+        self.aiomqtt = aiomqtt
+        self.loop = loop
+        self.client = None
+        self.username = None
+        self.password = None
+        self.subscriptions = {}
+        self.on_connect = None
+        self.on_message = None
+        self.running = False
+        self.task = None
+
+    def username_pw_set(self, username, password=None):
+        self.username = username
+        self.password = password
+
+    def connect(self, host, port=1883, keepalive=60):
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        return 0
+
+    def loop_start(self):
+        self.running = True
+        self.task = asyncio.run_coroutine_threadsafe(self._run(), self.loop)
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        self.running = False
+        if self.task:
+            self.task.cancel()
+
+    async def _run(self):
+        delay = RECONNECT_MIN_DELAY
+        while self.running:
+            try:
+                async with self.aiomqtt.Client(self.host, self.port, username=self.username,
+                                               password=self.password, keepalive=self.keepalive) as client:
+                    self.client = client
+                    delay = RECONNECT_MIN_DELAY
+                    for topic, qos in self.subscriptions.items():
+                        await client.subscribe(topic, qos)
+                    if self.on_connect:
+                        self.on_connect(self, None, {}, 0)
+                    async for message in client.messages:
+                        if self.on_message:
+                            self.on_message(self, None, AsyncMqttMessage(message))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Async MQTT connection lost: {e}")
+            self.client = None
+            if self.running:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def subscribe(self, topic, qos=0):
+        self.subscriptions[topic] = qos
+        if self.client is not None:
+            asyncio.run_coroutine_threadsafe(self.client.subscribe(topic, qos), self.loop)
+        return (0, 0)
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        if self.client is None:
+            return PublishResult(None)
+        future = asyncio.run_coroutine_threadsafe(self.client.publish(topic, payload, qos=qos, retain=retain), self.loop)
+        return PublishResult(future)
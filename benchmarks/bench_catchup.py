@@ -0,0 +1,113 @@
+"""Catch-up time of a replica after an outage, pub/sub versus Redis Streams.
+
+A primary ticks its pond at a high rate while one replica is disconnected
+for --outage seconds. The replica then reconnects the way its transport
+would (pub/sub resubscribes and asks the primary for a sync, a stream
+consumer resumes from its group) and we time how long it takes to reach
+the sequence number the primary had when it came back. The primary keeps
+ticking throughout.
+
+Usage:
+  python benchmarks/bench_catchup.py [--fish 1000] [--outage 30]
+      [--tick-interval 0.05] [--transports threaded,streams]
+      [--redis-url URL | --spawn-redis] [--json results.json]
+"""
+import argparse
+import json
+import time
+from collections import Counter
+
+from harness import (LocalBroker, redis_factory, start_cluster, stop_cluster, quiet, wait_until,
+                     CHANNELS)
+from pond import REPLICA_CHANNEL
+from transport import PubSubTransport, StreamTransport
+
+
+def make_transport(kind, new_redis, consumer):
+    if kind == "streams":
+        return StreamTransport(new_redis(), CHANNELS, consumer=consumer, durable=[REPLICA_CHANNEL])
+    return PubSubTransport(new_redis(), CHANNELS)
+
+
+def run(kind, args):
+    new_redis, cleanup = redis_factory(args.redis_url, args.spawn_redis)
+    broker = LocalBroker()
+    consumers = iter(["r00", "r01"])
+    replicas, join_s = start_cluster(2, new_redis, broker, seed_fish=args.fish,
+                                     new_transport=lambda: make_transport(kind, new_redis, next(consumers)))
+    primary, replica = replicas
+    primary.cell_capacity = 10 ** 9
+    primary.migration_probability = 0
+    received = Counter()
+    replica.events.subscribe("update_received", lambda data: received.update([data["type"]]))
+
+    def tick_for(seconds, until=None):
+        start = time.perf_counter()
+        next_tick = start
+        while time.perf_counter() - start < seconds and not (until and until()):
+            primary.update()
+            next_tick += args.tick_interval
+            time.sleep(max(0, next_tick - time.perf_counter()))
+        return time.perf_counter() - start
+
+    with quiet():
+        tick_for(1.0)
+        # Outage: the replica's connection goes away, the pond keeps moving
+        replica.transport.close()
+        seq_before = replica.last_seq
+        tick_for(args.outage)
+        missed = primary.last_seq - seq_before
+        received.clear()
+
+        # Reconnect and catch up while the primary keeps ticking
+        target = primary.last_seq
+        replica.transport = make_transport(kind, new_redis, "r01")
+        resumed = time.perf_counter()
+        replica.transport.start(replica.handle_message, on_reconnect=replica.request_state_synchronization)
+        if kind != "streams":
+            replica.request_state_synchronization()  # What PubSubTransport does after resubscribing
+        tick_for(120, until=lambda: replica.last_seq >= target)
+        caught_up = time.perf_counter() - resumed if replica.last_seq >= target else None
+        wait_until(lambda: replica.last_seq >= primary.last_seq, timeout=30)
+        consistent = sorted(replica.fish_dict) == sorted(primary.fish_dict)
+
+    stop_cluster(replicas)
+    cleanup()
+    return {
+        "transport": kind,
+        "fish": args.fish,
+        "outage_s": args.outage,
+        "join_s": join_s,
+        "missed_updates": missed,
+        "catch_up_s": caught_up,
+        "received": dict(received),
+        "consistent": consistent
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fish", type=int, default=1000)
+    parser.add_argument("--outage", type=float, default=30.0, help="seconds the replica is disconnected")
+    parser.add_argument("--tick-interval", type=float, default=0.05, help="primary tick period")
+    parser.add_argument("--transports", default="threaded,streams")
+    parser.add_argument("--redis-url", help="use this Redis server instead of fakeredis")
+    parser.add_argument("--spawn-redis", action="store_true", help="spawn a local redis-server")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for kind in args.transports.split(","):
+        row = run(kind, args)
+        results.append(row)
+        catch_up = f"{row['catch_up_s']:.2f} s" if row["catch_up_s"] is not None else "timed out"
+        print(f"{kind:<9} missed {row['missed_updates']:>6} updates  catch-up {catch_up:>10}  "
+              f"via {row['received']}  consistent {row['consistent']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
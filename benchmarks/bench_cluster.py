@@ -0,0 +1,122 @@
+"""Tick time, channel traffic and convergence latency of an in-process cluster.
+
+Sweeps fish count and replica count. For each point it reports:
+  - update() time on the primary (median and p95)
+  - messages and bytes per second on each Redis channel while ticking
+  - join time for replicas syncing a pond of that size
+  - drain time after the last tick until every replica applied it, and
+    until the primary's cumulative acks said so
+  - convergence latency: add_fish on one replica until the fish is in
+    fish_dict on every other replica
+
+Usage:
+  python benchmarks/bench_cluster.py [--fish 10,100,1000,10000,100000]
+      [--replicas 1,2,4,8,16] [--duration 3] [--redis-url URL | --spawn-redis]
+      [--json results.json]
+"""
+import argparse
+import json
+import statistics
+import time
+
+from harness import (LocalBroker, ChannelMeter, redis_factory, start_cluster, stop_cluster,
+                     quiet, wait_until)
+from engine import TICK_INTERVAL
+from pond import Fish, POND_NAME
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+
+def run_point(fish_count, replica_count, args):
+    new_redis, cleanup = redis_factory(args.redis_url, args.spawn_redis)
+    broker = LocalBroker()
+    replicas, join_s = start_cluster(replica_count, new_redis, broker, seed_fish=fish_count)
+    primary = replicas[0]
+    primary.cell_capacity = 10 ** 9  # Keep the pond at a steady size while measuring
+    primary.migration_probability = 0
+    meter = ChannelMeter(new_redis())
+    time.sleep(0.2)
+
+    tick_times = []
+    start = time.perf_counter()
+    next_tick = start
+    with quiet():
+        while time.perf_counter() - start < args.duration:
+            tick_start = time.perf_counter()
+            primary.update()
+            tick_times.append(time.perf_counter() - tick_start)
+            next_tick += args.tick_interval
+            time.sleep(max(0, next_tick - time.perf_counter()))
+        ticked = time.perf_counter()
+        drained = wait_until(lambda: all(r.last_seq >= primary.last_seq for r in replicas), timeout=120)
+        acked_s = time.perf_counter() - ticked if primary.acks.wait_caught_up(primary.last_seq, 120) else None
+    elapsed = time.perf_counter() - start
+    traffic = meter.snapshot()
+    meter.close()
+
+    convergence = []
+    if replica_count > 1:
+        for i in range(args.samples):
+            origin = replicas[i % replica_count]
+            fish = Fish(f"Probe{i}", POND_NAME, 10 ** 6)
+            others = [r for r in replicas if r is not origin]
+            with quiet():
+                sent = time.perf_counter()
+                origin.add_fish(fish)
+                waited = wait_until(lambda: all(fish.id in r.fish_dict for r in others), timeout=30)
+            if waited is not None:
+                convergence.append(time.perf_counter() - sent)
+
+    stop_cluster(replicas)
+    cleanup()
+    return {
+        "fish": fish_count,
+        "replicas": replica_count,
+        "join_s": join_s,
+        "ticks": len(tick_times),
+        "tick_ms_median": statistics.median(tick_times) * 1e3,
+        "tick_ms_p95": percentile(tick_times, 0.95) * 1e3,
+        "drain_s": drained,
+        "acked_s": acked_s,
+        "messages_per_s": {ch: n / elapsed for ch, n in traffic["messages"].items()},
+        "bytes_per_s": {ch: n / elapsed for ch, n in traffic["bytes"].items()},
+        "convergence_ms_median": statistics.median(convergence) * 1e3 if convergence else None,
+        "convergence_ms_p95": percentile(convergence, 0.95) * 1e3 if convergence else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fish", default="10,100,1000,10000,100000")
+    parser.add_argument("--replicas", default="1,2,4,8,16")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds of ticking per point")
+    parser.add_argument("--tick-interval", type=float, default=TICK_INTERVAL)
+    parser.add_argument("--samples", type=int, default=10, help="convergence probes per point")
+    parser.add_argument("--redis-url", help="use this Redis server instead of fakeredis")
+    parser.add_argument("--spawn-redis", action="store_true", help="spawn a local redis-server")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for fish_count in [int(n) for n in args.fish.split(",")]:
+        for replica_count in [int(n) for n in args.replicas.split(",")]:
+            row = run_point(fish_count, replica_count, args)
+            results.append(row)
+            bytes_total = sum(row["bytes_per_s"].values())
+            convergence = row["convergence_ms_median"]
+            print(f"{fish_count:>7} fish x {replica_count:>2} replicas: "
+                  f"tick {row['tick_ms_median']:8.2f} ms (p95 {row['tick_ms_p95']:.2f}) | "
+                  f"{sum(row['messages_per_s'].values()):7.1f} msg/s {bytes_total / 1024:9.1f} KiB/s | "
+                  f"drained {row['drain_s']:.3f} s, acked {row['acked_s']:.3f} s | "
+                  f"converge {'-' if convergence is None else f'{convergence:.2f} ms'}", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Bytes per message and encode/decode cost of each wire codec.
+
+Usage: python benchmarks/bench_codec.py [--fish 1000] [--json results.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import timeit
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import codec
+
+
+def make_fish():
+    return {
+        "id": str(uuid.uuid4()),
+        "name": f"Fish{random.randint(1000, 9999)}",
+        "genesis_pond": random.choice(["Honey Lemon", "NetLink", "DC_Universe", "Parallel"]),
+        "remaining_lifetime": random.randint(1, 15),
+        "position": (random.randint(0, 550), random.randint(0, 350))
+    }
+
+
+def make_messages(fish_count):
+    fish = [make_fish() for _ in range(fish_count)]
+    return {
+        "add_fish": {
+            "type": "add_fish",
+            "replica_id": "a1b2c3d4",
+            "timestamp": time.time(),
+            "fish": fish[0],
+            "source": "primary"
+        },
+        "remove_fish": {
+            "type": "remove_fish",
+            "replica_id": "a1b2c3d4",
+            "timestamp": time.time(),
+            "fish_id": fish[0]["id"],
+            "source": "primary"
+        },
+        "mqtt_message": {
+            "type": "mqtt_message",
+            "topic": "user/Honey Lemon",
+            "payload": {"name": "Nemo", "group_name": "NetLink", "lifetime": 15}
+        },
+        f"tick_delta[{fish_count}]": {
+            "type": "tick_delta",
+            "replica_id": "a1b2c3d4",
+            "version": 42,
+            "timestamp": time.time(),
+            "updates": [[f["id"], f["remaining_lifetime"], *f["position"]] for f in fish],
+            "removed": [],
+            "migrated": []
+        },
+        f"full_state[{fish_count}]": {
+            "type": "full_state",
+            "replica_id": "a1b2c3d4",
+            "timestamp": time.time(),
+            "fish": fish,
+            "target_replica": None
+        }
+    }
+
+
+def measure(wire_codec, message, number):
+    payload = wire_codec.encode(message)
+    encode_s = min(timeit.repeat(lambda: wire_codec.encode(message), number=number, repeat=3)) / number
+    decode_s = min(timeit.repeat(lambda: codec.decode(payload), number=number, repeat=3)) / number
+    return {"bytes": len(payload), "encode_us": encode_s * 1e6, "decode_us": decode_s * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fish", type=int, default=1000, help="fish in the bulk messages")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for kind, message in make_messages(args.fish).items():
+        number = 20 if "[" in kind else 2000
+        for name in codec.supported_codecs():
+            row = {"message": kind, "codec": name, **measure(codec.CODECS[name], message, number)}
+            results.append(row)
+            print(f"{kind:<22} {name:<8} {row['bytes']:>9} B "
+                  f"{row['encode_us']:>10.1f} us enc {row['decode_us']:>10.1f} us dec")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Failover time and split-brain windows of the lease-based election, under injected faults.
+
+Every trial starts a fresh cluster with all replicas ticking, injects one
+fault into the primary, and samples every replica's role each millisecond:
+  crash      the primary stops dead: no renewals, no release, no messages
+  partition  the primary's lease renewals fail as if Redis were unreachable,
+             but it keeps ticking and its replication traffic still flows
+  stall      the primary freezes for longer than its lease, as in a long GC
+             pause: renewals fail and what it publishes arrives afterwards
+  steal      another replica takes the lease with force from a healthy primary
+  handoff    the primary shuts down cleanly and frees its lease
+
+It reports, per scenario:
+  - failover time: fault until another replica is primary with its MQTT client up
+  - split-brain windows: sampled stretches in which two live replicas both
+    acted as primary, and their total length
+  - fenced messages: replication messages from the old primary that replicas
+    dropped because they carried an older epoch
+  - declarations: primary_declaration messages sent during the failover
+
+Usage:
+  python benchmarks/bench_failover.py [--replicas 5] [--trials 5]
+      [--scenarios crash,partition,stall,steal,handoff] [--redis-url URL | --spawn-redis] [--json results.json]
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+
+import redis
+
+from harness import LocalBroker, redis_factory, start_cluster, stop_cluster, quiet, wait_until
+from election import LEASE_MS
+from engine import PondEngine
+
+TICK_INTERVAL = 0.1  # Fast ticks, so a primary that should have stopped keeps trying to write
+
+
+class Unreachable:
+    """A Redis client whose every call fails, for the partitioned primary's election"""
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise redis.ConnectionError("injected partition")
+        return fail
+
+
+class Delayed:
+    """Wraps a transport so everything published reaches Redis only after a delay"""
+    def __init__(self, transport, delay):
+        self.transport = transport
+        self.release_at = time.perf_counter() + delay
+
+    def hold(self):
+        time.sleep(max(0, self.release_at - time.perf_counter()))
+
+    def publish(self, channel, payload):
+        threading.Thread(target=lambda: (self.hold(), self.transport.publish(channel, payload)), daemon=True).start()
+
+    def publish_many(self, messages):
+        threading.Thread(target=lambda: (self.hold(), self.transport.publish_many(messages)), daemon=True).start()
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+
+class RoleSampler:
+    """Samples which live replicas act as primary and records the stretches with more than one"""
+    def __init__(self, replicas, interval=0.001):
+        self.replicas = replicas
+        self.interval = interval
+        self.dead = set()
+        self.windows = []
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        started = None
+        while self.running:
+            primaries = [r for r in self.replicas if r.replica_id not in self.dead and r.is_primary]
+            now = time.perf_counter()
+            if len(primaries) > 1 and started is None:
+                started = now
+            elif len(primaries) <= 1 and started is not None:
+                self.windows.append(now - started)
+                started = None
+            time.sleep(self.interval)
+        if started is not None:
+            self.windows.append(time.perf_counter() - started)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+
+def inject(scenario, old, replicas, engines):
+    if scenario == "crash":
+        old.election.running = False
+        old.election.wake.set()
+        old.membership.running = False
+        old.transport.close()
+        engines[old.replica_id].stop()
+    elif scenario == "partition":
+        old.election.redis_client = Unreachable()
+    elif scenario == "stall":
+        old.election.redis_client = Unreachable()
+        old.transport = Delayed(old.transport, old.election.lease_ms / 1000 + 1)
+    elif scenario == "steal":
+        next(r for r in replicas if r is not old).declare_primary(force=True)
+    elif scenario == "handoff":
+        engines[old.replica_id].stop()
+        old.close()
+
+
+def new_primary(replicas, old):
+    return next((r for r in replicas if r is not old and r.is_primary and r.mqtt_client), None)
+
+
+def fenced(replicas):
+    return sum(r.metrics.fenced_total.values.get((), 0) for r in replicas)
+
+
+def run_trial(scenario, args):
+    new_redis, cleanup = redis_factory(args.redis_url, args.spawn_redis)
+    with quiet():
+        replicas, _ = start_cluster(args.replicas, new_redis, LocalBroker(), seed_fish=args.fish, lease_ms=LEASE_MS)
+        for replica in replicas:
+            replica.cell_capacity = 10 ** 9
+            replica.migration_probability = 0
+        engines = {r.replica_id: PondEngine(r, TICK_INTERVAL) for r in replicas}
+        for engine in engines.values():
+            engine.start()
+        wait_until(lambda: all(len(r.known_replicas) == len(replicas) for r in replicas), timeout=30)
+        time.sleep(1)
+
+        old = replicas[0]
+        declarations = []
+        replicas[-1].events.subscribe("status_update", lambda data: declarations.append(data)
+                                      if data.get("type") == "primary_declaration" else None)
+        sampler = RoleSampler(replicas)
+        fenced_before = fenced(replicas)
+        time.sleep(0.2)
+        if scenario in ("crash", "handoff"):
+            sampler.dead.add(old.replica_id)
+        start = time.perf_counter()
+        inject(scenario, old, replicas, engines)
+        failover = wait_until(lambda: new_primary(replicas, old) is not None, timeout=30)
+        if failover is not None:
+            failover = time.perf_counter() - start
+        # Let the old primary run into its deadline and the fencing settle
+        time.sleep(old.election.lease_ms / 1000 + 1.5)
+        sampler.stop()
+        live = [r for r in replicas if r.replica_id not in sampler.dead]
+        result = {
+            "failover_s": failover,
+            "split_brain_windows": len(sampler.windows),
+            "split_brain_ms": sum(sampler.windows) * 1000,
+            "fenced": fenced(live) - fenced_before,
+            "declarations": len(declarations),
+            "primaries_after": sum(r.is_primary for r in live)
+        }
+        for engine in engines.values():
+            engine.stop()
+        stop_cluster([r for r in replicas if not (scenario in ("crash", "handoff") and r is old)])
+    cleanup()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replicas", type=int, default=5)
+    parser.add_argument("--fish", type=int, default=200)
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--scenarios", default="crash,partition,stall,steal,handoff")
+    parser.add_argument("--redis-url", help="use this Redis server instead of fakeredis")
+    parser.add_argument("--spawn-redis", action="store_true", help="spawn a local redis-server")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for scenario in args.scenarios.split(","):
+        trials = [run_trial(scenario, args) for _ in range(args.trials)]
+        times = [t["failover_s"] for t in trials if t["failover_s"] is not None]
+        row = {
+            "scenario": scenario,
+            "failover_s_median": statistics.median(times) if times else None,
+            "failover_s_max": max(times) if times else None,
+            "failed_over": len(times),
+            "split_brain_windows": sum(t["split_brain_windows"] for t in trials),
+            "split_brain_ms": sum(t["split_brain_ms"] for t in trials),
+            "fenced": sum(t["fenced"] for t in trials),
+            "declarations_max": max(t["declarations"] for t in trials),
+            "single_primary_after": sum(t["primaries_after"] == 1 for t in trials),
+            "trials": trials
+        }
+        results.append(row)
+        failover = (f"{row['failover_s_median']:5.2f} s median / {row['failover_s_max']:5.2f} s max"
+                    if times else "never")
+        print(f"{scenario:>9}: failover {failover} ({row['failed_over']}/{args.trials}) | "
+              f"split-brain {row['split_brain_windows']} window(s), {row['split_brain_ms']:6.1f} ms | "
+              f"{row['fenced']} fenced message(s) | <= {row['declarations_max']} declaration(s) | "
+              f"one primary after {row['single_primary_after']}/{args.trials}", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
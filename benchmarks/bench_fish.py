@@ -0,0 +1,198 @@
+"""Memory and serialization cost per fish: slotted, cached Fish against the old __dict__ Fish.
+
+For each pond size it reports:
+  - bytes allocated per detached fish, and per fish attached to a FishStore
+  - to_dict() per fish, the first time and again with nothing changed
+  - from_dict() per fish
+  - encoding a full_state of the whole pond with each codec, the first time
+    and again after no tick (several replicas asking for state at once),
+    plus after a tick has aged every fish
+
+Usage:
+  python benchmarks/bench_fish.py [--sizes 1000,10000,100000] [--json results.json]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import codec
+from fish_store import FishStore
+from pond import Fish
+
+PONDS = ["Honey Lemon", "NetLink", "DC_Universe", "Parallel"]
+
+
+class DictFish:
+    """The Fish before slots and caching: every call builds its dict afresh"""
+    def __init__(self, name, genesis_pond, remaining_lifetime, fish_id=None, position=None):
+        self._store = None
+        self._slot = -1
+        self.id = fish_id or str(uuid.uuid4())
+        self.name = name
+        self.genesis_pond = genesis_pond
+        self.remaining_lifetime = remaining_lifetime
+        self.position = position
+
+    @property
+    def position(self):
+        if self._store is not None:
+            return (int(self._store.x[self._slot]), int(self._store.y[self._slot]))
+        return self._position
+
+    @position.setter
+    def position(self, position):
+        if self._store is not None:
+            self._store.move(self._slot, *position)
+        else:
+            self._position = tuple(position)
+
+    @property
+    def remaining_lifetime(self):
+        if self._store is not None:
+            return int(self._store.lifetime[self._slot])
+        return self._remaining_lifetime
+
+    @remaining_lifetime.setter
+    def remaining_lifetime(self, remaining_lifetime):
+        if self._store is not None:
+            self._store.lifetime[self._slot] = remaining_lifetime
+        else:
+            self._remaining_lifetime = remaining_lifetime
+
+    def attach(self, store, slot):
+        self._store = store
+        self._slot = slot
+
+    def detach(self):
+        if self._store is not None:
+            self._position = self.position
+            self._remaining_lifetime = self.remaining_lifetime
+            self._store = None
+            self._slot = -1
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "genesis_pond": self.genesis_pond,
+            "remaining_lifetime": self.remaining_lifetime,
+            "position": self.position
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(name=data["name"], genesis_pond=data["genesis_pond"], remaining_lifetime=data["remaining_lifetime"],
+                   fish_id=data["id"], position=tuple(data["position"]))
+
+
+def records(n):
+    """Fish as they arrive in messages: every string a fresh object, as after decoding"""
+    return [{
+        "id": str(uuid.uuid4()),
+        "name": f"Fish{i % 9000 + 1000}",
+        "genesis_pond": "".join(PONDS[i % len(PONDS)]),
+        "remaining_lifetime": 15,
+        "position": [i % 550, i % 350]
+    } for i in range(n)]
+
+
+def allocated_per_fish(build, n):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / n
+
+
+def best_of(fn, setup=None, repeat=5):
+    """Fastest of several runs of fn(), calling setup() untimed before each"""
+    best = float("inf")
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def full_state(wire, fish, old):
+    """What send_state does: the old one built a dict per fish, the new one hands the codec the fish"""
+    wire.encode({"type": "full_state", "replica_id": "r00", "timestamp": time.time(), "last_seq": 1,
+                 "fish": [f.to_dict() for f in fish] if old else list(fish), "epoch": 1, "target_replica": None})
+
+
+def run_size(n):
+    data = records(n)
+    row = {"fish": n}
+    for label, cls in (("old", DictFish), ("new", Fish)):
+        old = cls is DictFish
+        # The decoded messages are dropped once the fish exist, as in the listener
+        row[f"{label}_bytes_detached"] = allocated_per_fish(lambda: [cls.from_dict(d) for d in records(n)], n)
+
+        def attached(source):
+            store = FishStore()
+            for d in source:
+                store.add(cls.from_dict(d))
+            return store
+        # The columns are the same for both; the difference is in the views
+        row[f"{label}_bytes_attached"] = allocated_per_fish(lambda: attached(records(n)), n)
+
+        row[f"{label}_from_dict_us"] = best_of(lambda: [cls.from_dict(d) for d in data]) / n * 1e6
+        store = attached(data)
+        fish = list(store.fish)
+
+        def cold():
+            if not old:
+                for f in fish:
+                    f._dict = f._record = None  # As for fish never serialized
+
+        def tick():
+            store.lifetime[:len(store)] -= 1
+        row[f"{label}_to_dict_first_us"] = best_of(lambda: [f.to_dict() for f in fish], cold) / n * 1e6
+        row[f"{label}_to_dict_again_us"] = best_of(lambda: [f.to_dict() for f in fish]) / n * 1e6
+        for wire in codec.CODECS.values():
+            row[f"{label}_{wire.name}_first_ms"] = best_of(lambda: full_state(wire, fish, old), cold) * 1000
+            row[f"{label}_{wire.name}_again_ms"] = best_of(lambda: full_state(wire, fish, old)) * 1000
+            row[f"{label}_{wire.name}_after_tick_ms"] = best_of(lambda: full_state(wire, fish, old), tick) * 1000
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for n in [int(s) for s in args.sizes.split(",")]:
+        row = run_size(n)
+        results.append(row)
+        print(f"{n} fish", flush=True)
+        for label in ("old", "new"):
+            print(f"  {label}: {row[f'{label}_bytes_detached']:6.0f} B detached, "
+                  f"{row[f'{label}_bytes_attached']:6.0f} B attached | "
+                  f"from_dict {row[f'{label}_from_dict_us']:5.2f} us | to_dict {row[f'{label}_to_dict_first_us']:5.2f} us, "
+                  f"again {row[f'{label}_to_dict_again_us']:5.2f} us", flush=True)
+            for wire in codec.CODECS.values():
+                print(f"    full_state {wire.name:<9} {row[f'{label}_{wire.name}_first_ms']:8.1f} ms, "
+                      f"again {row[f'{label}_{wire.name}_again_ms']:8.1f} ms, "
+                      f"after a tick {row[f'{label}_{wire.name}_after_tick_ms']:8.1f} ms", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Message amplification of fish arriving over MQTT.
+
+Starts a cluster, has a peer pond send --arrivals fish to user/<pond>, and
+counts what that costs on the Redis channels once the cluster settles:
+messages published per arrival, deliveries per arrival (every replica
+receives every message), and how many fish each replica ends up holding.
+With --redeliver a share of the arrivals is sent a second time, as a
+QoS 1 broker would after a lost ack.
+
+Usage:
+  python benchmarks/bench_ingest.py [--arrivals 200] [--replicas 1,2,4,8]
+      [--redeliver 0.0] [--redis-url URL | --spawn-redis] [--json results.json]
+"""
+import argparse
+import json
+import random
+import time
+
+from harness import LocalBroker, ChannelMeter, redis_factory, start_cluster, stop_cluster, quiet, wait_until
+from pond import POND_NAME
+
+
+def run_point(replica_count, args):
+    new_redis, cleanup = redis_factory(args.redis_url, args.spawn_redis)
+    broker = LocalBroker()
+    replicas, _ = start_cluster(replica_count, new_redis, broker)
+    primary = replicas[0]
+    meter = ChannelMeter(new_redis())
+    time.sleep(0.5)
+    baseline = meter.snapshot()["messages"]
+
+    peer = broker.client()
+    messages = [
+        {"id": f"peer-{i}", "name": f"Visitor{i}", "group_name": "NetLink", "lifetime": 10 ** 6}
+        for i in range(args.arrivals)
+    ]
+    resent = random.sample(messages, int(len(messages) * args.redeliver))
+    with quiet():
+        for message in messages + resent:
+            peer.publish(f"user/{POND_NAME}", json.dumps(message))
+        wait_until(lambda: all(len(r.fish_list) >= args.arrivals for r in replicas), timeout=60)
+        # Let any echoes and re-publishes run their course
+        settled = meter.snapshot()["messages"]
+        while True:
+            time.sleep(1.0)
+            now = meter.snapshot()["messages"]
+            if now == settled:
+                break
+            settled = now
+    meter.close()
+
+    published = sum(settled.values()) - sum(baseline.get(ch, 0) for ch in settled)
+    fish_counts = [len(r.fish_list) for r in replicas]
+    stop_cluster(replicas)
+    cleanup()
+    return {
+        "replicas": replica_count,
+        "arrivals": args.arrivals,
+        "redelivered": len(resent),
+        "published_per_arrival": published / args.arrivals,
+        "deliveries_per_arrival": published * replica_count / args.arrivals,
+        "fish_min": min(fish_counts),
+        "fish_max": max(fish_counts)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--arrivals", type=int, default=200)
+    parser.add_argument("--replicas", default="1,2,4,8")
+    parser.add_argument("--redeliver", type=float, default=0.0, help="share of arrivals sent twice")
+    parser.add_argument("--redis-url", help="use this Redis server instead of fakeredis")
+    parser.add_argument("--spawn-redis", action="store_true", help="spawn a local redis-server")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for replica_count in [int(n) for n in args.replicas.split(",")]:
+        row = run_point(replica_count, args)
+        results.append(row)
+        print(f"{replica_count:>2} replicas: {row['published_per_arrival']:6.2f} msgs/arrival, "
+              f"{row['deliveries_per_arrival']:7.2f} deliveries/arrival, "
+              f"fish per replica {row['fish_min']}..{row['fish_max']} (expected {args.arrivals})", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
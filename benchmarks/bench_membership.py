@@ -0,0 +1,100 @@
+"""Cost of keeping track of who is in the cluster, as the cluster grows.
+
+Starts --replicas replicas in this process and, once every replica sees all
+of them, measures for --duration seconds with nothing else going on:
+  - messages and bytes per second on the status channel, and the
+    deliveries that fan out to every subscribed replica
+  - CPU seconds the whole process burns per wall second
+  - membership round trips to Redis per second (lease refreshes and reads)
+Then it closes one replica and times how long the others take to drop it.
+
+Usage:
+  python benchmarks/bench_membership.py [--replicas 10,50,100,150] [--duration 10]
+      [--redis-url URL | --spawn-redis] [--json results.json]
+"""
+import argparse
+import json
+import time
+
+from harness import LocalBroker, ChannelMeter, redis_factory, start_cluster, stop_cluster, quiet, wait_until
+from pond import STATUS_CHANNEL
+
+
+def round_trips(replicas):
+    return sum(r.membership.counters["refreshes"] + r.membership.counters["reads"] for r in replicas)
+
+
+def run_point(replica_count, args):
+    new_redis, cleanup = redis_factory(args.redis_url, args.spawn_redis)
+    with quiet():
+        start = time.perf_counter()
+        replicas, _ = start_cluster(replica_count, new_redis, LocalBroker())
+        converged = wait_until(lambda: all(len(r.known_replicas) == replica_count for r in replicas),
+                               timeout=60, interval=0.05)
+        converge_s = time.perf_counter() - start if converged is not None else None
+
+        meter = ChannelMeter(new_redis())
+        time.sleep(0.5)
+        before = meter.snapshot()
+        trips_before = round_trips(replicas)
+        cpu_before, wall_before = time.process_time(), time.perf_counter()
+        time.sleep(args.duration)
+        elapsed = time.perf_counter() - wall_before
+        cpu = (time.process_time() - cpu_before) / elapsed
+        trips = (round_trips(replicas) - trips_before) / elapsed
+        after = meter.snapshot()
+        meter.close()
+
+        # A clean shutdown gives up the lease, so peers notice on their next read
+        leaving = replicas.pop()
+        leaving.close()
+        left_s = wait_until(lambda: all(leaving.replica_id not in r.known_replicas for r in replicas),
+                            timeout=30, interval=0.05)
+        primaries = sum(r.is_primary for r in replicas)
+        stop_cluster(replicas)
+    cleanup()
+
+    return {
+        "replicas": replica_count,
+        "converge_s": converge_s,
+        "status_messages_per_s": (after["messages"].get(STATUS_CHANNEL, 0)
+                                  - before["messages"].get(STATUS_CHANNEL, 0)) / elapsed,
+        "status_deliveries_per_s": (after["messages"].get(STATUS_CHANNEL, 0)
+                                    - before["messages"].get(STATUS_CHANNEL, 0)) / elapsed * replica_count,
+        "status_bytes_per_s": (after["bytes"].get(STATUS_CHANNEL, 0)
+                               - before["bytes"].get(STATUS_CHANNEL, 0)) / elapsed,
+        "cpu_per_s": cpu,
+        "redis_round_trips_per_s": trips,
+        "leave_detected_s": left_s,
+        "primaries": primaries
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replicas", default="10,50,100,150")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--redis-url", help="use this Redis server instead of fakeredis")
+    parser.add_argument("--spawn-redis", action="store_true", help="spawn a local redis-server")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for replica_count in [int(n) for n in args.replicas.split(",")]:
+        row = run_point(replica_count, args)
+        results.append(row)
+        converge = f"{row['converge_s']:5.1f} s" if row["converge_s"] is not None else "  never"
+        left = f"{row['leave_detected_s']:5.1f} s" if row["leave_detected_s"] is not None else "  never"
+        print(f"{replica_count:>4} replicas: all seen in {converge} | status channel "
+              f"{row['status_messages_per_s']:7.1f} msg/s {row['status_bytes_per_s'] / 1e3:8.1f} kB/s "
+              f"({row['status_deliveries_per_s']:8.1f} deliveries/s) | "
+              f"CPU {row['cpu_per_s']:5.2f} s/s | {row['redis_round_trips_per_s']:6.1f} membership round trips/s | "
+              f"leave seen in {left} | {row['primaries']} primary", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
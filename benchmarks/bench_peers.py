@@ -0,0 +1,144 @@
+"""Ingestion throughput and arrival-to-visibility time under synthetic neighbour ponds.
+
+Starts a ticking cluster on the in-process broker and points loadgen's
+simulated peer ponds at it. For each total arrival rate in --rates it runs
+for --duration seconds and reports:
+  - fish sent and fish the primary ingested per second
+  - time from a fish being sent until the primary replicated it
+  - time until it was present on every replica, polled directly from the
+    replicas' stores, and as loadgen's VisibilityProbe sees it from Redis
+    through the acks (rounded up by the ack interval)
+  - fish our pond sent out that the simulated peers absorbed
+
+Usage:
+  python benchmarks/bench_peers.py [--rates 50,200,1000] [--peers 3] [--batch 1] [--replicas 3]
+      [--duration 10] [--redis-url URL | --spawn-redis] [--json results.json]
+"""
+import argparse
+import json
+import threading
+import time
+
+from harness import LocalBroker, redis_factory, start_cluster, stop_cluster, quiet
+from engine import PondEngine
+from ingest import derived_fish_id
+from loadgen import LoadGenerator, PeerPond, VisibilityProbe, peer_names, percentile
+
+
+class StorePoller:
+    """Times when each sent fish is first present on every replica"""
+    def __init__(self, replicas, interval=0.002):
+        self.replicas = replicas
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.waiting = {}  # Derived fish id -> when it was sent
+        self.latencies = []
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def sent(self, messages, sent_at):
+        with self.lock:
+            for message in messages:
+                self.waiting[derived_fish_id(message)] = sent_at
+
+    def run(self):
+        while self.running:
+            time.sleep(self.interval)
+            with self.lock:
+                waiting = list(self.waiting.items())
+            now = time.time()
+            seen = [(fish_id, sent_at) for fish_id, sent_at in waiting
+                    if all(fish_id in r.fish_dict for r in self.replicas)]
+            with self.lock:
+                for fish_id, sent_at in seen:
+                    del self.waiting[fish_id]
+                    self.latencies.append(now - sent_at)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+
+def run_point(rate, args):
+    new_redis, cleanup = redis_factory(args.redis_url, args.spawn_redis)
+    broker = LocalBroker()
+    with quiet():
+        replicas, _ = start_cluster(args.replicas, new_redis, broker)
+        engines = [PondEngine(r) for r in replicas]
+        for engine in engines:
+            engine.start()
+        time.sleep(1)
+
+        poller = StorePoller(replicas)
+        probe = VisibilityProbe(new_redis())
+        probe.start()
+        peers = [PeerPond(name, rate / args.peers, args.batch, (10 ** 5, 10 ** 5))
+                 for name in peer_names(args.peers)]
+
+        def sent(messages, sent_at):
+            poller.sent(messages, sent_at)
+            probe.sent(messages, sent_at)
+        client = broker.client()
+        client.connect("localhost")
+        generator = LoadGenerator(client, peers, on_sent=sent)
+        generator.start()
+        time.sleep(args.duration)
+        generator.stop()
+        time.sleep(3)  # Let the tail land and be acked
+        sent_stats = generator.stats()
+        seen = probe.stats()
+        poller.stop()
+        probe.stop()
+        for engine in engines:
+            engine.stop()
+        stop_cluster(replicas)
+    cleanup()
+    return {
+        "rate": rate,
+        "fish_sent": sent_stats["fish_sent"],
+        "sent_per_s": sent_stats["fish_sent"] / args.duration,
+        "ingested": seen["ingested"],
+        "ingested_per_s": seen["ingested_per_s"],
+        "ingest_p50_ms": seen["ingest_p50_ms"],
+        "ingest_p99_ms": seen["ingest_p99_ms"],
+        "visible_p50_ms": percentile(poller.latencies, 0.50) * 1000,
+        "visible_p99_ms": percentile(poller.latencies, 0.99) * 1000,
+        "visible_max_ms": max(poller.latencies, default=0.0) * 1000,
+        "never_visible": len(poller.waiting),
+        "acked_visible_p50_ms": seen["visible_p50_ms"],
+        "acked_visible_p99_ms": seen["visible_p99_ms"],
+        "absorbed": sent_stats["fish_absorbed"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rates", default="50,200,1000", help="total fish per second across all peers")
+    parser.add_argument("--peers", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=1, help="fish per message")
+    parser.add_argument("--replicas", type=int, default=3)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--redis-url", help="use this Redis server instead of fakeredis")
+    parser.add_argument("--spawn-redis", action="store_true", help="spawn a local redis-server")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for rate in [float(r) for r in args.rates.split(",")]:
+        row = run_point(rate, args)
+        results.append(row)
+        print(f"{rate:>7.0f} fish/s: sent {row['sent_per_s']:7.1f}/s, ingested {row['ingested_per_s']:7.1f}/s "
+              f"(p50/p99 {row['ingest_p50_ms']:6.1f}/{row['ingest_p99_ms']:6.1f} ms) | on every replica "
+              f"p50/p99/max {row['visible_p50_ms']:6.1f}/{row['visible_p99_ms']:6.1f}/{row['visible_max_ms']:6.1f} ms, "
+              f"{row['never_visible']} never | via acks p50/p99 "
+              f"{row['acked_visible_p50_ms']:6.0f}/{row['acked_visible_p99_ms']:6.0f} ms | "
+              f"{row['absorbed']} absorbed", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Frame time and memory of the sprite renderer with thousands of fish.
+
+Runs offscreen unless QT_QPA_PLATFORM is already set. Each frame moves a
+share of the fish and replaces a few, like a replica receiving ticks.
+
+Usage: python benchmarks/bench_render.py [--fish 5000] [--frames 200] [--json results.json]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtWidgets import QApplication
+
+from pond import Fish
+from pond_ui import PondCanvas
+
+PONDS = ["Honey Lemon", "NetLink", "DC_Universe", "Parallel"]
+
+
+def rss_mib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fish", type=int, default=5000)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--moving", type=float, default=0.5, help="share of fish moving per frame")
+    parser.add_argument("--churn", type=float, default=0.02, help="share of fish replaced per frame")
+    parser.add_argument("--viewport", help="show only this WIDTHxHEIGHT corner of the pond, e.g. 200x150")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # For the pond gifs
+    renderer = PondCanvas(None)
+    renderer.resize(*([int(n) for n in args.viewport.split("x")] if args.viewport else [600, 400]))
+    renderer.show()
+
+    fish = [Fish(f"Fish{i}", random.choice(PONDS), 15) for i in range(args.fish)]
+    frame_times = []
+    rss_after_warmup = None
+    for frame in range(args.frames):
+        for f in random.sample(fish, int(len(fish) * args.moving)):
+            x, y = f.position
+            f.position = (max(0, min(550, x + random.randint(-10, 10))), max(0, min(350, y + random.randint(-10, 10))))
+        for i in random.sample(range(len(fish)), int(len(fish) * args.churn)):
+            fish[i] = Fish(f"Fish{frame}-{i}", random.choice(PONDS), 15)
+
+        start = time.perf_counter()
+        renderer.sync({f.id: (*f.position, f.genesis_pond) for f in fish})  # As FishStore.sprites() hands it over
+        renderer.repaint()  # Force the paint now so it is inside the measurement
+        app.processEvents()
+        frame_times.append(time.perf_counter() - start)
+        if frame == 10:
+            rss_after_warmup = rss_mib()
+
+    result = {
+        "fish": args.fish,
+        "frames": args.frames,
+        "viewport": args.viewport,
+        "frame_ms_median": statistics.median(frame_times) * 1e3,
+        "frame_ms_max": max(frame_times) * 1e3,
+        "fps_median": 1 / statistics.median(frame_times),
+        "rss_mib_after_warmup": rss_after_warmup,
+        "rss_mib_end": rss_mib(),
+        "sprites": len(renderer),
+        "shared_movies": len(renderer.movies),
+    }
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Replays captured traffic into fresh replicas, to profile message handling offline.
+
+Without --capture it first records two: a cluster ticks --fish fish for
+--record-seconds while a peer pond sends --arrivals fish over MQTT. The
+primary captures everything it receives, and so does a follower that joins
+once the pond is seeded, starting with its full state transfer. Then, for
+each speed in --speeds (1, 10, ... or "max"), the follower's capture is fed
+into --replicas fresh followers, or the primary's into a fresh primary with
+--primary so that the MQTT records are handled too. Every replayed replica
+has its own fakeredis and takes the recorded replica's id, so messages
+targeted at that replica (state transfers, catch-ups) reach it. A capture
+written by ``main.py --record-dir`` is named after its replica. It reports
+per speed:
+  - records replayed and the rate achieved
+  - how far the replay fell behind the recorded schedule at worst
+  - messages handled and mean handling time per channel and message type,
+    from the replicas' fishhaven_message_handle_seconds histogram
+
+--profile writes cProfile stats of the last replay to a file, for
+``python -m pstats`` or snakeviz.
+
+Usage:
+  python benchmarks/bench_replay.py [--capture FILE] [--speeds 1,10,max] [--replicas 1] [--primary]
+      [--record-seconds 10] [--fish 2000] [--arrivals 500] [--profile replay.prof] [--json results.json]
+"""
+import argparse
+import cProfile
+import json
+import os
+import tempfile
+import threading
+import time
+
+from harness import LocalBroker, redis_factory, start_cluster, stop_cluster, quiet
+from engine import PondEngine
+from pond import PondReplica, POND_NAME
+from traffic import Recorder, read, replay, REPLICATION, MQTT
+
+
+def record(directory, args):
+    """Capture what a ticking primary and a joining follower receive while a peer pond sends fish"""
+    new_redis, cleanup = redis_factory()
+    broker = LocalBroker()
+    with quiet():
+        replicas, _ = start_cluster(2, new_redis, broker, seed_fish=args.fish, lifetime=10 ** 6)
+        replicas[0].recorder = Recorder(os.path.join(directory, f"{replicas[0].replica_id}.capture.gz"))
+        replicas.append(PondReplica(POND_NAME, "follower", redis_client=new_redis(), mqtt_factory=broker.client,
+                                    recorder=Recorder(os.path.join(directory, "follower.capture.gz"))))
+        engines = [PondEngine(r) for r in replicas]
+        for engine in engines:
+            engine.start()
+        peer = broker.client()
+        interval = args.record_seconds / max(args.arrivals, 1)
+
+        def send():
+            for i in range(args.arrivals):
+                peer.publish(f"user/{POND_NAME}", json.dumps(
+                    {"id": f"peer-{i}", "name": f"Visitor{i}", "group_name": "NetLink", "lifetime": 10 ** 6}))
+                time.sleep(interval)
+        sender = threading.Thread(target=send, daemon=True)
+        sender.start()
+        time.sleep(args.record_seconds)
+        sender.join()
+        for engine in engines:
+            engine.stop()
+        time.sleep(0.5)
+        fish = {"primary": len(replicas[0].fish_list), "follower": len(replicas[-1].fish_list)}
+        stop_cluster(replicas)
+    cleanup()
+    paths = {"primary": os.path.join(directory, f"{replicas[0].replica_id}.capture.gz"),
+             "follower": os.path.join(directory, "follower.capture.gz")}
+    return paths, fish
+
+
+def handling(replicas):
+    """(channel, type) -> (messages, mean ms) over all replicas"""
+    totals = {}
+    for replica in replicas:
+        for labels, (_, total, count) in replica.metrics.handle_seconds.values.items():
+            seconds, messages = totals.get(labels, (0.0, 0))
+            totals[labels] = (seconds + total, messages + count)
+    return {f"{channel}/{kind}": (count, seconds / count * 1000)
+            for (channel, kind), (seconds, count) in sorted(totals.items())}
+
+
+def run_speed(path, replica_id, speed, args, profiler=None):
+    servers = [redis_factory() for _ in range(1 if args.primary else args.replicas)]
+    with quiet():
+        replicas = []
+        for new_redis, _ in servers:
+            if not args.primary:
+                # Someone else holds the lease, so the followers stay followers
+                new_redis().set(f"leader:{POND_NAME}", "recorded-primary", px=10 ** 9)
+            replicas.append(PondReplica(POND_NAME, replica_id, redis_client=new_redis(),
+                                        mqtt_factory=LocalBroker().client))
+        if args.primary:
+            replicas[0].declare_primary(force=True)
+        sources = (REPLICATION, MQTT) if args.primary else (REPLICATION,)
+        if profiler:
+            profiler.enable()
+        result = replay(path, replicas, speed, sources)
+        if profiler:
+            profiler.disable()
+        for replica in replicas:
+            replica.ingest.flush()  # Arrivals still waiting for the next ingest batch
+        fish = len(replicas[0].fish_list)
+        handled = handling(replicas)
+        stop_cluster(replicas)
+    for _, cleanup in servers:
+        cleanup()
+    return {
+        "speed": speed or "max",
+        **result,
+        "records_per_s": result["records"] / max(result["elapsed_s"], 1e-9),
+        "fish_after": fish,
+        "handling": handled
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--capture", help="replay this capture instead of recording one")
+    parser.add_argument("--replica-id", help="id of the replica that recorded --capture (default: from its name)")
+    parser.add_argument("--speeds", default="1,10,max")
+    parser.add_argument("--replicas", type=int, default=1)
+    parser.add_argument("--primary", action="store_true", help="replay into one primary, MQTT records included")
+    parser.add_argument("--record-seconds", type=float, default=10)
+    parser.add_argument("--fish", type=int, default=2000)
+    parser.add_argument("--arrivals", type=int, default=500)
+    parser.add_argument("--profile", help="write cProfile stats of the last replay to this file")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    path = args.capture
+    if not path:
+        role = "primary" if args.primary else "follower"
+        paths, fish = record(tempfile.mkdtemp(), args)
+        path = paths[role]
+        print(f"recorded: the {role} ended with {fish[role]} fish", flush=True)
+    replica_id = args.replica_id or os.path.basename(path).split(".")[0]
+    records = list(read(path))
+    size = os.path.getsize(path)
+    span = records[-1].arrived_at - records[0].arrived_at if records else 0.0
+    print(f"capture: {len(records)} records over {span:.1f} s, "
+          f"{sum(r.source == MQTT for r in records)} MQTT, {size / 1e3:.1f} kB compressed", flush=True)
+
+    results = []
+    speeds = args.speeds.split(",")
+    for i, speed in enumerate(speeds):
+        profiler = cProfile.Profile() if args.profile and i == len(speeds) - 1 else None
+        row = run_speed(path, replica_id, None if speed == "max" else float(speed), args, profiler)
+        results.append(row)
+        label = "max" if speed == "max" else f"{speed}x"
+        print(f"{label:>5}: {row['records']} records in {row['elapsed_s']:7.2f} s "
+              f"({row['records_per_s']:8.0f} records/s, at worst {row['max_behind_s'] * 1000:7.1f} ms behind) "
+              f"| {row['fish_after']} fish", flush=True)
+        for name, (count, mean_ms) in row["handling"].items():
+            print(f"        {name:<40} {count:>7} handled  {mean_ms:8.3f} ms mean", flush=True)
+        if profiler:
+            profiler.dump_stats(args.profile)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "capture_records": len(records), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Tick jitter, overruns and lifetime drift: a Qt-style timer tick against the FixedStepScheduler.
+
+A primary with --fish fish (long-lived, and kept from migrating so the
+pond stays the same size) ticks for --duration seconds at each rate in
+--rates while a stand-in GUI thread paints at --fps, each frame costing
+--paint-ms of Python, with a --stall-ms frame every --stall-every seconds
+(a large redraw or a modal dialog). With --stall-holds-lock the long frame
+holds the replica's store lock, as a snapshot or full state transfer does,
+so the tick itself is held up and has to catch up. Two ways of ticking:
+  - timer: how the window's QTimer ticked. The timer fires on the GUI
+    thread between frames, the next fire is due one interval after this
+    one ran, and each tick is update() with its fixed one-second step
+  - scheduler: PondEngine on its own FixedStepScheduler thread, each tick
+    update(dt), the GUI thread only painting
+For each it reports:
+  - ticks run against ticks due, and the p50/p99/max lateness of each tick
+    against its slot on the fixed grid
+  - overruns (ticks longer than their interval), catch-up and dropped steps
+  - lifetime drift: simulated seconds the fish aged minus wall seconds,
+    which should stay within a second
+
+Usage:
+  python benchmarks/bench_scheduler.py [--rates 1,10,30,60] [--fish 2000] [--duration 10] [--fps 30]
+      [--paint-ms 15] [--stall-ms 400] [--stall-every 3] [--stall-holds-lock] [--json results.json]
+"""
+import argparse
+import json
+import threading
+import time
+
+from harness import LocalBroker, redis_factory, start_cluster, stop_cluster, quiet
+from engine import PondEngine
+from loadgen import percentile
+
+LIFETIME = 10 ** 6
+
+
+def busy(seconds):
+    """Hold the interpreter the way Python-side painting does"""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class GuiLoop:
+    """One thread running frames at fps, and the tick timer between them if given one"""
+    def __init__(self, args, lock, tick=None, interval=None):
+        self.args = args
+        self.lock = lock
+        self.tick = tick
+        self.interval = interval
+        self.running = True
+        self.fired = []  # When each timer tick started
+        self.durations = []
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self.thread.start()
+
+    def run(self):
+        frame = 1 / self.args.fps
+        next_frame = self.started_at
+        next_stall = self.started_at + self.args.stall_every
+        next_tick = self.started_at + self.interval if self.tick else float("inf")
+        while self.running:
+            now = time.monotonic()
+            if now >= next_tick:
+                # QTimer: a late timeout fires once, and the next is an interval after it
+                self.fired.append(now)
+                self.tick()
+                self.durations.append(time.monotonic() - now)
+                next_tick = time.monotonic() + self.interval
+            elif now >= next_frame:
+                if now >= next_stall:
+                    if self.args.stall_holds_lock:
+                        with self.lock:
+                            busy(self.args.stall_ms / 1000)
+                    else:
+                        busy(self.args.stall_ms / 1000)
+                    next_stall += self.args.stall_every
+                else:
+                    busy(self.args.paint_ms / 1000)
+                next_frame += frame
+            else:
+                time.sleep(max(0, min(next_frame, next_tick) - now))
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+
+def lateness(fired, started_at, interval):
+    """How late each tick started against the fixed grid it should have kept"""
+    return [max(0.0, at - (started_at + (i + 1) * interval)) for i, at in enumerate(fired)]
+
+
+def run_point(rate, mode, args):
+    interval = 1 / rate
+    new_redis, cleanup = redis_factory(args.redis_url, args.spawn_redis)
+    with quiet():
+        replicas, _ = start_cluster(1, new_redis, LocalBroker(), seed_fish=args.fish, lifetime=LIFETIME)
+        primary = replicas[0]
+        primary.migration_probability = 0.0
+        primary.cell_capacity = args.fish
+        if mode == "timer":
+            gui = GuiLoop(args, primary.store_lock, primary.update, interval)
+            gui.start()
+            time.sleep(args.duration)
+            elapsed = time.monotonic() - gui.started_at
+            gui.stop()
+            late = lateness(gui.fired, gui.started_at, interval)
+            ticks = len(gui.fired)
+            stats = {"overruns": sum(d > interval for d in gui.durations), "caught_up": 0, "dropped": 0}
+        else:
+            gui = GuiLoop(args, primary.store_lock)
+            engine = PondEngine(primary, interval)
+            gui.start()
+            engine.start()
+            time.sleep(args.duration)
+            elapsed = time.monotonic() - engine.scheduler.started_at
+            engine.stop()
+            gui.stop()
+            stats = engine.stats()
+            late = list(engine.scheduler.lateness)
+            ticks = stats["steps"]
+        aged = LIFETIME - max(f.remaining_lifetime for f in primary.fish_list)
+        stop_cluster(replicas)
+    cleanup()
+    return {
+        "rate": rate,
+        "mode": mode,
+        "ticks": ticks,
+        "ticks_due": int(elapsed / interval),
+        "late_p50_ms": percentile(late, 0.50) * 1000,
+        "late_p99_ms": percentile(late, 0.99) * 1000,
+        "late_max_ms": max(late, default=0.0) * 1000,
+        "overruns": stats["overruns"],
+        "caught_up": stats["caught_up"],
+        "dropped": stats["dropped"],
+        "aged_s": aged,
+        "wall_s": elapsed,
+        "drift_s": aged - elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rates", default="1,10,30,60", help="ticks per second")
+    parser.add_argument("--modes", default="timer,scheduler")
+    parser.add_argument("--fish", type=int, default=2000)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--paint-ms", type=float, default=15, help="GUI thread time per frame")
+    parser.add_argument("--stall-ms", type=float, default=400, help="GUI thread time of an occasional long frame")
+    parser.add_argument("--stall-every", type=float, default=3, help="seconds between long frames")
+    parser.add_argument("--stall-holds-lock", action="store_true",
+                        help="hold the store lock through the long frame, stalling the tick too")
+    parser.add_argument("--redis-url", help="use this Redis server instead of fakeredis")
+    parser.add_argument("--spawn-redis", action="store_true", help="spawn a local redis-server")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for rate in [float(r) for r in args.rates.split(",")]:
+        for mode in args.modes.split(","):
+            row = run_point(rate, mode, args)
+            results.append(row)
+            print(f"{rate:>4.0f} Hz {mode:<9}: {row['ticks']:>5}/{row['ticks_due']:<5} ticks | late p50/p99/max "
+                  f"{row['late_p50_ms']:6.1f}/{row['late_p99_ms']:6.1f}/{row['late_max_ms']:6.1f} ms | "
+                  f"{row['overruns']} overruns, {row['caught_up']} caught up, {row['dropped']} dropped | "
+                  f"aged {row['aged_s']:6.0f} s in {row['wall_s']:5.1f} s (drift {row['drift_s']:+6.1f} s)",
+                  flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Tick cost per owner in sharded mode.
+
+Seeds a cluster with --fish fish, lets every replica tick its shard, and
+reports each owner's tick time next to the single-primary tick. Owners are
+separate processes in a real deployment, so the pond-wide rate is bounded
+by the slowest owner: fish ticked per second = fish / max(owner tick).
+
+Owners tick one at a time here, each waiting for the others to apply its
+delta, because all replicas share this process and its GIL. The apply time
+is reported too: every replica still applies every owner's delta, so that
+cost does not shrink with more owners. After the ticks the benchmark checks
+that every replica converged on the same fish.
+
+Usage:
+  python benchmarks/bench_shard.py [--fish 100000] [--replicas 1,2,4,8]
+      [--ticks 5] [--redis-url URL | --spawn-redis] [--json results.json]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from harness import LocalBroker, redis_factory, start_cluster, stop_cluster, quiet, wait_until
+
+
+def applied(replicas, owner):
+    """Every other replica has applied the owner's latest shard delta"""
+    return all(r.shard_seqs.get(owner.replica_id, (None, 0))[1] == owner.shard_seq
+               for r in replicas if r is not owner)
+
+
+def tick_all(replicas, sharded):
+    """One tick on every owner in turn, returns each owner's tick and apply seconds"""
+    ticks, applies = [], []
+    for replica in replicas if sharded else replicas[:1]:
+        start = time.perf_counter()
+        replica.update()
+        ticks.append(time.perf_counter() - start)
+        # Let the other replicas apply it before the next owner ticks, so
+        # the tick times are not inflated by listener threads on the GIL
+        start = time.perf_counter()
+        if sharded:
+            wait_until(lambda: applied(replicas, replica), timeout=60)
+        else:
+            wait_until(lambda: all(r.last_seq == replica.last_seq for r in replicas), timeout=60)
+        applies.append(time.perf_counter() - start)
+    return ticks, applies
+
+
+def converged(replicas):
+    states = [sorted((f.id, f.remaining_lifetime) for f in list(r.fish_list)) for r in replicas]
+    return all(state == states[0] for state in states[1:])
+
+
+def run_point(replica_count, sharded, args):
+    new_redis, cleanup = redis_factory(args.redis_url, args.spawn_redis)
+    replicas, synced = start_cluster(replica_count, new_redis, LocalBroker(), seed_fish=args.fish,
+                                     sharded=sharded)
+    for replica in replicas:
+        replica.migration_probability = 0.0  # Tick cost only, no MQTT sends
+        replica.cell_capacity = args.fish * 2
+    with quiet():
+        if sharded:
+            wait_until(lambda: all(len(r.shard_owners()) == replica_count for r in replicas), timeout=30)
+        rounds = [tick_all(replicas, sharded) for _ in range(args.ticks)]
+        consistent = wait_until(lambda: converged(replicas), timeout=60, interval=0.2)
+    owned = [r.shard_map.owned for r in replicas] if sharded else [args.fish]
+    stop_cluster(replicas)
+    cleanup()
+
+    per_owner = np.median(np.array([ticks for ticks, _ in rounds]), axis=0)
+    apply_seconds = np.median(np.array([applies for _, applies in rounds]), axis=0)
+    slowest = float(per_owner.max())
+    return {
+        "replicas": replica_count,
+        "sharded": sharded,
+        "synced": synced,
+        "owned_min": min(owned),
+        "owned_max": max(owned),
+        "owner_tick_ms_median": float(np.median(per_owner)) * 1000,
+        "slowest_owner_tick_ms": slowest * 1000,
+        "fish_ticked_per_s": args.fish / slowest,
+        "apply_ms_per_tick": float(apply_seconds.sum()) * 1000,
+        "consistent": consistent
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fish", type=int, default=100000)
+    parser.add_argument("--replicas", default="1,2,4,8")
+    parser.add_argument("--ticks", type=int, default=5)
+    parser.add_argument("--redis-url", help="use this Redis server instead of fakeredis")
+    parser.add_argument("--spawn-redis", action="store_true", help="spawn a local redis-server")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    points = [(1, False)] + [(int(n), True) for n in args.replicas.split(",")]
+    results = []
+    for replica_count, sharded in points:
+        row = run_point(replica_count, sharded, args)
+        results.append(row)
+        label = f"{replica_count} owner(s)" if sharded else "primary only"
+        print(f"{label:>14}: owns {row['owned_min']}..{row['owned_max']} fish, "
+              f"tick {row['owner_tick_ms_median']:7.1f} ms median / {row['slowest_owner_tick_ms']:7.1f} ms slowest, "
+              f"{row['fish_ticked_per_s'] / 1e6:5.2f} M fish/s, "
+              f"replicas apply a pond tick in {row['apply_ms_per_tick']:7.1f} ms, "
+              f"{'consistent' if row['consistent'] else 'DIVERGED'}", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
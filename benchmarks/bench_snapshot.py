@@ -0,0 +1,92 @@
+"""Time-to-ready of a joining replica: full-state transfer versus a local snapshot.
+
+A primary holds --fish fish. A new replica joins either empty (the primary
+answers with full_state) or from a snapshot taken --behind ticks earlier
+(it loads the snapshot and only asks for the ticks it missed). Ready means
+the replica holds the whole pond and has applied the primary's last seq.
+
+Usage:
+  python benchmarks/bench_snapshot.py [--fish 100000] [--behind 3] [--runs 3]
+      [--redis-url URL | --spawn-redis] [--json results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from harness import LocalBroker, redis_factory, start_cluster, stop_cluster, quiet, wait_until
+from pond import PondReplica, POND_NAME
+from snapshot import FileSnapshotStore, capture
+
+
+def join(primary, new_redis, broker, replica_id, snapshot_stores=None):
+    with quiet():
+        start = time.perf_counter()
+        replica = PondReplica(POND_NAME, replica_id, redis_client=new_redis(), mqtt_factory=broker.client,
+                              snapshot_stores=snapshot_stores)
+        constructed = time.perf_counter() - start
+        ready = wait_until(lambda: replica.sync_requested_at is None and replica.last_seq >= primary.last_seq
+                           and len(replica.fish_list) == len(primary.fish_list), timeout=300)
+    ready_s = time.perf_counter() - start if ready is not None else None
+    return replica, constructed, ready_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fish", type=int, default=100000)
+    parser.add_argument("--behind", type=int, default=3, help="primary ticks between snapshot and join")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--redis-url", help="use this Redis server instead of fakeredis")
+    parser.add_argument("--spawn-redis", action="store_true", help="spawn a local redis-server")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    new_redis, cleanup = redis_factory(args.redis_url, args.spawn_redis)
+    broker = LocalBroker()
+    (primary,), _ = start_cluster(1, new_redis, broker, seed_fish=args.fish)
+    primary.cell_capacity = 10 ** 9
+    primary.migration_probability = 0
+    with quiet():
+        primary.update()
+
+    results = {"full_state": [], "snapshot": []}
+    snapshot_stats = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for run in range(args.runs):
+            replica, _, ready_s = join(primary, new_redis, broker, f"f{run}")
+            results["full_state"].append(ready_s)
+            replica.close()
+
+            path = os.path.join(tmp, f"s{run}.snapshot")
+            start = time.perf_counter()
+            payload = capture(primary)
+            FileSnapshotStore(path).save(payload)
+            snapshot_stats = {"save_ms": (time.perf_counter() - start) * 1000, "bytes": len(payload)}
+            with quiet():
+                for _ in range(args.behind):
+                    primary.update()
+            replica, constructed, ready_s = join(primary, new_redis, broker, f"s{run}",
+                                                 [FileSnapshotStore(path)])
+            results["snapshot"].append(ready_s)
+            snapshot_stats["load_ms"] = replica.snapshotter.stats["load_ms"]
+            replica.close()
+
+    stop_cluster([primary])
+    cleanup()
+
+    print(f"{args.fish} fish, snapshot {snapshot_stats['bytes'] / 1e6:.1f} MB, "
+          f"save {snapshot_stats['save_ms']:.0f} ms, load {snapshot_stats['load_ms']:.0f} ms")
+    for path, times in results.items():
+        done = [t for t in times if t is not None]
+        median = f"{statistics.median(done) * 1000:.0f} ms" if done else "timed out"
+        print(f"{path:<11} time-to-ready median {median}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results, "snapshot": snapshot_stats}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Cost of keeping the spatial grid current and of querying it.
+
+Fills a FishStore, then measures per tick: a random walk of every fish
+(which maintains the cell column), the grid rebuild that follows it, and
+the crowding pass. Region and nearest-neighbour queries are compared with
+a linear NumPy scan over all positions, and their results checked against it.
+
+Usage: python benchmarks/bench_spatial.py [--sizes 1000,10000,100000] [--queries 200] [--json results.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fish_store import FishStore
+from spatial import POND_WIDTH, POND_HEIGHT, SpatialGrid
+
+
+class PlainFish:
+    """Stand-in for a detached Fish, enough for the store to attach"""
+    def __init__(self):
+        self.id = str(uuid.uuid4())
+        self.genesis_pond = "Honey Lemon"
+        self.remaining_lifetime = 10 ** 6
+        self.position = (random.randint(0, POND_WIDTH), random.randint(0, POND_HEIGHT))
+
+    def attach(self, store, slot):
+        self._slot = slot
+
+    def detach(self):
+        pass
+
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    for args in calls:
+        fn(*args)
+    return (time.perf_counter() - start) / len(calls)
+
+
+def best_of(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def linear_region(store, x0, y0, x1, y1):
+    n = len(store)
+    x, y = store.x[:n], store.y[:n]
+    return np.flatnonzero((x >= x0) & (x <= x1) & (y >= y0) & (y <= y1))
+
+
+def linear_nearest(store, x, y, k):
+    n = len(store)
+    distances = (store.x[:n] - x) ** 2 + (store.y[:n] - y) ** 2
+    nearest = np.argpartition(distances, k - 1)[:k]
+    return nearest[np.argsort(distances[nearest], kind="stable")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--region", type=int, default=50, help="side of the square region queries")
+    parser.add_argument("--k", type=int, default=10, help="neighbours per nearest query")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng()
+    results = []
+    for size in [int(n) for n in args.sizes.split(",")]:
+        store = FishStore()
+        for _ in range(size):
+            store.add(PlainFish())
+        grid = SpatialGrid(store)
+        slots = np.arange(size)
+
+        def tick():
+            store.random_walk(slots, rng)
+            grid.refresh()
+
+        regions = []
+        for _ in range(args.queries):
+            x0, y0 = random.randint(0, POND_WIDTH), random.randint(0, POND_HEIGHT)
+            regions.append((x0, y0, x0 + args.region, y0 + args.region))
+        points = [(random.randint(0, POND_WIDTH), random.randint(0, POND_HEIGHT), args.k) for _ in range(args.queries)]
+
+        tick()
+        correct = all(
+            np.array_equal(np.sort(grid.region(*r)), linear_region(store, *r)) for r in regions
+        ) and all(
+            # Ties at the kth distance may pick different fish, so compare distances
+            np.array_equal((store.x[grid.nearest(*p)] - p[0]) ** 2 + (store.y[grid.nearest(*p)] - p[1]) ** 2,
+                           (store.x[linear_nearest(store, *p)] - p[0]) ** 2
+                           + (store.y[linear_nearest(store, *p)] - p[1]) ** 2)
+            for p in points
+        )
+        row = {
+            "fish": size,
+            "walk_ms": best_of(lambda: store.random_walk(slots, rng)) * 1e3,
+            "walk_and_rebuild_ms": best_of(tick) * 1e3,
+            "crowded_ms": best_of(lambda: grid.crowded(slots, 3)) * 1e3,
+            "region_grid_us": per_call(grid.region, regions) * 1e6,
+            "region_linear_us": per_call(lambda *r: linear_region(store, *r), regions) * 1e6,
+            "nearest_grid_us": per_call(grid.nearest, points) * 1e6,
+            "nearest_linear_us": per_call(lambda *p: linear_nearest(store, *p), points) * 1e6,
+            "correct": correct
+        }
+        results.append(row)
+        print(f"{size:>7} fish: walk {row['walk_ms']:6.2f} ms (+rebuild {row['walk_and_rebuild_ms']:6.2f} ms), "
+              f"crowded {row['crowded_ms']:6.2f} ms | region {row['region_grid_us']:7.1f} us vs linear "
+              f"{row['region_linear_us']:7.1f} us | {args.k}-nearest {row['nearest_grid_us']:7.1f} us vs linear "
+              f"{row['nearest_linear_us']:7.1f} us | {'ok' if correct else 'MISMATCH'}", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
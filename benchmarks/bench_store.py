@@ -0,0 +1,105 @@
+"""Tick cost of the columnar FishStore against the old per-fish Python loop.
+
+Usage: python benchmarks/bench_store.py [--sizes 1000,10000,100000] [--json results.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fish_store import FishStore
+
+
+class PlainFish:
+    """Stand-in for a detached Fish, enough for the store to attach"""
+    def __init__(self):
+        self.id = str(uuid.uuid4())
+        self.genesis_pond = "Honey Lemon"
+        self.remaining_lifetime = random.randint(1, 15)
+        self.position = (random.randint(0, 550), random.randint(0, 350))
+
+    def attach(self, store, slot):
+        self._slot = slot
+
+    def detach(self):
+        pass
+
+
+def loop_tick(fish):
+    """The pre-store update(): one Python iteration per fish"""
+    updates = []
+    for f in fish:
+        if f.remaining_lifetime > 0:
+            f.remaining_lifetime -= 1
+        dx, dy = random.randint(-10, 10), random.randint(-10, 10)
+        x, y = f.position
+        f.position = (max(0, min(550, x + dx)), max(0, min(350, y + dy)))
+        updates.append([f.id, f.remaining_lifetime, *f.position])
+    return updates
+
+
+def store_tick(store, rng):
+    """The vectorized update(): age, walk and build the delta rows"""
+    expired = store.age()
+    alive = np.setdiff1d(np.arange(len(store)), expired, assume_unique=True)
+    store.random_walk(alive, rng)
+    return store.rows(alive)
+
+
+def best_of(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng()
+    results = []
+    for size in [int(n) for n in args.sizes.split(",")]:
+        fish = [PlainFish() for _ in range(size)]
+        store = FishStore()
+        for f in fish:
+            store.add(f)
+        removals = [f.id for f in random.sample(fish, min(size, 1000))]
+
+        row = {
+            "fish": size,
+            "loop_tick_ms": best_of(lambda: loop_tick(fish)) * 1e3,
+            "store_tick_ms": best_of(lambda: store_tick(store, rng)) * 1e3,
+            "store_tick_no_rows_ms": best_of(lambda: store.random_walk(store.age(), rng)) * 1e3,
+        }
+        start = time.perf_counter()
+        store.remove_many(removals)
+        row["store_remove_us"] = (time.perf_counter() - start) / len(removals) * 1e6
+        start = time.perf_counter()
+        for fish_id in removals:
+            fish.remove(next(f for f in fish if f.id == fish_id))
+        row["list_remove_us"] = (time.perf_counter() - start) / len(removals) * 1e6
+
+        results.append(row)
+        print(f"{size:>7} fish: loop {row['loop_tick_ms']:8.1f} ms | store {row['store_tick_ms']:7.1f} ms "
+              f"({row['store_tick_no_rows_ms']:.2f} ms without delta rows) | remove "
+              f"{row['store_remove_us']:.2f} us vs list {row['list_remove_us']:.1f} us")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""End-to-end cost of one tick delta: build, encode, decode and apply.
+
+Compares the row path (a [fish_id, remaining_lifetime, x, y] list per fish,
+msgpack codec) with the columnar path (an UpdateBlock cut from the store
+columns, columnar codec), on the primary and on a replica.
+
+Usage: python benchmarks/bench_tick.py [--sizes 10000,100000,1000000] [--json results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import codec
+from fish_store import FishStore
+from pond import Fish
+
+
+def best_of(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def primary_tick(store, rng, columnar):
+    """Age, walk and encode, as PondReplica.advance does"""
+    expired = store.age()
+    alive = np.setdiff1d(np.arange(len(store)), expired, assume_unique=True)
+    store.random_walk(alive, rng)
+    if columnar:
+        return codec.CODECS["columnar"].encode({"type": "tick_delta", "updates": store.updates(alive)})
+    return codec.CODECS["msgpack"].encode({"type": "tick_delta", "updates": store.rows(alive)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng()
+    results = []
+    for size in [int(n) for n in args.sizes.split(",")]:
+        primary, replica = FishStore(), FishStore()
+        for i in range(size):
+            fish = Fish(f"Fish{i}", "Honey Lemon", 10 ** 6)
+            replica.add(Fish.from_dict(fish.to_dict()))
+            primary.add(fish)
+
+        row = {"fish": size}
+        for path, columnar in (("rows", False), ("columnar", True)):
+            payload = primary_tick(primary, rng, columnar)
+            row[f"{path}_primary_ms"] = best_of(lambda: primary_tick(primary, rng, columnar)) * 1e3
+            row[f"{path}_replica_ms"] = best_of(
+                lambda: replica.apply_updates(codec.decode(payload)["updates"])) * 1e3
+            row[f"{path}_bytes"] = len(payload)
+        results.append(row)
+        print(f"{size:>8} fish: rows {row['rows_primary_ms']:8.1f} ms primary / {row['rows_replica_ms']:8.1f} ms replica "
+              f"({row['rows_bytes'] / 1e6:.1f} MB) | columnar {row['columnar_primary_ms']:6.1f} ms / "
+              f"{row['columnar_replica_ms']:6.1f} ms ({row['columnar_bytes'] / 1e6:.1f} MB)", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
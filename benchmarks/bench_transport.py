@@ -0,0 +1,167 @@
+"""Peak message rate and delivery latency of the threaded and asyncio transports.
+
+One sender transport floods the replica channel while receiver transports
+timestamp every delivery. For each transport it reports:
+  - peak delivered messages per second
+  - p50/p99/max latency from publish() to the receiver handler
+  - p99/max time the sending thread spent inside publish(), which is how
+    long a tick or the UI would stall on it
+  - mean flush size and per-flush latency of the outbound writer
+  - backpressure: publishes rejected by a full outbound queue and reads
+    paused by a full inbound queue (asyncio only)
+
+--handler-us makes every receiver handler sleep, simulating a replica that
+falls behind its peers. --redis-delay-ms adds that much latency to every
+round trip the threaded sender makes, simulating a slow or distant Redis.
+
+Usage:
+  python benchmarks/bench_transport.py [--messages 20000] [--receivers 2]
+      [--handler-us 0] [--redis-delay-ms 0] [--transports threaded,asyncio]
+      [--redis-url URL | --spawn-redis] [--json results.json]
+"""
+import argparse
+import json
+import threading
+import time
+
+from harness import redis_factories, wait_until, CHANNELS
+from pond import REPLICA_CHANNEL
+from transport import PubSubTransport, TransportBackpressure
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+
+class SlowRedis:
+    """Wraps a Redis client so every publish and pipeline round trip takes delay longer"""
+    def __init__(self, client, delay):
+        self.client = client
+        self.delay = delay
+
+    def publish(self, channel, payload):
+        time.sleep(self.delay)
+        return self.client.publish(channel, payload)
+
+    def pipeline(self, *args, **kwargs):
+        pipe = self.client.pipeline(*args, **kwargs)
+        execute = pipe.execute
+        pipe.execute = lambda: (time.sleep(self.delay), execute())[1]
+        return pipe
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def make_transport(kind, new_redis, new_async_redis, delay=0):
+    if kind == "asyncio":
+        from async_transport import AsyncioTransport
+        return AsyncioTransport(CHANNELS, client_factory=new_async_redis)
+    return PubSubTransport(SlowRedis(new_redis(), delay) if delay else new_redis(), CHANNELS)
+
+
+class Receiver:
+    def __init__(self, handler_s):
+        self.handler_s = handler_s
+        self.latencies = []
+        self.last_at = None
+        self.lock = threading.Lock()
+
+    def handle(self, channel, payload):
+        now = time.perf_counter()
+        sent_at = float(payload.split(b" ", 1)[0])
+        with self.lock:
+            self.latencies.append(now - sent_at)
+            self.last_at = now
+        if self.handler_s:
+            time.sleep(self.handler_s)
+
+
+def run(kind, args):
+    new_redis, new_async_redis, cleanup = redis_factories(args.redis_url, args.spawn_redis)
+    receivers, transports = [], []
+    for _ in range(args.receivers):
+        receiver = Receiver(args.handler_us / 1e6)
+        transport = make_transport(kind, new_redis, new_async_redis)
+        transport.start(receiver.handle)
+        receivers.append(receiver)
+        transports.append(transport)
+    sender = make_transport(kind, new_redis, new_async_redis, args.redis_delay_ms / 1000)
+    sender.start(lambda channel, payload: None)
+    time.sleep(0.2)
+
+    padding = b"x" * args.size
+    retries = 0
+    calls = []
+    start = time.perf_counter()
+    for _ in range(args.messages):
+        while True:
+            try:
+                called = time.perf_counter()
+                sender.publish(REPLICA_CHANNEL, b"%.9f " % called + padding)
+                calls.append(time.perf_counter() - called)
+                break
+            except TransportBackpressure:
+                retries += 1
+                time.sleep(0.0005)
+    expected = args.messages
+    delivered = wait_until(lambda: all(len(r.latencies) >= expected for r in receivers), timeout=300)
+
+    latencies = [latency for r in receivers for latency in r.latencies]
+    last_at = max((r.last_at for r in receivers if r.last_at), default=start)
+    row = {
+        "transport": kind,
+        "messages": args.messages,
+        "receivers": args.receivers,
+        "complete": delivered is not None,
+        "msg_per_s": sum(len(r.latencies) for r in receivers) / max(last_at - start, 1e-9),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "publish_call_p99_us": percentile(calls, 0.99) * 1e6,
+        "publish_call_max_us": max(calls) * 1e6,
+        "publish_retries": retries,
+        "sender": sender.stats(),
+        "receivers_stats": [t.stats() for t in transports]
+    }
+    for transport in transports + [sender]:
+        transport.close()
+    cleanup()
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--receivers", type=int, default=2)
+    parser.add_argument("--size", type=int, default=100, help="payload padding in bytes")
+    parser.add_argument("--handler-us", type=float, default=0, help="simulated handling time per message")
+    parser.add_argument("--redis-delay-ms", type=float, default=0, help="simulated latency per sender round trip")
+    parser.add_argument("--transports", default="threaded,asyncio")
+    parser.add_argument("--redis-url", help="use this Redis server instead of fakeredis")
+    parser.add_argument("--spawn-redis", action="store_true", help="spawn a local redis-server")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for kind in args.transports.split(","):
+        row = run(kind, args)
+        results.append(row)
+        stalls = sum(s.get("inbound_stalls", 0) for s in row["receivers_stats"])
+        sender = row["sender"]
+        flushes = (f"  flush {sender['mean_flush_size']:6.1f} msgs / {sender['mean_flush_ms']:6.2f} ms"
+                   if "mean_flush_size" in sender else "")
+        print(f"{kind:<9} {row['msg_per_s']:>10.0f} msg/s  p50 {row['p50_ms']:>8.2f} ms  "
+              f"p99 {row['p99_ms']:>8.2f} ms  max {row['max_ms']:>8.2f} ms  "
+              f"publish() p99 {row['publish_call_p99_us']:>8.1f} us  max {row['publish_call_max_us']:>8.1f} us"
+              f"{flushes}  retries {row['publish_retries']}  stalls {stalls}"
+              + ("" if row["complete"] else "  INCOMPLETE"))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
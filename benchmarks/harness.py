@@ -0,0 +1,228 @@
+"""Shared plumbing for the in-process cluster benchmarks.
+
+Replicas run in this process against either fakeredis (default), a Redis
+server given by URL, or a redis-server spawned on a free port. MQTT traffic
+goes to LocalBroker, an in-process stand-in that speaks the subset of the
+paho client API the replica uses.
+"""
+import contextlib
+import io
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+
+from pond import PondReplica, POND_NAME, REPLICA_CHANNEL, STATUS_CHANNEL, MQTT_RELAY_CHANNEL
+
+CHANNELS = (REPLICA_CHANNEL, STATUS_CHANNEL, MQTT_RELAY_CHANNEL)
+# Replicas here share one GIL, so syncing a big pond to many of them can
+# starve the primary's lease renewals for longer than a real process would
+PRIMARY_LEASE_MS = 60000
+
+
+def redis_factory(redis_url=None, spawn=False):
+    """Returns (factory, cleanup); each factory() call is a new client on the same server"""
+    factory, _, cleanup = redis_factories(redis_url, spawn)
+    return factory, cleanup
+
+
+def redis_factories(redis_url=None, spawn=False):
+    """Returns (factory, async_factory, cleanup) for blocking and redis.asyncio clients on one server"""
+    import redis.asyncio as aioredis
+    if spawn:
+        binary = shutil.which("redis-server")
+        if not binary:
+            raise SystemExit("redis-server not found on PATH")
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        process = subprocess.Popen([binary, "--port", str(port), "--save", "", "--appendonly", "no"],
+                                   stdout=subprocess.DEVNULL)
+        url = f"redis://127.0.0.1:{port}/0"
+        wait_until(lambda: _ping(url), timeout=10)
+        return (lambda: redis.Redis.from_url(url)), (lambda: aioredis.Redis.from_url(url)), process.terminate
+    if redis_url:
+        return (lambda: redis.Redis.from_url(redis_url)), (lambda: aioredis.Redis.from_url(redis_url)), (lambda: None)
+    import fakeredis
+    server = fakeredis.FakeServer()
+    return (lambda: fakeredis.FakeRedis(server=server)), (lambda: fakeredis.FakeAsyncRedis(server=server)), (lambda: None)
+
+
+def _ping(url):
+    try:
+        return redis.Redis.from_url(url).ping()
+    except redis.ConnectionError:
+        return False
+
+
+def wait_until(condition, timeout=30, interval=0.0005):
+    """Poll until condition() is true, returns the time waited or None on timeout"""
+    start = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - start > timeout:
+            return None
+        time.sleep(interval)
+    return time.perf_counter() - start
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the replicas' per-event prints while measuring"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+class MessageInfo:
+    rc = 0
+
+    def __init__(self, mid):
+        self.mid = mid
+
+    def wait_for_publish(self, timeout=None):
+        return True
+
+    def is_published(self):
+        return True
+
+
+class MqttMessage:
+    def __init__(self, topic, payload, qos=0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.dup = False
+        self.retain = False
+
+
+class LocalBroker:
+    """In-process MQTT broker stand-in with exact-topic subscriptions"""
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self.messages = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.lock = threading.Lock()
+        self.deliveries = queue.Queue()
+        self.next_mid = 0
+        threading.Thread(target=self._deliver, daemon=True).start()
+
+    def client(self, *args, **kwargs):
+        return LocalMqttClient(self)
+
+    def publish(self, topic, payload):
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        with self.lock:
+            self.messages[topic] += 1
+            self.bytes[topic] += len(payload)
+            self.next_mid += 1
+            subscribers = list(self.subscriptions.get(topic, ()))
+        for client in subscribers:
+            self.deliveries.put((client, MqttMessage(topic, payload)))
+        return MessageInfo(self.next_mid)
+
+    def _deliver(self):
+        while True:
+            client, message = self.deliveries.get()
+            if client.connected and client.on_message:
+                try:
+                    client.on_message(client, None, message)
+                except Exception as e:
+                    print(f"LocalBroker delivery error: {e}")
+
+
+class LocalMqttClient:
+    """The paho.mqtt.client.Client calls PondReplica makes, against LocalBroker"""
+    def __init__(self, broker):
+        self.broker = broker
+        self.connected = False
+        self.on_connect = None
+        self.on_message = None
+
+    def username_pw_set(self, username, password=None):
+        pass
+
+    def connect(self, host, port=1883, keepalive=60):
+        self.connected = True
+        return 0
+
+    def loop_start(self):
+        if self.on_connect:
+            self.on_connect(self, None, {}, 0)
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        self.connected = False
+        with self.broker.lock:
+            for subscribers in self.broker.subscriptions.values():
+                subscribers.discard(self)
+
+    def subscribe(self, topic, qos=0):
+        with self.broker.lock:
+            self.broker.subscriptions[topic].add(self)
+        return (0, 0)
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        return self.broker.publish(topic, payload)
+
+
+class ChannelMeter:
+    """Counts messages and bytes on the replication channels from a side subscriber"""
+    def __init__(self, redis_client):
+        self.pubsub = redis_client.pubsub()
+        self.pubsub.subscribe(*CHANNELS)
+        self.messages = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.running = True
+        threading.Thread(target=self._listen, daemon=True).start()
+
+    def _listen(self):
+        while self.running:
+            message = self.pubsub.get_message(timeout=0.1)
+            if message and message["type"] == "message":
+                channel = message["channel"].decode("utf-8")
+                self.messages[channel] += 1
+                self.bytes[channel] += len(message["data"])
+
+    def snapshot(self):
+        return {"messages": dict(self.messages), "bytes": dict(self.bytes)}
+
+    def close(self):
+        self.running = False
+
+
+def start_cluster(replica_count, new_redis, broker, seed_fish=0, lifetime=10 ** 6, new_transport=None,
+                  lease_ms=PRIMARY_LEASE_MS, **replica_options):
+    """Start replica r00 as primary, seed it with fish, then join the rest and wait for them to sync"""
+    from pond import Fish
+    new_transport = new_transport or (lambda: None)
+    with quiet():
+        primary = PondReplica(POND_NAME, "r00", redis_client=new_redis(), mqtt_factory=broker.client,
+                              transport=new_transport(), **replica_options)
+        primary.election.lease_ms = lease_ms
+        primary.declare_primary(force=True)
+        for i in range(seed_fish):
+            primary.fish_store.add(Fish(f"Fish{i}", POND_NAME, lifetime))
+        replicas = [primary]
+        for i in range(1, replica_count):
+            replicas.append(PondReplica(POND_NAME, f"r{i:02d}", redis_client=new_redis(),
+                                        mqtt_factory=broker.client, transport=new_transport(),
+                                        **replica_options))
+        synced = wait_until(lambda: all(len(r.fish_list) == seed_fish and r.sync_requested_at is None
+                                        for r in replicas[1:]), timeout=120)
+    return replicas, synced
+
+
+def stop_cluster(replicas):
+    for replica in replicas:
+        replica.close()
@@ -0,0 +1,106 @@
+"""Coalesces replica events into at most one UI refresh per frame.
+
+The replication listener can apply hundreds of messages between two frames.
+Instead of redrawing for each one, the coalescer collects the ids of fish
+that changed and hands them to the UI when its frame timer fires. It has no
+Qt dependency, so it can be exercised from headless code too.
+"""
+import threading
+
+from codec import UpdateBlock
+
+DEFAULT_FPS = 30
+
+
+def changed_fish_ids(data):
+    """Fish ids touched by a replication message, or None if everything may have changed"""
+    message_type = data.get("type")
+    if message_type in ("add_fish", "update_fish"):
+        return {data["fish"]["id"]}
+    if message_type == "add_fish_batch":
+        return {fish["id"] for fish in data["fish"]}
+    if message_type == "remove_fish":
+        return {data["fish_id"]}
+    if message_type in ("tick_delta", "shard_delta"):
+        updates = data["updates"]
+        ids = set(updates.fish_ids()) if isinstance(updates, UpdateBlock) else {row[0] for row in updates}
+        ids.update(data["removed"])
+        ids.update(data["migrated"])
+        return ids
+    if message_type == "catch_up":
+        ids = set()
+        for entry in data["entries"]:
+            entry_ids = changed_fish_ids(entry)
+            if entry_ids is None:
+                return None
+            ids |= entry_ids
+        return ids
+    if message_type == "full_state":
+        return None
+    return set()
+
+
+class RefreshCoalescer:
+    def __init__(self, events):
+        self.lock = threading.Lock()
+        self.dirty_ids = set()
+        self.refresh_all = True  # Draw everything on the first frame
+        self.pending = 1
+        self.events_received = 0
+        self.events_coalesced = 0
+        self.frames = 0
+        events.subscribe("update_received", self.on_update)
+        events.subscribe("tick", self.on_tick)
+
+    def on_update(self, data):
+        fish_ids = changed_fish_ids(data)
+        with self.lock:
+            self.events_received += 1
+            self.pending += 1
+            if fish_ids is None:
+                self.refresh_all = True
+            else:
+                self.dirty_ids |= fish_ids
+
+    def on_tick(self, data):
+        # The primary, or a shard owner, changes its own fish without any update_received
+        with self.lock:
+            self.pending += 1
+            if data and (data.get("is_primary") or data.get("sharded")):
+                self.refresh_all = True
+
+    def mark_dirty(self, fish_ids):
+        """Flag fish changed locally, e.g. added from the UI"""
+        with self.lock:
+            self.pending += 1
+            self.dirty_ids.update(fish_ids)
+
+    def take(self):
+        """Claim the changes since the last frame.
+
+        Returns None when nothing happened, otherwise the set of dirty fish
+        ids, or ALL when the whole pond has to be redrawn.
+        """
+        with self.lock:
+            if not self.pending:
+                return None
+            self.frames += 1
+            self.events_coalesced += self.pending - 1
+            self.pending = 0
+            if self.refresh_all:
+                self.refresh_all = False
+                self.dirty_ids = set()
+                return ALL
+            dirty_ids, self.dirty_ids = self.dirty_ids, set()
+            return dirty_ids
+
+    def stats(self):
+        with self.lock:
+            return {
+                "events_received": self.events_received,
+                "events_coalesced": self.events_coalesced,
+                "frames": self.frames
+            }
+
+
+ALL = frozenset(["*"])
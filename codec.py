@@ -0,0 +1,276 @@
+"""Wire codecs for the Redis replication channels.
+
+Legacy replicas speak plain JSON, so JSON payloads go out without a header.
+Every other codec prefixes its payload with a 3 byte header:
+
+    MAGIC | WIRE_VERSION | codec id
+
+which lets ``decode`` pick the right codec for any message it receives,
+regardless of which codec this replica prefers to send.
+
+Tick deltas carry their updates as an ``UpdateBlock``: fish ids, lifetimes
+and positions as columns, taken straight from the FishStore arrays. The
+columnar codec ships those columns as raw little-endian buffers, so neither
+end of a 100k-fish tick touches a fish in Python; the older codecs see the
+same block as [fish_id, remaining_lifetime, x, y] rows.
+"""
+import json
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, JSON always works
+    msgpack = None
+
+MAGIC = 0xF1
+WIRE_VERSION = 1
+
+# Message fields that carry fish ids or fish records
+FISH_ID_FIELDS = ("fish_id",)
+FISH_ID_LIST_FIELDS = ("removed", "migrated")
+
+
+def pack_fish_id(fish_id):
+    """UUID fish ids travel as their 16 raw bytes, anything else as-is"""
+    if isinstance(fish_id, str) and len(fish_id) == 36 and fish_id[8] == fish_id[13] == fish_id[18] == fish_id[23] == "-":
+        try:
+            return bytes.fromhex(fish_id.replace("-", ""))
+        except ValueError:
+            pass
+    return fish_id
+
+
+def unpack_fish_id(packed):
+    if isinstance(packed, bytes):
+        h = packed.hex()
+        return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+    return packed
+
+
+class UpdateBlock:
+    """Tick updates as columns instead of [fish_id, remaining_lifetime, x, y] rows.
+
+    ``ids`` is an (n, 16) uint8 array of UUID bytes, or a list of id strings
+    when a pond holds fish with non-UUID ids.
+    """
+    def __init__(self, ids, lifetime, x, y):
+        self.ids = ids
+        self.lifetime = lifetime
+        self.x = x
+        self.y = y
+
+    def __len__(self):
+        return len(self.lifetime)
+
+    def __iter__(self):
+        return iter(self.rows())
+
+    @property
+    def packed(self):
+        return not isinstance(self.ids, list)
+
+    def fish_ids(self):
+        if not self.packed:
+            return list(self.ids)
+        h = self.ids.tobytes().hex()
+        return [f"{h[i:i + 8]}-{h[i + 8:i + 12]}-{h[i + 12:i + 16]}-{h[i + 16:i + 20]}-{h[i + 20:i + 32]}"
+                for i in range(0, len(h), 32)]
+
+    def rows(self):
+        return [list(row) for row in zip(self.fish_ids(), self.lifetime.tolist(), self.x.tolist(), self.y.tolist())]
+
+    def select(self, mask):
+        """The rows where mask is True"""
+        ids = self.ids[mask] if self.packed else [i for i, keep in zip(self.ids, mask.tolist()) if keep]
+        return UpdateBlock(ids, self.lifetime[mask], self.x[mask], self.y[mask])
+
+    def pack(self):
+        return {
+            "ids": self.ids.tobytes() if self.packed else self.ids,
+            "lifetime": self.lifetime.astype("<i4").tobytes(),
+            "x": self.x.astype("<i4").tobytes(),
+            "y": self.y.astype("<i4").tobytes()
+        }
+
+    @classmethod
+    def unpack(cls, columns):
+        ids = columns["ids"]
+        if isinstance(ids, bytes):
+            ids = np.frombuffer(ids, dtype=np.uint8).reshape(-1, 16)
+        return cls(ids, *(np.frombuffer(columns[name], dtype="<i4") for name in ("lifetime", "x", "y")))
+
+
+def json_default(value):
+    if isinstance(value, UpdateBlock):
+        return value.rows()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class JsonCodec:
+    """The original format, understood by every replica"""
+    name = "json"
+    codec_id = 0
+
+    def encode(self, message):
+        fish = message.get("fish")
+        if isinstance(fish, list) and fish and not isinstance(fish[0], dict):
+            message = dict(message, fish=[f.to_dict() for f in fish])  # Pond Fish, through their caches
+        return json.dumps(message, default=json_default).encode("utf-8")
+
+    def decode(self, payload):
+        return json.loads(payload)
+
+
+class MsgpackCodec:
+    """msgpack with fish records flattened to arrays and UUIDs as raw bytes"""
+    name = "msgpack"
+    codec_id = 1
+    columnar = False
+
+    def __init__(self):
+        self.header = bytes((MAGIC, WIRE_VERSION, self.codec_id))
+
+    def encode(self, message):
+        return self.header + msgpack.packb(self._compact(message), use_bin_type=True)
+
+    def decode(self, payload):
+        return self._expand(msgpack.unpackb(payload[len(self.header):], raw=False))
+
+    def _compact(self, message):
+        message = dict(message)
+        fish = message.get("fish")
+        if isinstance(fish, dict):
+            message["fish"] = self._pack_fish(fish)
+        elif isinstance(fish, list):
+            message["fish"] = [self._pack_fish(f) for f in fish]
+        for field in FISH_ID_FIELDS:
+            if field in message:
+                message[field] = pack_fish_id(message[field])
+        for field in FISH_ID_LIST_FIELDS:
+            if field in message:
+                message[field] = [pack_fish_id(fish_id) for fish_id in message[field]]
+        updates = message.get("updates")
+        if self.columnar and isinstance(updates, UpdateBlock):
+            message["updates"] = updates.pack()
+        elif updates is not None:
+            message["updates"] = [
+                [pack_fish_id(fish_id), lifetime, x, y]
+                for fish_id, lifetime, x, y in updates
+            ]
+        if "departures" in message:
+            message["departures"] = [self._pack_fish(f) for f in message["departures"]]
+        if "entries" in message:
+            message["entries"] = [self._compact(entry) for entry in message["entries"]]
+        return message
+
+    def _expand(self, message):
+        fish = message.get("fish")
+        if isinstance(fish, list):
+            if fish and isinstance(fish[0], list):
+                message["fish"] = [self._unpack_fish(f) for f in fish]
+            elif fish and not isinstance(fish[0], dict):
+                message["fish"] = self._unpack_fish(fish)
+        for field in FISH_ID_FIELDS:
+            if field in message:
+                message[field] = unpack_fish_id(message[field])
+        for field in FISH_ID_LIST_FIELDS:
+            if field in message:
+                message[field] = [unpack_fish_id(fish_id) for fish_id in message[field]]
+        updates = message.get("updates")
+        if isinstance(updates, dict):
+            message["updates"] = UpdateBlock.unpack(updates)
+        elif updates is not None:
+            message["updates"] = [
+                [unpack_fish_id(fish_id), lifetime, x, y]
+                for fish_id, lifetime, x, y in updates
+            ]
+        if "departures" in message:
+            message["departures"] = [self._unpack_fish(f) for f in message["departures"]]
+        if "entries" in message:
+            message["entries"] = [self._expand(entry) for entry in message["entries"]]
+        return message
+
+    @staticmethod
+    def _pack_fish(fish):
+        if not isinstance(fish, dict):
+            return fish.wire_record()  # A pond Fish, which caches its record
+        x, y = fish["position"]
+        return [pack_fish_id(fish["id"]), fish["name"], fish["genesis_pond"],
+                fish["remaining_lifetime"], x, y]
+
+    @staticmethod
+    def _unpack_fish(record):
+        fish_id, name, genesis_pond, remaining_lifetime, x, y = record
+        return {
+            "id": unpack_fish_id(fish_id),
+            "name": name,
+            "genesis_pond": genesis_pond,
+            "remaining_lifetime": remaining_lifetime,
+            "position": (x, y)
+        }
+
+
+class ColumnarCodec(MsgpackCodec):
+    """msgpack with tick updates as packed column buffers"""
+    name = "columnar"
+    codec_id = 2
+    columnar = True
+
+
+JSON = JsonCodec()
+CODECS = {JSON.name: JSON}
+CODECS_BY_ID = {JSON.codec_id: JSON}
+
+
+def register_codec(codec):
+    """Make a codec available for negotiation and decoding"""
+    CODECS[codec.name] = codec
+    CODECS_BY_ID[codec.codec_id] = codec
+
+
+if msgpack is not None:
+    register_codec(MsgpackCodec())
+    register_codec(ColumnarCodec())
+
+# Most preferred first
+PREFERENCE = ["columnar", "msgpack", "json"]
+
+
+def supported_codecs():
+    """Codec names this process can speak, most preferred first"""
+    return [name for name in PREFERENCE if name in CODECS]
+
+
+def negotiate(peer_codecs):
+    """Pick the best codec every peer understands.
+
+    ``peer_codecs`` is an iterable of codec-name lists, one per peer. Peers
+    that never advertised any are legacy replicas and only speak JSON.
+    """
+    common = set(supported_codecs())
+    for codecs in peer_codecs:
+        common &= set(codecs or [JSON.name])
+    for name in supported_codecs():
+        if name in common:
+            return CODECS[name]
+    return JSON
+
+
+def decode(payload):
+    """Decode a message from any codec, raises ValueError on garbage"""
+    if not payload:
+        raise ValueError("empty payload")
+    if payload[0] != MAGIC:
+        return JSON.decode(payload)
+    if len(payload) < 3 or payload[1] != WIRE_VERSION:
+        raise ValueError("unsupported wire version")
+    codec = CODECS_BY_ID.get(payload[2])
+    if codec is None:
+        raise ValueError(f"unknown codec id {payload[2]}")
+    try:
+        return codec.decode(payload)
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"corrupt {codec.name} payload: {e}")
@@ -0,0 +1,187 @@
+"""Primary election on a Redis lease with fencing tokens.
+
+The primary is whoever holds ``leader:<pond>``. The key is taken with SET NX
+PX, so exactly one replica can win it, and renewed every RENEW_INTERVAL
+with a compare-and-extend (WATCH/MULTI), so a replica can only extend a
+lease it still holds. Each win also INCRs ``leader:<pond>:epoch``: the new
+primary stamps that fencing token on everything it replicates, and replicas
+drop messages from an older epoch. A primary that stalled past its lease
+therefore cannot overwrite its successor.
+
+A holder stops acting as primary once LEASE_MS - DRIFT_MS has passed since
+its last successful renewal started, before the key can expire in Redis
+and someone else win it. Replicas without the lease try SET NX every
+ACQUIRE_INTERVAL, with jitter. That is one Redis command each and no
+broadcast, so a crashed primary is replaced about LEASE_MS after its last
+renewal, and only the winner announces itself. A replica still waiting for
+its state sync only contends once the lease has stayed free for a whole
+LEASE_MS, so a synced replica wins whenever there is one. The replica opens
+its MQTT client when it wins and closes it when it loses.
+"""
+import random
+import threading
+import time
+
+import redis
+
+LEASE_MS = 5000  # Lease length; a crashed primary is replaced about this long after its last renewal
+RENEW_INTERVAL = 1.0  # Seconds between renewals; a primary may stall about 3 s without losing the lease
+ACQUIRE_INTERVAL = 0.5  # Seconds between attempts to take a free lease
+DRIFT_MS = 1000  # Clock drift and renewal latency the holder allows for before its lease runs out
+
+
+class Election:
+    def __init__(self, replica, redis_client, lease_ms=LEASE_MS, renew_interval=RENEW_INTERVAL,
+                 acquire_interval=ACQUIRE_INTERVAL, drift_ms=DRIFT_MS):
+        self.replica = replica
+        self.redis_client = redis_client
+        self.key = f"leader:{replica.name}"
+        self.epoch_key = f"{self.key}:epoch"
+        self.lease_ms = lease_ms
+        self.renew_interval = renew_interval
+        self.acquire_interval = acquire_interval
+        self.drift_ms = drift_ms
+        self.leading = False
+        self.epoch = 0  # Fencing token of our current or last term
+        self.deadline = 0.0  # Monotonic time our lease is safe until
+        self.hold_off_until = 0.0  # After stepping down, leave the lease to the others for a while
+        self.free_since = None  # When a replica still syncing first saw the lease free
+        self.lock = threading.RLock()
+        self.running = False
+        self.thread = None
+        self.wake = threading.Event()
+        self.counters = {"terms": 0, "renewals": 0, "lost": 0, "released": 0, "acquire_attempts": 0, "errors": 0}
+
+    def valid(self):
+        """True while we hold a lease that cannot have expired in Redis"""
+        return self.leading and time.monotonic() < self.deadline
+
+    def current_epoch(self):
+        """The latest term anyone has won"""
+        return int(self.redis_client.get(self.epoch_key) or 0)
+
+    def holder(self):
+        holder = self.redis_client.get(self.key)
+        return holder.decode("utf-8") if holder else None
+
+    def acquire(self, force=False):
+        """Take the lease if it is free, or from its holder with force; returns True if we hold it"""
+        with self.lock:
+            if self.leading and not force:
+                return True
+            self.counters["acquire_attempts"] += 1
+            started = time.monotonic()
+            if not self.redis_client.set(self.key, self.replica.replica_id, px=self.lease_ms, nx=not force):
+                return False
+            epoch = self.redis_client.incr(self.epoch_key)
+            self.leading = True
+            self.epoch = epoch
+            self.deadline = started + (self.lease_ms - self.drift_ms) / 1000
+            self.counters["terms"] += 1
+        self.replica.become_primary(epoch)
+        return True
+
+    def eligible(self):
+        """Whether to contend for a free lease now"""
+        if time.monotonic() < self.hold_off_until:
+            return False
+        if self.replica.sync_requested_at is None:
+            return True
+        # Without our state we would make a poor primary; let a synced replica win first
+        if self.redis_client.exists(self.key):
+            self.free_since = None
+            return False
+        if self.free_since is None:
+            self.free_since = time.monotonic()
+        return time.monotonic() - self.free_since >= self.lease_ms / 1000
+
+    def renew(self):
+        """Extend the lease if it is still ours"""
+        started = time.monotonic()
+        with self.redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(self.key)
+                if pipe.get(self.key) != self.replica.replica_id.encode("utf-8"):
+                    return False
+                pipe.multi()
+                pipe.pexpire(self.key, self.lease_ms)
+                pipe.execute()
+            except redis.WatchError:
+                return False
+        with self.lock:
+            if self.leading:
+                self.deadline = started + (self.lease_ms - self.drift_ms) / 1000
+                self.counters["renewals"] += 1
+        return True
+
+    def lose(self, reason):
+        """Stop acting as primary; the lease, if still ours, runs out on its own"""
+        with self.lock:
+            if not self.leading:
+                return
+            self.leading = False
+            self.counters["lost"] += 1
+        print(f"Replica {self.replica.replica_id} lost the primary lease (epoch {self.epoch}): {reason}")
+        self.replica.step_down()
+
+    def release(self):
+        """Step down and free the lease right away, so another replica takes it on its next attempt"""
+        if not self.leading:
+            return
+        with self.redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(self.key)
+                if pipe.get(self.key) == self.replica.replica_id.encode("utf-8"):
+                    pipe.multi()
+                    pipe.delete(self.key)
+                    pipe.execute()
+            except redis.WatchError:
+                pass
+        self.hold_off_until = time.monotonic() + self.lease_ms / 1000
+        self.counters["released"] += 1
+        self.lose("released")
+
+    def superseded(self, epoch):
+        """Another replica announced a later term than ours"""
+        if self.leading and epoch > self.epoch:
+            self.lose(f"epoch {epoch} took over")
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            if self.leading:
+                timeout = min(self.renew_interval, max(0, self.deadline - time.monotonic()))
+            else:
+                timeout = self.acquire_interval * random.uniform(0.5, 1.5)
+            self.wake.wait(timeout)
+            self.wake.clear()
+            if not self.running:
+                break
+            try:
+                if self.leading:
+                    if time.monotonic() >= self.deadline:
+                        self.lose("lease ran out before it could be renewed")
+                    elif not self.renew():
+                        self.lose("lease is held by another replica")
+                elif self.eligible():
+                    self.acquire()
+            except Exception as e:
+                self.counters["errors"] += 1
+                print(f"Election error: {e}")
+                if self.leading and time.monotonic() >= self.deadline:
+                    self.lose("lease ran out while Redis was unreachable")
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        try:
+            self.release()
+        except Exception as e:
+            print(f"Releasing the primary lease failed: {e}")
+
+    def stats(self):
+        return {"leading": int(self.valid()), "epoch": self.epoch, **self.counters}
@@ -0,0 +1,76 @@
+"""Headless driver for a pond replica.
+
+The engine owns the simulation tick that used to run from the Qt window's
+timer, so a replica can run on a server without a display. Ticks come from
+a FixedStepScheduler (scheduler.py) on the engine's own thread: a fixed
+timestep at a configurable rate, bounded catch-up after a stall, and jitter
+and overrun counts exported as ``fishhaven_scheduler``. Each tick advances
+the pond by the timestep, so fish live as many seconds at 60 Hz as at 1 Hz.
+The primary is settled separately, on the Redis lease in election.py.
+Anything that wants to follow along (the Qt UI, metrics, tests) subscribes
+to ``replica.events``; the engine emits ``tick`` after every step, and the
+UI only samples the latest state when it repaints.
+"""
+import time
+
+from scheduler import FixedStepScheduler, MAX_CATCH_UP
+
+TICK_INTERVAL = 1.0  # Seconds between simulation ticks
+
+
+class PondEngine:
+    def __init__(self, replica, tick_interval=TICK_INTERVAL, max_catch_up=MAX_CATCH_UP):
+        self.replica = replica
+        self.tick_interval = tick_interval
+        self.scheduler = FixedStepScheduler(self.tick, 1.0 / tick_interval, max_catch_up,
+                                            name=f"tick-{replica.replica_id}")
+        replica.metrics.watch_scheduler(self.scheduler)
+
+    @property
+    def running(self):
+        return self.scheduler.running
+
+    def start(self):
+        """Run the tick loop on a background thread"""
+        self.scheduler.start()
+
+    def stop(self):
+        self.scheduler.stop()
+
+    def tick(self, dt=None):
+        """Advance the pond one step"""
+        self.replica.update(self.tick_interval if dt is None else dt)
+        self.replica.events.emit("tick", {
+            "replica_id": self.replica.replica_id,
+            "is_primary": self.replica.is_primary,
+            "sharded": self.replica.sharded,
+            "fish_count": len(self.replica.fish_list)
+        })
+
+    def stats(self):
+        return self.scheduler.stats()
+
+    def shutdown(self):
+        """Stop ticking and hand the primary role to another replica"""
+        self.stop()
+        if self.replica.is_primary:
+            self.replica.reassign_primary()
+
+
+def run_headless(replicas, tick_interval=TICK_INTERVAL):
+    """Run one engine per replica in this process until interrupted"""
+    engines = [PondEngine(replica, tick_interval) for replica in replicas]
+    for engine in engines:
+        engine.start()
+    for replica in replicas:
+        replica.announce()
+    print(f"Running {len(engines)} headless replica(s) at {1 / tick_interval:g} Hz: "
+          f"{', '.join(r.replica_id for r in replicas)}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Shutting down")
+    finally:
+        for engine in engines:
+            engine.shutdown()
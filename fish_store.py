@@ -0,0 +1,265 @@
+"""Columnar storage for the fish in a pond.
+
+Positions, remaining lifetimes and genesis ponds live in NumPy columns indexed
+by slot so a whole tick can be applied as a handful of array operations.
+``Fish`` objects stay around as lightweight views: while a fish is attached to
+a store its ``position`` and ``remaining_lifetime`` read and write the
+columns, so the UI and serialization code keep working on plain objects.
+
+Deletion swaps the last slot into the hole, keeping every operation O(1).
+
+Each slot also keeps the fish id as 16 raw UUID bytes, so tick deltas can
+be cut out of the columns as an ``UpdateBlock`` and applied on the other
+side by matching those bytes, without a dict lookup per fish.
+"""
+import numpy as np
+
+from codec import UpdateBlock, pack_fish_id
+from shard import fish_key
+from spatial import POND_WIDTH, POND_HEIGHT, cell_of, cells_of
+
+
+class FishStore:
+    def __init__(self, capacity=1024):
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.lifetime = np.zeros(capacity, dtype=np.int32)
+        self.pond_code = np.zeros(capacity, dtype=np.int16)
+        self.key = np.zeros(capacity, dtype=np.uint64)  # Id hash, for sharding
+        self.uid = np.zeros((capacity, 16), dtype=np.uint8)  # UUID bytes of the id
+        self.cell = np.zeros(capacity, dtype=np.int16)  # Spatial grid cell of x/y
+        self.version = 0  # Bumped whenever cells or slots change, for the grid
+        self.plain_ids = set()  # Ids that are not UUIDs, which rule out packed blocks
+        self.fish = []    # slot -> Fish view
+        self.by_id = {}   # fish id -> Fish view, the view knows its slot
+        self.pond_names = []
+        self.pond_codes = {}
+
+    def __len__(self):
+        return len(self.fish)
+
+    def __contains__(self, fish_id):
+        return fish_id in self.by_id
+
+    def __iter__(self):
+        return iter(self.fish)
+
+    def get(self, fish_id):
+        return self.by_id.get(fish_id)
+
+    def code_for(self, genesis_pond):
+        """Intern a genesis pond name as a small integer code"""
+        code = self.pond_codes.get(genesis_pond)
+        if code is None:
+            code = len(self.pond_names)
+            self.pond_names.append(genesis_pond)
+            self.pond_codes[genesis_pond] = code
+        return code
+
+    def _grow(self, needed):
+        capacity = len(self.x)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for column in ("x", "y", "lifetime", "pond_code", "key", "uid", "cell"):
+            old = getattr(self, column)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, column, new)
+
+    def add(self, fish):
+        """Attach a fish to the store, returns False if its id is already present"""
+        if fish.id in self.by_id:
+            return False
+        slot = len(self.fish)
+        self._grow(slot + 1)
+        x, y = fish.position
+        self.x[slot] = x
+        self.y[slot] = y
+        self.cell[slot] = cell_of(x, y)
+        self.lifetime[slot] = fish.remaining_lifetime
+        self.pond_code[slot] = self.code_for(fish.genesis_pond)
+        self.key[slot] = fish_key(fish.id)
+        self.set_uid(slot, fish.id)
+        self.fish.append(fish)
+        self.by_id[fish.id] = fish
+        fish.attach(self, slot)
+        self.version += 1
+        return True
+
+    def remove(self, fish_id):
+        """Detach and return a fish by id (swap-remove), or None"""
+        fish = self.by_id.pop(fish_id, None)
+        if fish is None:
+            return None
+        slot = fish._slot
+        fish.detach()
+        last = len(self.fish) - 1
+        if slot != last:
+            moved = self.fish[last]
+            self.x[slot] = self.x[last]
+            self.y[slot] = self.y[last]
+            self.lifetime[slot] = self.lifetime[last]
+            self.pond_code[slot] = self.pond_code[last]
+            self.key[slot] = self.key[last]
+            self.uid[slot] = self.uid[last]
+            self.cell[slot] = self.cell[last]
+            self.fish[slot] = moved
+            moved._slot = slot
+        self.fish.pop()
+        self.version += 1
+        self.plain_ids.discard(fish_id)
+        return fish
+
+    def set_uid(self, slot, fish_id):
+        packed = pack_fish_id(fish_id)
+        if isinstance(packed, bytes):
+            self.uid[slot] = np.frombuffer(packed, dtype=np.uint8)
+        else:
+            self.uid[slot] = 0
+            self.plain_ids.add(fish_id)
+
+    def remove_many(self, fish_ids):
+        """Remove several fish, returns the ones that were present"""
+        removed = []
+        for fish_id in fish_ids:
+            fish = self.remove(fish_id)
+            if fish is not None:
+                removed.append(fish)
+        return removed
+
+    def load(self, fish, x, y, lifetime, pond_code, pond_names):
+        """Replace the contents with whole columns, e.g. from a snapshot.
+
+        ``fish`` are detached views in slot order and ``pond_code`` indexes
+        ``pond_names``.
+        """
+        self.clear()
+        n = len(fish)
+        self._grow(n)
+        codes = np.array([self.code_for(name) for name in pond_names] or [0], dtype=np.int16)
+        self.x[:n] = x
+        self.y[:n] = y
+        self.cell[:n] = cells_of(self.x[:n], self.y[:n])
+        self.lifetime[:n] = lifetime
+        self.pond_code[:n] = codes[pond_code]
+        self.key[:n] = [fish_key(f.id) for f in fish]
+        for slot, f in enumerate(fish):
+            self.set_uid(slot, f.id)
+        self.fish = list(fish)
+        self.by_id = {f.id: f for f in self.fish}
+        for slot, f in enumerate(self.fish):
+            f.attach(self, slot)
+        self.version += 1
+
+    def clear(self):
+        for fish in self.fish:
+            fish.detach()
+        self.fish = []
+        self.by_id = {}
+        self.plain_ids = set()
+        self.version += 1
+
+    def slots_for(self, uids):
+        """Slot of each packed id, -1 where we don't have the fish"""
+        n = len(self.fish)
+        if n == 0:
+            return np.full(len(uids), -1, dtype=np.intp)
+        keys = uids[:, :8].copy().view(">u8").ravel().astype(np.uint64)  # Same as fish_key for UUIDs
+        order = np.argsort(self.key[:n])
+        sorted_keys = self.key[:n][order]
+        # Searching in key order keeps the binary searches cache friendly
+        key_order = np.argsort(keys)
+        positions = np.empty(len(keys), dtype=np.intp)
+        positions[key_order] = np.searchsorted(sorted_keys, keys[key_order])
+        positions = np.minimum(positions, n - 1)
+        slots = order[positions]
+        found = (sorted_keys[positions] == keys) & (self.uid[slots] == uids).all(axis=1)
+        return np.where(found, slots, -1)
+
+    def apply_updates(self, rows):
+        """Write [fish_id, remaining_lifetime, x, y] rows, or an UpdateBlock, into the columns"""
+        if isinstance(rows, UpdateBlock) and rows.packed:
+            slots = self.slots_for(rows.ids)
+            found = slots >= 0
+            if not found.all():
+                # Unknown fish, or a rare 64-bit key collision: settle those by id
+                self.apply_updates(rows.select(~found).rows())
+            slots = slots[found]
+            self.lifetime[slots] = rows.lifetime[found]
+            self.move(slots, rows.x[found], rows.y[found])
+            return
+        slots, lifetimes, xs, ys = [], [], [], []
+        by_id = self.by_id
+        for fish_id, remaining_lifetime, x, y in rows:
+            fish = by_id.get(fish_id)
+            if fish is not None:
+                slots.append(fish._slot)
+                lifetimes.append(remaining_lifetime)
+                xs.append(x)
+                ys.append(y)
+        if slots:
+            self.lifetime[slots] = lifetimes
+            self.move(np.array(slots, dtype=np.intp), np.array(xs, dtype=np.int32), np.array(ys, dtype=np.int32))
+
+    def move(self, slots, xs, ys):
+        """Write new positions, keeping the grid cells in step"""
+        self.x[slots] = xs
+        self.y[slots] = ys
+        self.cell[slots] = cells_of(self.x[slots], self.y[slots])
+        self.version += 1
+
+    def age(self, slots=None):
+        """Age every fish (or the given slots) by one tick, returns the slots that were already at zero"""
+        if slots is None:
+            n = len(self.fish)
+            lifetime = self.lifetime[:n]
+            alive = lifetime > 0
+            lifetime[alive] -= 1
+            return np.flatnonzero(~alive)
+        lifetime = self.lifetime[slots]
+        alive = lifetime > 0
+        self.lifetime[slots[alive]] -= 1
+        return slots[~alive]
+
+    def random_walk(self, slots, rng, step=10):
+        """Move the given slots by up to +-step on each axis, clamped to the pond"""
+        if len(slots) == 0:
+            return
+        dx = rng.integers(-step, step + 1, size=len(slots), dtype=np.int32)
+        dy = rng.integers(-step, step + 1, size=len(slots), dtype=np.int32)
+        self.move(slots, np.clip(self.x[slots] + dx, 0, POND_WIDTH), np.clip(self.y[slots] + dy, 0, POND_HEIGHT))
+
+    def updates(self, slots):
+        """An UpdateBlock for the given slots"""
+        if self.plain_ids:
+            ids = [self.fish[slot].id for slot in slots.tolist()]
+        else:
+            ids = self.uid[slots]
+        return UpdateBlock(ids, self.lifetime[slots], self.x[slots], self.y[slots])
+
+    def sprites(self, fish_ids=None):
+        """{fish id: (x, y, genesis pond)} for every fish, or for those of fish_ids still present.
+
+        Plain values copied out of the columns, so the caller can use them
+        after letting go of the lock that keeps the store still.
+        """
+        if fish_ids is None:
+            fish = self.fish
+            slots = np.arange(len(fish))
+        else:
+            fish = [self.by_id[fish_id] for fish_id in fish_ids if fish_id in self.by_id]
+            slots = np.fromiter((f._slot for f in fish), dtype=np.intp, count=len(fish))
+        return {f.id: (x, y, f.genesis_pond)
+                for f, x, y in zip(fish, self.x[slots].tolist(), self.y[slots].tolist())}
+
+    def rows(self, slots):
+        """[fish_id, remaining_lifetime, x, y] rows for the given slots"""
+        fish = self.fish
+        return [
+            [fish[slot].id, remaining_lifetime, x, y]
+            for slot, remaining_lifetime, x, y in zip(
+                slots.tolist(), self.lifetime[slots].tolist(),
+                self.x[slots].tolist(), self.y[slots].tolist())
+        ]
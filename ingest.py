@@ -0,0 +1,143 @@
+"""Inbound fish ingestion on the primary.
+
+Fish arriving over MQTT are turned into pond fish exactly once, by the
+primary, and replicated as one sequenced ``add_fish_batch`` per interval:
+
+  - a fish whose message carries an ``id`` gets a uuid5 derived from it,
+    so every redelivery maps to the same fish; otherwise the primary
+    assigns a uuid4 once, and replicas only ever see that id
+  - redeliveries are dropped: known derived ids always, and id-less
+    messages when the broker flags them as a duplicate of a payload seen
+    within the last DUPLICATE_WINDOW seconds
+  - arrivals within INGEST_INTERVAL share one replication message
+
+Replicas no longer create fish from the raw MQTT relay, which used to give
+every arrival a fresh id on each replica.
+"""
+import hashlib
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+INGEST_INTERVAL = 0.1  # Seconds between batches
+MAX_BATCH = 1000
+SEEN_IDS = 100000  # Derived ids remembered for deduplication
+DUPLICATE_WINDOW = 60
+
+FISH_NAMESPACE = uuid.UUID("5b0c6f1e-3d4a-4f7e-9a51-f15a7e0c0de1")
+
+
+def arrival_lifetime(message):
+    """The message's lifetime as whole seconds, or None if it cannot become a fish"""
+    if not isinstance(message.get("name"), str) or not isinstance(message.get("group_name"), str):
+        return None
+    lifetime = message.get("lifetime")
+    if isinstance(lifetime, bool) or not isinstance(lifetime, (int, float)) or not math.isfinite(lifetime):
+        return None
+    return int(lifetime)
+
+
+def derived_fish_id(message):
+    """A stable fish id for a message that carries its own id, else None"""
+    if message.get("id") is None:
+        return None
+    return str(uuid.uuid5(FISH_NAMESPACE, f"{message.get('group_name')}/{message['id']}"))
+
+
+class RecentSet:
+    """Bounded set that forgets its oldest entries, optionally after max_age seconds"""
+    def __init__(self, size, max_age=None):
+        self.size = size
+        self.max_age = max_age
+        self.items = OrderedDict()
+
+    def add(self, key):
+        """Remember a key, returns False if it was already remembered"""
+        now = time.monotonic()
+        seen_at = self.items.get(key)
+        if seen_at is not None and (self.max_age is None or now - seen_at < self.max_age):
+            return False
+        self.items[key] = now
+        self.items.move_to_end(key)
+        while len(self.items) > self.size:
+            self.items.popitem(last=False)
+        return True
+
+
+class IngestStage:
+    def __init__(self, replica, fish_factory, interval=INGEST_INTERVAL):
+        self.replica = replica
+        self.fish_factory = fish_factory
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.pending = []
+        self.seen_ids = RecentSet(SEEN_IDS)
+        self.seen_payloads = RecentSet(SEEN_IDS, DUPLICATE_WINDOW)
+        self.running = False
+        self.counters = {"received": 0, "duplicates": 0, "invalid": 0, "ingested": 0, "batches": 0}
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        self.flush()
+
+    def submit(self, message, duplicate=False):
+        """Take one fish message from MQTT, returns True if it was accepted"""
+        self.counters["received"] += 1
+        # Checked here, since one fish that fails to build in flush would lose its whole batch
+        lifetime = arrival_lifetime(message)
+        if lifetime is None:
+            self.counters["invalid"] += 1
+            return False
+
+        fish_id = derived_fish_id(message)
+        payload_key = hashlib.blake2b(repr(sorted(message.items())).encode("utf-8"), digest_size=16).digest()
+        with self.lock:
+            first_payload = self.seen_payloads.add(payload_key)
+            if fish_id is not None:
+                fresh = self.seen_ids.add(fish_id)
+            else:
+                # Without an id only the broker's dup flag tells a redelivery
+                # apart from a new fish that happens to look the same
+                fresh = first_payload or not duplicate
+            if not fresh:
+                self.counters["duplicates"] += 1
+                return False
+            self.pending.append((message, lifetime, fish_id or str(uuid.uuid4())))
+            full = len(self.pending) >= MAX_BATCH
+        if full:
+            self.flush()
+        return True
+
+    def run(self):
+        while self.running:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Ingest error: {e}")
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        if not pending:
+            return
+        fish = [
+            self.fish_factory(name=message["name"], genesis_pond=message["group_name"],
+                              remaining_lifetime=lifetime, fish_id=fish_id)
+            for message, lifetime, fish_id in pending
+        ]
+        added = self.replica.add_fish_batch(fish)
+        self.counters["ingested"] += added
+        self.counters["duplicates"] += len(fish) - added
+        self.counters["batches"] += 1
+
+    def stats(self):
+        with self.lock:
+            pending = len(self.pending)
+        return dict(self.counters, pending=pending)
@@ -0,0 +1,336 @@
+"""Synthetic neighbour ponds, for load-testing the primary without the other teams.
+
+Run it against the broker the primary uses, e.g. a local mosquitto with
+``main.py --mqtt-broker localhost``:
+
+    python loadgen.py --broker localhost --peers 3 --rate 20 --duration 60
+
+Every simulated peer pond:
+  - announces itself with a ``hello`` on fishhaven/stream every
+    --hello-interval seconds, saying whether it accepts batches
+  - sends fish to user/<our pond> at --rate fish per second, --batch per
+    message, each with an id and a lifetime drawn from --lifetime
+  - subscribes to user/<its name> and absorbs the fish we send it; the
+    first peers are named after DESTINATION so our migrations land on them
+
+With Redis reachable (--redis), VisibilityProbe follows the replication
+channel and the replicas' acks to measure ingestion throughput (fish the
+primary replicated per second) and the time from a fish being sent to it
+being applied on every live replica. Acks are reported every ACK_INTERVAL,
+so that time is rounded up by as much as one interval.
+"""
+import argparse
+import heapq
+import json
+import random
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+import redis
+
+import codec
+from ingest import derived_fish_id
+from pond import (POND_NAME, DESTINATION, REDIS_HOST, REDIS_PORT, REPLICA_CHANNEL, MQTT_PORT, MQTT_USERNAME,
+                  MQTT_PASSWORD)
+
+HELLO_INTERVAL = 5  # Seconds between a peer's hello messages
+PROBE_INTERVAL = 0.05  # Seconds between VisibilityProbe's reads of the acks
+
+
+class PeerPond:
+    """One simulated neighbour: what it sent, when, and what it received from us"""
+    def __init__(self, name, rate, batch=1, lifetime=(10, 60), hello_interval=HELLO_INTERVAL):
+        self.name = name
+        self.rate = rate
+        self.batch = batch
+        self.lifetime = lifetime
+        self.hello_interval = hello_interval
+        self.sent = 0
+        self.counters = {"fish_sent": 0, "messages_sent": 0, "hellos": 0, "fish_absorbed": 0}
+
+    def hello(self):
+        return {
+            "type": "hello",
+            "sender": self.name,
+            "timestamp": int(time.time()),
+            "data": {"accepts_batches": self.batch > 1}
+        }
+
+    def next_fish(self):
+        self.sent += 1
+        return {
+            "id": f"{self.name}-{self.sent}",
+            "name": f"{self.name}Fish{self.sent}",
+            "group_name": self.name,
+            "lifetime": random.randint(*self.lifetime)
+        }
+
+    def absorb(self, payload):
+        """Take fish our pond sent this peer, one or a batch"""
+        message = json.loads(payload)
+        self.counters["fish_absorbed"] += len(message) if isinstance(message, list) else 1
+
+
+class LoadGenerator:
+    """Drives any number of PeerPonds through one MQTT client"""
+    def __init__(self, client, peers, target=POND_NAME, on_sent=None):
+        self.client = client
+        self.peers = {peer.name: peer for peer in peers}
+        self.target = target
+        self.on_sent = on_sent  # on_sent(fish messages, sent_at), e.g. VisibilityProbe.sent
+        self.running = False
+        self.thread = None
+        self.started_at = None
+
+    def start(self):
+        self.client.on_message = self.on_message
+        for name in self.peers:
+            self.client.subscribe(f"user/{name}", qos=1)
+        self.running = True
+        self.started_at = time.monotonic()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def on_message(self, client, userdata, msg):
+        peer = self.peers.get(msg.topic[len("user/"):]) if msg.topic.startswith("user/") else None
+        if peer:
+            try:
+                peer.absorb(msg.payload)
+            except Exception as e:
+                print(f"Peer {peer.name} got an unreadable fish: {e}")
+
+    def run(self):
+        """Send every peer's hellos and fish on schedule, from one thread"""
+        now = time.monotonic()
+        schedule = []  # (due, tie-breaker, kind, peer)
+        for i, peer in enumerate(self.peers.values()):
+            schedule.append((now + random.uniform(0, 1), i, "hello", peer))
+            if peer.rate > 0:
+                schedule.append((now + random.uniform(0, peer.batch / peer.rate), i, "fish", peer))
+        heapq.heapify(schedule)
+        while self.running and schedule:
+            due, i, kind, peer = heapq.heappop(schedule)
+            time.sleep(max(0, due - time.monotonic()))
+            if not self.running:
+                break
+            if kind == "hello":
+                self.client.publish("fishhaven/stream", json.dumps(peer.hello()))
+                peer.counters["hellos"] += 1
+                heapq.heappush(schedule, (due + peer.hello_interval, i, kind, peer))
+                continue
+            fish = [peer.next_fish() for _ in range(peer.batch)]
+            sent_at = time.time()
+            self.client.publish(f"user/{self.target}", json.dumps(fish if peer.batch > 1 else fish[0]), qos=1)
+            peer.counters["fish_sent"] += len(fish)
+            peer.counters["messages_sent"] += 1
+            if self.on_sent:
+                self.on_sent(fish, sent_at)
+            # Fall behind rather than burst if sending itself is slow
+            heapq.heappush(schedule, (max(due + peer.batch / peer.rate, time.monotonic()), i, kind, peer))
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def stats(self):
+        totals = {}
+        for peer in self.peers.values():
+            for name, value in peer.counters.items():
+                totals[name] = totals.get(name, 0) + value
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0
+        totals["fish_sent_per_s"] = totals.get("fish_sent", 0) / elapsed if elapsed else 0.0
+        return totals
+
+
+class VisibilityProbe:
+    """Watches Redis for when sent fish are replicated and applied everywhere.
+
+    The primary's ``add_fish_batch`` on the replication channel tells when a
+    fish was ingested and under which seq; a fish is visible on all replicas
+    once every live member other than the primary has acked that seq.
+    """
+    def __init__(self, redis_client, pond=POND_NAME):
+        self.redis_client = redis_client
+        self.members_key = f"members:{pond}"
+        self.adverts_key = f"{self.members_key}:adverts"
+        self.acks_key = f"acks:{pond}"
+        self.lock = threading.Lock()
+        self.sent_at = {}  # Derived fish id -> when it was sent
+        self.pending = []  # (seq, [(fish id, sent_at)]) replicated but not yet acked by everyone
+        self.ingest_latencies = []
+        self.visible_latencies = []
+        self.ingested = 0
+        self.first_ingest = None
+        self.last_ingest = None
+        self.running = False
+        self.pubsub = None
+
+    def sent(self, messages, sent_at):
+        with self.lock:
+            for message in messages:
+                self.sent_at[derived_fish_id(message)] = sent_at
+
+    def start(self):
+        self.running = True
+        self.pubsub = self.redis_client.pubsub()
+        self.pubsub.subscribe(REPLICA_CHANNEL)
+        threading.Thread(target=self.listen, daemon=True).start()
+        threading.Thread(target=self.poll, daemon=True).start()
+
+    def listen(self):
+        while self.running:
+            message = self.pubsub.get_message(timeout=0.1)
+            if not message or message["type"] != "message":
+                continue
+            try:
+                data = codec.decode(message["data"])
+            except ValueError:
+                continue
+            if data.get("type") != "add_fish_batch" or "seq" not in data:
+                continue
+            now = time.time()
+            with self.lock:
+                fish = [(f["id"], self.sent_at.pop(f["id"])) for f in data["fish"] if f["id"] in self.sent_at]
+                if not fish:
+                    continue
+                self.ingest_latencies.extend(now - sent_at for _, sent_at in fish)
+                self.ingested += len(fish)
+                self.first_ingest = self.first_ingest or now
+                self.last_ingest = now
+                self.pending.append((data["seq"], fish))
+
+    def caught_up_to(self):
+        """Lowest seq acked by the live non-primary members, or None if there are none"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zrange(self.members_key, 0, -1)
+        pipe.hgetall(self.adverts_key)
+        pipe.hgetall(self.acks_key)
+        members, adverts, acks = pipe.execute()
+        followers = [m for m in members if not json.loads(adverts.get(m, b"{}")).get("is_primary")]
+        if not followers:
+            return None
+        return min(int(acks.get(m, 0)) for m in followers)
+
+    def poll(self):
+        while self.running:
+            time.sleep(PROBE_INTERVAL)
+            try:
+                caught_up_to = self.caught_up_to()
+            except Exception as e:
+                print(f"Visibility probe error: {e}")
+                continue
+            now = time.time()
+            with self.lock:
+                still_pending = []
+                for seq, fish in self.pending:
+                    if caught_up_to is None or seq <= caught_up_to:
+                        self.visible_latencies.extend(now - sent_at for _, sent_at in fish)
+                    else:
+                        still_pending.append((seq, fish))
+                self.pending = still_pending
+
+    def stop(self):
+        self.running = False
+        try:
+            self.pubsub.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self.lock:
+            span = (self.last_ingest - self.first_ingest) if self.ingested > 1 else 0
+            return {
+                "ingested": self.ingested,
+                "ingested_per_s": self.ingested / span if span else 0.0,
+                "not_yet_ingested": len(self.sent_at),
+                "not_yet_visible": sum(len(fish) for _, fish in self.pending),
+                "ingest_p50_ms": percentile(self.ingest_latencies, 0.50) * 1000,
+                "ingest_p99_ms": percentile(self.ingest_latencies, 0.99) * 1000,
+                "visible_p50_ms": percentile(self.visible_latencies, 0.50) * 1000,
+                "visible_p99_ms": percentile(self.visible_latencies, 0.99) * 1000,
+                "visible_max_ms": max(self.visible_latencies, default=0.0) * 1000
+            }
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def peer_names(count):
+    """Our destinations first, so the fish we send out land on simulated peers"""
+    return (DESTINATION + [f"Peer{i}" for i in range(count)])[:count]
+
+
+def host_port(address, default_port):
+    host, _, port = address.partition(":")
+    return host, int(port or default_port)
+
+
+def report(generator, probe):
+    sent = generator.stats()
+    line = (f"sent {sent['fish_sent']} fish ({sent['fish_sent_per_s']:.1f}/s) in {sent['messages_sent']} messages, "
+            f"{sent['hellos']} hellos | absorbed {sent['fish_absorbed']} of ours")
+    if probe:
+        seen = probe.stats()
+        line += (f" | ingested {seen['ingested']} ({seen['ingested_per_s']:.1f}/s), "
+                 f"p50/p99 {seen['ingest_p50_ms']:.0f}/{seen['ingest_p99_ms']:.0f} ms | "
+                 f"visible everywhere p50/p99/max {seen['visible_p50_ms']:.0f}/{seen['visible_p99_ms']:.0f}/"
+                 f"{seen['visible_max_ms']:.0f} ms, {seen['not_yet_visible']} pending")
+    print(line, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--broker", default="localhost", help="MQTT broker as HOST[:PORT]")
+    parser.add_argument("--username", default=MQTT_USERNAME)
+    parser.add_argument("--password", default=MQTT_PASSWORD)
+    parser.add_argument("--peers", type=int, default=len(DESTINATION))
+    parser.add_argument("--rate", type=float, default=1.0, help="fish per second per peer")
+    parser.add_argument("--batch", type=int, default=1, help="fish per message; more than 1 sends JSON lists")
+    parser.add_argument("--lifetime", default="10-60", help="lifetime range of the fish sent, in seconds")
+    parser.add_argument("--hello-interval", type=float, default=HELLO_INTERVAL)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--report-interval", type=float, default=5)
+    parser.add_argument("--redis", default=f"{REDIS_HOST}:{REDIS_PORT}",
+                        help="Redis as HOST[:PORT] for ingestion and visibility times, or 'none'")
+    args = parser.parse_args()
+
+    low, _, high = args.lifetime.partition("-")
+    lifetime = (int(low), int(high or low))
+    peers = [PeerPond(name, args.rate, args.batch, lifetime, args.hello_interval) for name in peer_names(args.peers)]
+
+    probe = None
+    if args.redis != "none":
+        host, port = host_port(args.redis, REDIS_PORT)
+        probe = VisibilityProbe(redis.Redis(host=host, port=port))
+        probe.start()
+
+    client = mqtt.Client()
+    client.username_pw_set(args.username, args.password)
+    host, port = host_port(args.broker, MQTT_PORT)
+    client.connect(host, port, 60)
+    client.loop_start()
+    generator = LoadGenerator(client, peers, on_sent=probe.sent if probe else None)
+    generator.start()
+
+    deadline = time.monotonic() + args.duration
+    try:
+        while time.monotonic() < deadline:
+            time.sleep(min(args.report_interval, max(0, deadline - time.monotonic())))
+            report(generator, probe)
+    except KeyboardInterrupt:
+        pass
+    generator.stop()
+    time.sleep(2)  # Let the last fish land
+    report(generator, probe)
+    if probe:
+        probe.stop()
+    client.loop_stop()
+    client.disconnect()
+
+
+if __name__ == "__main__":
+    main()
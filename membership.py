@@ -0,0 +1,181 @@
+"""Replica membership kept in Redis instead of broadcast heartbeats.
+
+Every replica used to publish a heartbeat every 2 s that every other replica
+received and merged, so status traffic grew with the square of the cluster.
+Here each replica refreshes its own lease instead: its refresh time as its
+score in the ``members:<pond>`` sorted set, and its advert (role, codecs,
+last applied seq, sharded, fish count) in the ``members:<pond>:adverts``
+hash. Once per READ_INTERVAL it reads both back in one pipelined round
+trip. A member whose score is older than LEASE_TTL is gone, and whoever
+notices first removes its entries.
+
+Each replica does one write and one read per interval whatever the cluster
+size. known_replicas is updated in place from the read, and
+``member_joined`` / ``member_left`` are emitted on ``replica.events`` only
+when the live set changes. A replica that shuts down cleanly deletes its
+lease, so peers see it leave on their next read instead of LEASE_TTL later.
+Replicas from before leases never hold one; they stay in known_replicas
+(and so keep the codec negotiated down to JSON) while their register and
+heartbeat messages keep last_seen within LEASE_TTL.
+"""
+import json
+import random
+import threading
+import time
+
+import codec
+
+REFRESH_INTERVAL = 2  # Seconds between lease refreshes
+READ_INTERVAL = 2  # Seconds between membership reads
+LEASE_TTL = 15  # Seconds without a refresh before a replica is considered gone
+
+
+class Membership:
+    def __init__(self, replica, redis_client, refresh_interval=REFRESH_INTERVAL,
+                 read_interval=READ_INTERVAL, lease_ttl=LEASE_TTL):
+        self.replica = replica
+        self.redis_client = redis_client
+        self.key = f"members:{replica.name}"
+        self.adverts_key = f"{self.key}:adverts"
+        self.refresh_interval = refresh_interval
+        self.read_interval = read_interval
+        self.lease_ttl = lease_ttl
+        self.members = set()
+        self.running = False
+        self.thread = None
+        self.wake = threading.Event()
+        self.counters = {"refreshes": 0, "reads": 0, "joins": 0, "leaves": 0, "expired": 0, "errors": 0}
+
+    def advert(self):
+        """What peers learn about this replica from its lease"""
+        replica = self.replica
+        return {
+            "name": replica.name,
+            "timestamp": time.time(),
+            "is_primary": replica.is_primary,
+            "codecs": codec.supported_codecs(),
+            "seq": replica.last_seq,
+            "sharded": replica.sharded,
+            "fish_count": len(replica.fish_store)
+        }
+
+    def refresh(self):
+        """Renew our lease and advert in one round trip"""
+        advert = self.advert()
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zadd(self.key, {self.replica.replica_id: advert["timestamp"]})
+        pipe.hset(self.adverts_key, self.replica.replica_id, json.dumps(advert))
+        pipe.execute()
+        self.counters["refreshes"] += 1
+
+    def read(self):
+        """Fetch every lease and advert, update known_replicas and emit joins and leaves"""
+        cutoff = time.time() - self.lease_ttl
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zrange(self.key, 0, -1, withscores=True)
+        pipe.hgetall(self.adverts_key)
+        scores, adverts = pipe.execute()
+        self.counters["reads"] += 1
+
+        live, expired = {}, []
+        for member, score in scores:
+            rid = member.decode("utf-8")
+            if score < cutoff:
+                expired.append(rid)
+            else:
+                live[rid] = score
+        if expired:
+            self.expire(expired, cutoff)
+
+        known = self.replica.known_replicas
+        for rid, score in live.items():
+            entry = known.setdefault(rid, {})
+            entry["last_seen"] = max(entry.get("last_seen", 0), score)
+            entry["leased"] = True
+            advert = adverts.get(rid.encode("utf-8"))
+            if advert is None or rid == self.replica.replica_id:
+                continue
+            advert = json.loads(advert)
+            # A primary declaration received after this advert was written is newer news
+            if advert["timestamp"] >= entry.get("role_at", 0):
+                entry["is_primary"] = advert["is_primary"]
+            entry.update(name=advert["name"], codecs=advert["codecs"], seq=advert["seq"],
+                         sharded=advert["sharded"], fish_count=advert["fish_count"])
+        # A lease that is gone means the replica is; a replica that never had
+        # one is gone once its messages stop
+        for rid in [rid for rid, entry in list(known.items())
+                    if rid not in live and rid != self.replica.replica_id
+                    and (entry.get("leased") or entry.get("last_seen", 0) < cutoff)]:
+            del known[rid]
+
+        if self.replica.is_primary:
+            # One replica is enough to clear what the transport keeps for departed ones
+            self.replica.transport.prune(live.keys())
+
+        joined, left = live.keys() - self.members, self.members - live.keys()
+        self.members = set(live)
+        self.replica.negotiate_codec()
+        for rid in joined - {self.replica.replica_id}:
+            self.counters["joins"] += 1
+            self.replica.events.emit("member_joined", {"replica_id": rid})
+        for rid in left - {self.replica.replica_id}:
+            self.counters["leaves"] += 1
+            self.replica.events.emit("member_left", {"replica_id": rid})
+        return joined, left
+
+    def expire(self, replica_ids, cutoff):
+        """Drop leases that ran out; several readers may race to do this, which is harmless"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zremrangebyscore(self.key, "-inf", cutoff)
+        pipe.hdel(self.adverts_key, *replica_ids)
+        pipe.execute()
+        self.counters["expired"] += len(replica_ids)
+
+    def leave(self):
+        """Give up our lease so peers see us gone on their next read"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zrem(self.key, self.replica.replica_id)
+        pipe.hdel(self.adverts_key, self.replica.replica_id)
+        pipe.execute()
+
+    def nudge(self):
+        """Refresh now rather than at the next interval, after our role changed"""
+        self.wake.set()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        # Replicas started together would otherwise all read in the same instant
+        next_refresh = time.monotonic() + self.refresh_interval
+        next_read = time.monotonic() + random.uniform(0, self.read_interval)
+        while self.running:
+            self.wake.wait(max(0, min(next_refresh, next_read) - time.monotonic()))
+            if not self.running:
+                break
+            try:
+                now = time.monotonic()
+                if self.wake.is_set() or now >= next_refresh:
+                    self.wake.clear()
+                    self.refresh()
+                    next_refresh = now + self.refresh_interval
+                if now >= next_read:
+                    self.read()
+                    next_read = now + self.read_interval
+            except Exception as e:
+                self.counters["errors"] += 1
+                print(f"Membership error: {e}")
+                time.sleep(1)
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        try:
+            self.leave()
+        except Exception as e:
+            print(f"Membership leave failed: {e}")
+
+    def stats(self):
+        return {"members": len(self.members), **self.counters}
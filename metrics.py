@@ -0,0 +1,252 @@
+"""Prometheus metrics for a pond replica.
+
+A small in-process registry rendered in the Prometheus text exposition
+format, so replicas need no extra dependency. Each replica can serve its
+registry on its own port (``--metrics-port``); mqtt-monitoring's Prometheus
+scrapes it as the ``fishhaven`` job.
+
+Values that are cheap to read (fish count, known replicas, transport
+queues) are collected when scraped rather than tracked on every change.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, *labels):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        with self.lock:
+            items = list(self.values.items())
+        return self.header() + [
+            f"{self.name}{format_labels(self.label_names, labels)} {value}" for labels, value in items
+        ]
+
+
+class Gauge(Metric):
+    """A gauge whose value is either set or read from a callback when scraped"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=(), collect=None):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+
+    def set(self, value, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+    def render(self):
+        if self.collect:
+            items = list(self.collect())
+        else:
+            with self.lock:
+                items = list(self.values.items())
+        return self.header() + [
+            f"{self.name}{format_labels(self.label_names, labels)} {value}" for labels, value in items
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        with self.lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self.lock:
+            items = [(labels, (list(counts), total, count)) for labels, (counts, total, count) in self.values.items()]
+        lines = self.header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{format_labels(self.label_names, labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                print(f"Error collecting {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+class ReplicaMetrics:
+    """The metrics one replica reports, with the hooks PondReplica calls"""
+    def __init__(self, replica):
+        self.replica = replica
+        self.registry = registry = Registry()
+        self.server = None
+        self.tick_seconds = registry.add(Histogram(
+            "fishhaven_tick_seconds", "Duration of PondReplica.update()"))
+        # Publishes are queued for the transport's writer thread, so this is the enqueue, not the send
+        self.publish_enqueue_seconds = registry.add(Histogram(
+            "fishhaven_publish_enqueue_seconds", "Time spent queueing a publish for the transport's writer",
+            ["channel"]))
+        self.published_total = registry.add(Counter(
+            "fishhaven_published_messages_total", "Messages published", ["channel"]))
+        self.handle_seconds = registry.add(Histogram(
+            "fishhaven_message_handle_seconds", "Time spent handling a received message", ["channel", "type"]))
+        self.listener_lag_seconds = registry.add(Histogram(
+            "fishhaven_listener_lag_seconds", "Delay between a message's timestamp and handling it", ["channel"]))
+        self.primary_flips_total = registry.add(Counter(
+            "fishhaven_primary_flips_total", "Times this replica gained or lost the primary role"))
+        self.fenced_total = registry.add(Counter(
+            "fishhaven_fenced_messages_total", "Messages dropped because they came from a superseded primary"))
+        self.mqtt_publish_failures_total = registry.add(Counter(
+            "fishhaven_mqtt_publish_failures_total", "Failed MQTT publishes when moving fish", ["destination"]))
+        registry.add(Gauge("fishhaven_fish", "Fish in this replica's pond",
+                           collect=lambda: [((), len(replica.fish_list))]))
+        registry.add(Gauge("fishhaven_known_replicas", "Replicas this replica has heard from",
+                           collect=lambda: [((), len(replica.known_replicas))]))
+        registry.add(Gauge("fishhaven_is_primary", "1 while this replica is the primary",
+                           collect=lambda: [((), int(replica.is_primary))]))
+        registry.add(Gauge("fishhaven_last_seq", "Sequence number of the last applied mutation",
+                           collect=lambda: [((), replica.last_seq)]))
+        registry.add(Gauge("fishhaven_migration", "Outbound migration queue depth and send counters", ["stat"],
+                           collect=lambda: [((name,), value) for name, value in replica.migration.stats().items()]))
+        registry.add(Gauge("fishhaven_ingest", "Inbound fish ingestion counters", ["stat"],
+                           collect=lambda: [((name,), value) for name, value in replica.ingest.stats().items()]))
+        registry.add(Gauge("fishhaven_membership", "Live members and lease refresh/read counters", ["stat"],
+                           collect=lambda: [((name,), value) for name, value in replica.membership.stats().items()]))
+        registry.add(Gauge("fishhaven_election", "Primary lease term and renewal counters", ["stat"],
+                           collect=lambda: [((name,), value) for name, value in replica.election.stats().items()]))
+        registry.add(Gauge("fishhaven_replication", "Seq every live replica has applied, lag and ack counters",
+                           ["stat"], collect=lambda: [((name,), value) for name, value in replica.acks.stats().items()]))
+        registry.add(Gauge("fishhaven_replica_lag", "Mutations each replica is behind the primary", ["replica"],
+                           collect=lambda: [((rid,), behind) for rid, (behind, _) in replica.acks.lag().items()]))
+        registry.add(Gauge("fishhaven_replica_lag_seconds", "Age of the oldest mutation each replica has not applied",
+                           ["replica"],
+                           collect=lambda: [((rid,), seconds) for rid, (_, seconds) in replica.acks.lag().items()]))
+        registry.add(Gauge("fishhaven_shard", "Shard owners, rebalances and fish owned in sharded mode", ["stat"],
+                           collect=lambda: [((name,), value) for name, value in replica.shard_map.stats().items()]))
+        registry.add(Gauge("fishhaven_transport", "Replication transport counters and queue depths", ["stat"],
+                           collect=self.transport_stats))
+        self.scheduler = None  # The engine's FixedStepScheduler, once one drives this replica
+        registry.add(Gauge("fishhaven_scheduler", "Tick rate, catch-up, dropped steps, overruns and jitter", ["stat"],
+                           collect=self.scheduler_stats))
+
+    def transport_stats(self):
+        return [((name,), value) for name, value in self.replica.transport.stats().items()
+                if isinstance(value, (int, float))]
+
+    def scheduler_stats(self):
+        if self.scheduler is None:
+            return []
+        return [((name,), value) for name, value in self.scheduler.stats().items()]
+
+    def watch_scheduler(self, scheduler):
+        self.scheduler = scheduler
+
+    # Hooks
+
+    def observe_tick(self, seconds):
+        self.tick_seconds.observe(seconds)
+
+    def observe_publish(self, channel, seconds, count=1):
+        self.publish_enqueue_seconds.observe(seconds, channel)
+        self.published_total.inc(count, channel)
+
+    def observe_message(self, channel, message_type, seconds, sent_at=None):
+        self.handle_seconds.observe(seconds, channel, message_type)
+        if sent_at:
+            self.listener_lag_seconds.observe(max(0.0, time.time() - sent_at), channel)
+
+    def primary_flip(self):
+        self.primary_flips_total.inc()
+
+    def fenced(self):
+        self.fenced_total.inc()
+
+    def mqtt_publish_failure(self, destination):
+        self.mqtt_publish_failures_total.inc(1, destination)
+
+    # Endpoint
+
+    def serve(self, port, host="0.0.0.0"):
+        """Serve /metrics on a background thread"""
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes every 15 s would flood the console
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Serving metrics for replica {self.replica.replica_id} on port {port}")
+
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
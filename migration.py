@@ -0,0 +1,249 @@
+"""Outbound fish migration.
+
+Fish leaving the pond go into a bounded queue that a worker thread drains
+while this replica is the primary:
+
+  - each destination pond has a token bucket, so a burst of departures
+    cannot flood one peer
+  - fish for a pond that announced ``accepts_batches`` in its hello travel
+    several per publish, as a JSON list; everyone else gets the original
+    one-object-per-message protocol
+  - publishes use QoS 1 and the worker waits for the broker's ack; a failed
+    send is retried with backoff, then re-homed to another pond, and once
+    every pond has failed the fish is put back into our own pond
+
+If this replica loses the primary role, whatever is still queued goes back
+into the pond so the new primary sends it instead.
+"""
+import json
+import random
+import threading
+import time
+from collections import deque
+
+MIGRATION_QUEUE_SIZE = 10000
+DESTINATION_RATE = 20  # Fish per second to each destination pond
+DESTINATION_BURST = 40
+MAX_BATCH = 50  # Fish per publish to ponds that accept batches
+MAX_IN_FLIGHT = 20  # Publishes awaiting an ack at once
+ACK_TIMEOUT = 5
+ATTEMPTS_PER_DESTINATION = 3
+RETRY_DELAY = 0.5
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, wanted):
+        """Take up to wanted tokens, returns how many were available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        granted = min(wanted, int(self.tokens))
+        self.tokens -= granted
+        return granted
+
+
+class Departure:
+    """A fish on its way out, with its send history"""
+    def __init__(self, record, destination):
+        self.record = record
+        self.destination = destination
+        self.tried = {destination}
+        self.attempts = 0
+        self.not_before = 0.0
+
+    def payload(self):
+        return {
+            "name": self.record["name"],
+            "group_name": self.record["genesis_pond"],
+            "lifetime": self.record["remaining_lifetime"],
+        }
+
+
+class MigrationPipeline:
+    def __init__(self, replica, destinations, capacity=MIGRATION_QUEUE_SIZE,
+                 rate=DESTINATION_RATE, burst=DESTINATION_BURST):
+        self.replica = replica
+        self.destinations = list(destinations)
+        self.capacity = capacity
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.batch_capable = set()
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.started_at = time.monotonic()
+        self.counters = {
+            "submitted": 0, "rejected": 0, "sent": 0, "publishes": 0, "failures": 0,
+            "retries": 0, "rehomed": 0, "returned": 0
+        }
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+
+    def submit(self, fish, destination=None):
+        """Queue a fish for departure, returns False if the queue is full"""
+        with self.condition:
+            if len(self.queue) >= self.capacity:
+                self.counters["rejected"] += 1
+                return False
+            self.queue.append(Departure(fish.to_dict(), destination or random.choice(self.destinations)))
+            self.counters["submitted"] += 1
+            self.condition.notify()
+        return True
+
+    def note_hello(self, message):
+        """Remember ponds that announce they accept several fish per message"""
+        sender = message.get("sender")
+        if sender and (message.get("data") or {}).get("accepts_batches"):
+            self.batch_capable.add(sender)
+
+    def bucket(self, destination):
+        bucket = self.buckets.get(destination)
+        if bucket is None:
+            bucket = self.buckets[destination] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    # Worker
+
+    def run(self):
+        while self.running:
+            with self.condition:
+                if not self.queue:
+                    self.condition.wait(timeout=0.5)
+                    continue
+            if not self.replica.is_primary:
+                self.return_all()
+                time.sleep(0.1)
+                continue
+            try:
+                sent_any = self.drain_once()
+            except Exception as e:
+                print(f"Migration error: {e}")
+                sent_any = False
+            if not sent_any:
+                time.sleep(0.05)  # Rate limited or backing off
+
+    def take_ready(self):
+        """Pop the departures whose destination has tokens, grouped into publishes"""
+        now = time.monotonic()
+        waiting = {}
+        with self.condition:
+            for departure in self.queue:
+                if departure.not_before <= now:
+                    waiting.setdefault(departure.destination, []).append(departure)
+            publishes = []
+            taken = set()
+            for destination, departures in waiting.items():
+                size = MAX_BATCH if destination in self.batch_capable else 1
+                # Tokens only for what fits in the publishes still allowed in flight
+                room = (MAX_IN_FLIGHT - len(publishes)) * size
+                if room <= 0:
+                    break
+                granted = self.bucket(destination).take(min(len(departures), room))
+                departures = departures[:granted]
+                for i in range(0, len(departures), size):
+                    chunk = departures[i:i + size]
+                    publishes.append((destination, chunk))
+                    taken.update(id(d) for d in chunk)
+            if taken:
+                self.queue = deque(d for d in self.queue if id(d) not in taken)
+        return publishes
+
+    def drain_once(self):
+        publishes = self.take_ready()
+        if not publishes:
+            return False
+
+        client = self.replica.mqtt_client
+        if client is None:
+            self.replica.setup_mqtt_client()
+            client = self.replica.mqtt_client
+
+        in_flight = []
+        for destination, chunk in publishes:
+            if destination in self.batch_capable:
+                payload = json.dumps([departure.payload() for departure in chunk])
+            else:
+                payload = json.dumps(chunk[0].payload())
+            try:
+                info = client.publish(f"user/{destination}", payload, qos=1)
+                in_flight.append((destination, chunk, info))
+            except Exception as e:
+                print(f"Error sending fish to {destination}: {e}")
+                self.failed(destination, chunk)
+
+        for destination, chunk, info in in_flight:
+            try:
+                if info.rc == 0:
+                    info.wait_for_publish(timeout=ACK_TIMEOUT)
+                delivered = info.rc == 0 and info.is_published()
+            except Exception:
+                delivered = False
+            if delivered:
+                self.counters["sent"] += len(chunk)
+                self.counters["publishes"] += 1
+                for departure in chunk:
+                    print(f"Sending fish to {destination}: {departure.payload()}")
+            else:
+                self.failed(destination, chunk)
+        return True
+
+    def failed(self, destination, chunk):
+        """Retry, re-home, or give the fish back to the pond"""
+        self.counters["failures"] += 1
+        self.replica.metrics.mqtt_publish_failure(destination)
+        retry = []
+        for departure in chunk:
+            departure.attempts += 1
+            if departure.attempts < ATTEMPTS_PER_DESTINATION:
+                departure.not_before = time.monotonic() + RETRY_DELAY * 2 ** (departure.attempts - 1)
+                self.counters["retries"] += 1
+                retry.append(departure)
+                continue
+            untried = [d for d in self.destinations if d not in departure.tried]
+            if untried:
+                departure.destination = random.choice(untried)
+                departure.tried.add(departure.destination)
+                departure.attempts = 0
+                departure.not_before = 0.0
+                self.counters["rehomed"] += 1
+                retry.append(departure)
+            else:
+                print(f"No pond accepted fish {departure.record['name']}, keeping it")
+                self.give_back([departure])
+        with self.condition:
+            self.queue.extend(retry)
+
+    def return_all(self):
+        with self.condition:
+            departures = list(self.queue)
+            self.queue.clear()
+        if departures:
+            print(f"Returning {len(departures)} queued fish to the pond")
+            self.give_back(departures)
+
+    def give_back(self, departures):
+        self.counters["returned"] += len(departures)
+        for departure in departures:
+            self.replica.return_fish(departure.record)
+
+    def stats(self):
+        with self.condition:
+            depth = len(self.queue)
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return dict(self.counters, queue_depth=depth, sent_per_s=self.counters["sent"] / elapsed)
@@ -0,0 +1,1069 @@
+import json
+import sys
+import time
+import random
+import redis
+import threading
+import uuid
+from collections import deque
+import numpy as np
+import paho.mqtt.client as mqtt
+import codec
+from fish_store import FishStore
+from transport import PubSubTransport, TransportBackpressure
+from snapshot import Snapshotter
+from metrics import ReplicaMetrics
+from migration import MigrationPipeline
+from ingest import IngestStage
+from shard import ShardMap
+from membership import Membership
+from election import Election
+from acks import Acknowledgements
+from spatial import SpatialGrid
+
+# Constants
+POND_NAME = "Honey Lemon"
+MQTT_SERVER = "40.90.169.126" 
+MQTT_PORT = 1883
+MQTT_USERNAME = "dc24"
+MQTT_PASSWORD = "kmitl-dc24"
+DESTINATION = ["NetLink", "DC_Universe", "Parallel"]
+
+# Redis configuration
+REDIS_HOST = "localhost"
+REDIS_PORT = 6379
+REPLICA_CHANNEL = "pond_updates"
+STATUS_CHANNEL = "replica_status"
+MQTT_RELAY_CHANNEL = "mqtt_relay"
+
+# Replication log: the primary keeps recent sequenced mutations so a lagging
+# replica can catch up incrementally. The log is capped by the number of fish
+# rows it holds; a gap older than the log is answered with a snapshot instead.
+REPLICATION_LOG_MAX_ROWS = 200000
+CATCH_UP_BUFFER_SIZE = 1000
+SYNC_TIMEOUT = 5  # Seconds to wait for the primary before asking again
+
+MIGRATION_PROBABILITY = 0.1  # Chance per simulated second that a fish travels to another pond
+WALK_STEP = 10  # Furthest a fish wanders on each axis per simulated second
+CELL_CAPACITY = 3  # Fish a sprite-sized square holds before the extra ones move on
+
+class Fish:
+    """A fish, detached or a view into a FishStore slot.
+    
+    A pond holds many, so fish are slotted and their name and genesis pond
+    strings interned. to_dict() and wire_record() keep what they built and
+    hand it out again until the lifetime or position in it no longer match.
+    The store ages and moves attached fish column-wise without going through
+    the setters, so the current values are compared rather than relying on
+    the setters. Callers must not modify what they get back.
+    """
+    __slots__ = ("_store", "_slot", "_position", "_remaining_lifetime", "_packed_id", "_dict", "_record",
+                 "id", "name", "genesis_pond")
+    
+    def __init__(self, name, genesis_pond, remaining_lifetime, fish_id=None, position=None):
+        self._store = None  # Set while the fish is a view into a FishStore
+        self._slot = -1
+        self._packed_id = None
+        self._dict = None
+        self._record = None
+        self.id = fish_id or str(uuid.uuid4())
+        self.name = sys.intern(name)
+        self.genesis_pond = sys.intern(genesis_pond)
+        self.remaining_lifetime = remaining_lifetime
+        self.position = position or (random.randint(0, 550), random.randint(0, 350))
+    
+    @property
+    def position(self):
+        if self._store is not None:
+            return (int(self._store.x[self._slot]), int(self._store.y[self._slot]))
+        return self._position
+    
+    @position.setter
+    def position(self, position):
+        if self._store is not None:
+            self._store.move(self._slot, *position)
+        else:
+            self._position = tuple(position)
+    
+    @property
+    def remaining_lifetime(self):
+        if self._store is not None:
+            return int(self._store.lifetime[self._slot])
+        return self._remaining_lifetime
+    
+    @remaining_lifetime.setter
+    def remaining_lifetime(self, remaining_lifetime):
+        if self._store is not None:
+            self._store.lifetime[self._slot] = remaining_lifetime
+        else:
+            self._remaining_lifetime = remaining_lifetime
+    
+    def attach(self, store, slot):
+        """Start reading and writing state through a FishStore slot"""
+        self._store = store
+        self._slot = slot
+    
+    def detach(self):
+        """Copy the current state out of the store and stop being a view"""
+        if self._store is not None:
+            self._position = self.position
+            self._remaining_lifetime = self.remaining_lifetime
+            self._store = None
+            self._slot = -1
+    
+    def state(self):
+        """(remaining_lifetime, x, y), all a serialized fish depends on besides its fixed fields"""
+        store = self._store
+        if store is not None:
+            slot = self._slot
+            return store.lifetime.item(slot), store.x.item(slot), store.y.item(slot)
+        x, y = self._position
+        return self._remaining_lifetime, x, y
+    
+    def to_dict(self):
+        lifetime, x, y = self.state()
+        data = self._dict
+        if data is not None and data["remaining_lifetime"] == lifetime and data["position"] == (x, y):
+            return data
+        data = self._dict = {
+            "id": self.id,
+            "name": self.name,
+            "genesis_pond": self.genesis_pond,
+            "remaining_lifetime": lifetime,
+            "position": (x, y)
+        }
+        return data
+    
+    def wire_record(self):
+        """The fish as the msgpack codecs put it on the wire: [packed id, name, genesis pond, lifetime, x, y]"""
+        lifetime, x, y = self.state()
+        record = self._record
+        if record is not None and record[3] == lifetime and record[4] == x and record[5] == y:
+            return record
+        if self._packed_id is None:
+            self._packed_id = codec.pack_fish_id(self.id)
+        record = self._record = [self._packed_id, self.name, self.genesis_pond, lifetime, x, y]
+        return record
+    
+    @classmethod
+    def blank(cls, fish_id, name, genesis_pond):
+        """A detached fish whose state is about to come from a store's columns"""
+        fish = cls.__new__(cls)
+        fish._store = None
+        fish._slot = -1
+        fish._position = (0, 0)
+        fish._remaining_lifetime = 0
+        fish._packed_id = None
+        fish._dict = None
+        fish._record = None
+        fish.id = fish_id
+        fish.name = sys.intern(name)
+        fish.genesis_pond = sys.intern(genesis_pond)
+        return fish
+    
+    @classmethod
+    def from_dict(cls, data):
+        fish = cls.blank(data["id"], data["name"], data["genesis_pond"])
+        fish._remaining_lifetime = data["remaining_lifetime"]
+        position = data["position"]
+        fish._position = position if type(position) is tuple else tuple(position)
+        return fish
+    
+    def age(self):
+        if self.remaining_lifetime > 0:
+            self.remaining_lifetime -= 1
+            return True
+        return False
+
+class ReplicaEvents:
+    """Observer hooks for replica and engine events.
+
+    Plain Python so the replica never depends on a UI toolkit; the Qt UI
+    subscribes here and forwards events onto its own thread with signals.
+    Callbacks run on whichever thread emitted the event.
+    """
+    def __init__(self):
+        self.listeners = {}
+        self.lock = threading.Lock()
+    
+    def subscribe(self, event, callback):
+        with self.lock:
+            self.listeners.setdefault(event, []).append(callback)
+    
+    def unsubscribe(self, event, callback):
+        with self.lock:
+            if callback in self.listeners.get(event, []):
+                self.listeners[event].remove(callback)
+    
+    def emit(self, event, data=None):
+        for callback in list(self.listeners.get(event, ())):
+            try:
+                callback(data)
+            except Exception as e:
+                print(f"Error in {event} listener: {e}")
+
+class PondReplica:
+    def __init__(self, name, replica_id=None, redis_client=None, mqtt_factory=None, transport=None,
+                 snapshot_stores=None, metrics_port=None, sharded=False, recorder=None,
+                 mqtt_server=MQTT_SERVER, mqtt_port=MQTT_PORT):
+        # Basic properties
+        self.name = name
+        self.replica_id = replica_id or str(uuid.uuid4())[:8]
+        self.fish_store = FishStore()
+        self.rng = np.random.default_rng()
+        self.grid = SpatialGrid(self.fish_store)
+        self.cell_capacity = CELL_CAPACITY
+        self.migration_probability = MIGRATION_PROBABILITY
+        self.unaged = 0.0  # Simulated seconds not yet taken off the fish lifetimes
+        self.metrics = ReplicaMetrics(self)
+        self._is_primary = False
+        self.events = ReplicaEvents()
+        self.recorder = recorder  # traffic.Recorder capturing everything we receive, if any
+        self.running = True
+        
+        # Sequenced replication: last_seq is the last mutation we applied
+        # (or stamped, as primary); the log serves catch-up requests. Each
+        # primary numbers on from where it happened to be when it won the
+        # lease, so a seq only means something within the term that stamped
+        # it: mutations are ordered by (epoch, seq), and applied_epoch is the
+        # term last_seq belongs to
+        self.last_seq = 0
+        self.applied_epoch = 0
+        self.log_lock = threading.Lock()
+        self.replication_log = deque()
+        self.replication_log_rows = 0
+        self.sync_requested_at = None
+        self.catch_up_buffer = deque(maxlen=CATCH_UP_BUFFER_SIZE)
+        
+        # Sharded mode: every owner ticks its share of the fish and numbers
+        # its own deltas; shard_seqs tracks the other owners' numbering
+        self.sharded = sharded
+        self.shard_map = ShardMap(self.replica_id)
+        self.shard_epoch = uuid.uuid4().hex[:8]
+        self.shard_seq = 0
+        self.shard_seqs = {}
+        # FishStore swap-removes rows, so a change from one thread can move the
+        # row another is touching. Every public path that changes the store
+        # takes store_lock: the tick, replication updates and deltas, ingest,
+        # add/remove from the UI, migration give-backs and snapshot loads. So
+        # does anything that reads many rows at once (full states, snapshots)
+        self.store_lock = threading.RLock()
+        
+        # Set up Redis for replication
+        self.redis_client = redis_client or redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
+        self.transport = transport or PubSubTransport(
+            self.redis_client, [REPLICA_CHANNEL, STATUS_CHANNEL, MQTT_RELAY_CHANNEL]
+        )
+        self.known_replicas = {
+            self.replica_id: {
+                'last_seen': time.time(),
+                'is_primary': False,
+                'codecs': codec.supported_codecs(),
+                'sharded': sharded
+            }
+        }
+        self.membership = Membership(self, self.redis_client)
+        self.election = Election(self, self.redis_client)
+        self.acks = Acknowledgements(self, self.redis_client)
+        self.fence_epoch = 0  # Highest primary term seen; older primaries are ignored
+        self.negotiate_codec()
+        
+        # Start from a local snapshot if we have one, so the sync below only
+        # has to fetch what changed since
+        self.snapshotter = Snapshotter(self, snapshot_stores) if snapshot_stores else None
+        if self.snapshotter:
+            self.snapshotter.load()
+        
+        # MQTT client setup (will only be active for primary)
+        self.mqtt_factory = mqtt_factory or mqtt.Client
+        self.mqtt_server = mqtt_server
+        self.mqtt_port = mqtt_port
+        self.mqtt_client = None
+        self.migration = MigrationPipeline(self, DESTINATION)
+        self.ingest = IngestStage(self, Fish)
+        
+        # Start listeners
+        self.transport.start(self.handle_message, on_reconnect=self.request_state_synchronization)
+        
+        # Take a membership lease and learn who is there, then register with the replication system
+        self.membership.refresh()
+        self.membership.read()
+        self.fence_epoch = self.election.current_epoch()
+        self.register_replica()
+        self.membership.start()
+        self.election.start()
+        self.acks.start()
+        if self.snapshotter:
+            self.snapshotter.start()
+        self.migration.start()
+        self.ingest.start()
+        if metrics_port:
+            self.metrics.serve(metrics_port)
+        
+        print(f"Replica {self.replica_id} initialized")
+    
+    def close(self):
+        """Stop the background threads and drop connections"""
+        self.running = False
+        self.membership.stop()
+        self.election.stop()
+        self.acks.stop()
+        self.migration.stop()
+        self.ingest.stop()
+        if self.snapshotter:
+            self.snapshotter.stop()
+        if self.mqtt_client:
+            try:
+                self.mqtt_client.disconnect()
+                self.mqtt_client.loop_stop()
+            except:
+                pass
+            self.mqtt_client = None
+        self.transport.close()
+        self.metrics.close()
+        if self.recorder:
+            self.recorder.close()
+    
+    @property
+    def is_primary(self):
+        return self._is_primary and self.election.valid()
+    
+    @is_primary.setter
+    def is_primary(self, is_primary):
+        if is_primary != self._is_primary:
+            self._is_primary = is_primary
+            self.metrics.primary_flip()
+            self.membership.nudge()  # Peers read our role from the lease
+    
+    @property
+    def fish_list(self):
+        """Fish views in slot order"""
+        return self.fish_store.fish
+    
+    @property
+    def fish_dict(self):
+        """Fish views by id"""
+        return self.fish_store.by_id
+        
+    def setup_mqtt_client(self):
+        """Set up MQTT client only for primary replica"""
+        if not self.is_primary:
+            return
+
+        # Clean up any existing MQTT client
+        if self.mqtt_client:
+            try:
+                self.mqtt_client.disconnect()
+            except:
+                pass
+
+        # Create new MQTT client
+        self.mqtt_client = self.mqtt_factory()
+        self.mqtt_client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+        self.mqtt_client.on_connect = self.on_mqtt_connect
+        self.mqtt_client.on_message = self.on_mqtt_message
+        self.mqtt_client.connect(self.mqtt_server, self.mqtt_port, 60)
+        self.mqtt_client.loop_start()
+        print(f"MQTT client set up for primary replica {self.replica_id}")
+
+    
+    def register_replica(self):
+        """Register this replica with the replication system"""
+        status_message = {
+            "type": "register",
+            "replica_id": self.replica_id,
+            "timestamp": time.time(),
+            "name": self.name,
+            "is_primary": self.is_primary,
+            "codecs": codec.supported_codecs(),
+            "sharded": self.sharded
+        }
+        # Handshake messages stay JSON so replicas on any codec can read them
+        self.publish(STATUS_CHANNEL, json.dumps(status_message))
+        # Get existing state if any
+        self.request_state_synchronization()
+    
+    def request_state_synchronization(self, full=False):
+        """Ask the primary for every mutation after the last one we applied, or for everything"""
+        sync_request = {
+            "type": "sync_request",
+            "replica_id": self.replica_id,
+            "timestamp": time.time(),
+            "after_seq": self.last_seq if self.last_seq and not full else None,
+            "after_epoch": self.applied_epoch
+        }
+        self.sync_requested_at = time.time()
+        self.publish(STATUS_CHANNEL, json.dumps(sync_request))
+    
+    def restore_snapshot(self, last_seq, columns):
+        """Replace the pond with a decoded snapshot taken at last_seq of columns["epoch"]"""
+        ponds = columns["ponds"]
+        fish = [
+            Fish.blank(fish_id, name, ponds[code])
+            for fish_id, name, code in zip(columns["ids"], columns["names"], columns["pond_code"].tolist())
+        ]
+        with self.store_lock:
+            self.fish_store.load(fish, columns["x"], columns["y"], columns["lifetime"],
+                                 columns["pond_code"], columns["ponds"])
+            self.last_seq = last_seq
+            self.applied_epoch = columns.get("epoch", 0)  # Snapshots from before epochs were kept match no term
+    
+    def recover(self):
+        """Reload the last snapshot, if any, then catch up on what happened since"""
+        if self.snapshotter:
+            self.snapshotter.load()
+        self.request_state_synchronization()
+    
+    def stamp(self, message):
+        """Give a primary mutation the next sequence number and log it"""
+        fish = message.get("fish")
+        rows = (len(message.get("updates", ())) + len(message.get("removed", ())) + len(message.get("migrated", ()))
+                + (len(fish) if isinstance(fish, list) else 0)) or 1
+        with self.log_lock:
+            self.last_seq += 1
+            message["seq"] = self.last_seq
+            message["epoch"] = self.election.epoch
+            self.replication_log.append((message, rows))
+            self.replication_log_rows += rows
+            while self.replication_log_rows > REPLICATION_LOG_MAX_ROWS:
+                _, dropped_rows = self.replication_log.popleft()
+                self.replication_log_rows -= dropped_rows
+        return message
+    
+    def continue_sequence(self, epoch):
+        """On promotion, start term epoch numbering after the furthest replica we know of"""
+        with self.log_lock:
+            self.last_seq = max([self.last_seq] + [details.get('seq') or 0 for details in list(self.known_replicas.values())])
+            self.applied_epoch = epoch
+            self.replication_log.clear()
+            self.replication_log_rows = 0
+    
+    def send_catch_up(self, target_replica, after_seq=None, after_epoch=None):
+        """Send a replica the mutations after after_seq, or a snapshot if the log no longer has them.
+
+        The log only holds our own term, so a replica whose last_seq belongs
+        to an earlier term (or who does not say) gets a snapshot: its history
+        may have run past ours, or down another primary's branch.
+        """
+        entries = None
+        with self.log_lock:
+            if after_seq is not None and after_epoch == self.applied_epoch and after_seq <= self.last_seq:
+                oldest_seq = self.replication_log[0][0]["seq"] if self.replication_log else self.last_seq + 1
+                if oldest_seq <= after_seq + 1:
+                    entries = [message for message, _ in self.replication_log if message["seq"] > after_seq]
+            last_seq = self.last_seq
+        
+        if entries is None:
+            print(f"Sending snapshot to replica {target_replica} (after_seq={after_seq})")
+            self.send_state(target_replica)
+            return
+        
+        print(f"Sending {len(entries)} update(s) after seq {after_seq} to replica {target_replica}")
+        catch_up = {
+            "type": "catch_up",
+            "replica_id": self.replica_id,
+            "timestamp": time.time(),
+            "entries": entries,
+            "last_seq": last_seq,
+            "epoch": self.election.epoch,
+            "target_replica": target_replica
+        }
+        try:
+            self.publish(REPLICA_CHANNEL, self.encode(catch_up))
+        except TransportBackpressure as e:
+            # The requester asks again once SYNC_TIMEOUT passes
+            print(f"Dropped catch-up for {target_replica}: {e}")
+    
+    def negotiate_codec(self):
+        """Pick the most compact codec that every known replica understands"""
+        self.wire_codec = codec.negotiate(
+            details.get('codecs') for rid, details in list(self.known_replicas.items())
+            if rid != self.replica_id
+        )
+    
+    def encode(self, message):
+        """Encode a replication message with the negotiated codec"""
+        return self.wire_codec.encode(message)
+        
+    def send_state(self, target_replica=None):
+        """Send complete state to another replica or broadcast"""
+        # The codecs read the fish rows as they serialize them, so the store must hold still
+        with self.store_lock:
+            state = {
+                "type": "full_state",
+                "replica_id": self.replica_id,
+                "timestamp": time.time(),
+                "last_seq": self.last_seq,
+                "fish": list(self.fish_list),  # The codecs serialize the fish through their caches
+                "epoch": self.election.epoch,
+                "target_replica": target_replica
+            }
+            payload = self.encode(state)
+        try:
+            self.publish(REPLICA_CHANNEL, payload)
+        except TransportBackpressure as e:
+            # The requester asks again once SYNC_TIMEOUT passes
+            print(f"Dropped full state for {target_replica or 'everyone'}: {e}")
+    
+    def on_mqtt_connect(self, client, userdata, flags, rc):
+        """MQTT connection handler for primary replica"""
+        if not self.is_primary:
+            return
+        
+        print(f"Connected to MQTT server with result code {rc}")
+        self.mqtt_client.subscribe(f"fishhaven/stream")
+        self.mqtt_client.subscribe(f"user/{POND_NAME}")
+
+    def on_mqtt_message(self, client, userdata, msg):
+        """Handle incoming MQTT messages for primary replica"""
+        if self.recorder:
+            self.recorder.record_mqtt(msg)
+        if not self.is_primary:
+            return
+
+        try:
+            message = json.loads(msg.payload)
+            print(f"Received MQTT message: {message}")
+            
+            # Relay the message to other replicas via Redis
+            relay_message = {
+                "type": "mqtt_message",
+                "topic": msg.topic,
+                "payload": message
+            }
+            self.publish(MQTT_RELAY_CHANNEL, self.encode(relay_message))
+            
+            if msg.topic == "fishhaven/stream" and isinstance(message, dict) and message.get("type") == "hello":
+                self.migration.note_hello(message)
+            
+            # Fish arriving from another pond, one or a batch; the ingest
+            # stage dedupes them and replicates them in batches
+            if msg.topic == f"user/{POND_NAME}":
+                for arrival in message if isinstance(message, list) else [message]:
+                    if isinstance(arrival, dict):
+                        self.ingest.submit(arrival, duplicate=getattr(msg, "dup", False))
+        except Exception as e:
+            print(f"Error processing MQTT message: {e}")
+    
+    def handle_message(self, channel, payload):
+        """Route a message from the transport by channel"""
+        if self.recorder:
+            self.recorder.record_replication(channel, payload)
+        start = time.perf_counter()
+        try:
+            data = codec.decode(payload)
+        except ValueError:
+            return
+        
+        if channel == REPLICA_CHANNEL:
+            self.process_replica_update(data)
+        elif channel == STATUS_CHANNEL:
+            self.process_status_update(data)
+        elif channel == MQTT_RELAY_CHANNEL:
+            self.process_mqtt_relay(data)
+        self.metrics.observe_message(channel, data.get("type", "unknown"), time.perf_counter() - start,
+                                     data.get("timestamp"))
+    
+    def publish(self, channel, payload):
+        """Publish one encoded message through the transport"""
+        start = time.perf_counter()
+        self.transport.publish(channel, payload)
+        self.metrics.observe_publish(channel, time.perf_counter() - start)
+    
+    def publish_mutation(self, update):
+        """Replicate a pond mutation, dropping it if the transport's queue is full.
+
+        A stamped mutation is already in the replication log, so replicas
+        see the gap and catch up on it; an unstamped one from a replica is lost.
+        """
+        try:
+            self.publish(REPLICA_CHANNEL, self.encode(update))
+        except TransportBackpressure as e:
+            print(f"Dropped {update['type']} (seq {update.get('seq')}): {e}")
+    
+    def publish_many(self, messages):
+        """Publish (channel, payload) pairs in one batch"""
+        start = time.perf_counter()
+        self.transport.publish_many(messages)
+        elapsed = time.perf_counter() - start
+        for channel, _ in messages:
+            self.metrics.observe_publish(channel, elapsed / len(messages))
+    
+    def process_replica_update(self, data):
+        """Process updates from other replicas"""
+        if data["replica_id"] == self.replica_id:
+            return  # Ignore our own updates
+        
+        # Handle targeted messages
+        if data.get("target_replica") and data["target_replica"] != self.replica_id:
+            return  # This message is not for us
+        
+        # Fencing: a primary whose lease has passed to a later term is ignored
+        epoch = data.get("epoch")
+        if epoch is not None:
+            if epoch < self.fence_epoch:
+                self.metrics.fenced()
+                print(f"Ignoring {data['type']} from {data['replica_id']}, epoch {epoch} < {self.fence_epoch}")
+                return
+            self.fence_epoch = epoch
+            
+        with self.store_lock:
+            if data["type"] in ("full_state", "catch_up"):
+                self.apply_catch_up(data)
+            elif data["type"] == "shard_delta":
+                if not self.apply_shard_delta(data):
+                    return
+            elif "seq" in data:
+                if not self.apply_sequenced(data):
+                    return  # Duplicate, or held back until we catch up
+            else:
+                self.apply_update(data)
+        
+        # Notify UI
+        self.events.emit("update_received", data)
+    
+    def apply_update(self, data):
+        """Apply a single add/remove/update mutation"""
+        with self.store_lock:
+            if data["type"] == "add_fish":
+                fish_data = data["fish"]
+                # Check if we already have this fish
+                if fish_data["id"] not in self.fish_dict:
+                    fish = Fish.from_dict(fish_data)
+                    # The primary re-publishes replica-originated fish with a sequence number
+                    self.add_fish(fish, propagate=self.is_primary and "seq" not in data)
+                    
+            elif data["type"] == "add_fish_batch":
+                fish_list = [Fish.from_dict(fish_data) for fish_data in data["fish"]]
+                self.add_fish_batch(fish_list, propagate=self.is_primary and "seq" not in data)
+                    
+            elif data["type"] == "remove_fish":
+                fish_id = data["fish_id"]
+                if fish_id in self.fish_dict:
+                    fish = self.fish_dict[fish_id]
+                    self.remove_fish(fish, propagate=self.is_primary and "seq" not in data)
+                    
+            elif data["type"] == "update_fish":
+                fish_data = data["fish"]
+                if fish_data["id"] in self.fish_dict:
+                    # Update existing fish
+                    fish = self.fish_dict[fish_data["id"]]
+                    fish.remaining_lifetime = fish_data["remaining_lifetime"]
+                    fish.position = tuple(fish_data["position"])
+            
+            elif data["type"] == "tick_delta":
+                self.apply_tick_delta(data)
+    
+    def apply_sequenced(self, data):
+        """Apply a primary mutation in (epoch, seq) order, returns True if it was applied"""
+        epoch, seq = data.get("epoch") or 0, data["seq"]
+        if (epoch, seq) <= (self.applied_epoch, self.last_seq):
+            return False  # Already applied, or stamped by a primary that has been superseded
+        
+        waiting = self.sync_requested_at is not None
+        if waiting and time.time() - self.sync_requested_at < SYNC_TIMEOUT:
+            self.catch_up_buffer.append(data)
+            return False
+        
+        if epoch != self.applied_epoch:
+            # A new term numbers on from wherever its primary was, which we may
+            # have passed or never reached; only its full state says where it starts
+            print(f"Primary term {epoch} began, requesting its full state")
+            self.catch_up_buffer.append(data)
+            self.request_state_synchronization(full=True)
+            return False
+        
+        # Within a known term last_seq is exact, even at 0; before any term
+        # (an empty start) the first mutation seen is where we begin
+        if waiting or ((self.last_seq or self.applied_epoch) and seq > self.last_seq + 1):
+            # Missed something (or the primary never answered), ask for the gap
+            print(f"Missed updates {self.last_seq + 1}..{seq - 1}, requesting catch-up")
+            self.catch_up_buffer.append(data)
+            self.request_state_synchronization()
+            return False
+        
+        self.apply_update(data)
+        self.last_seq = seq
+        return True
+    
+    def apply_catch_up(self, data):
+        """Apply a catch-up or snapshot from the primary, then replay what arrived meanwhile"""
+        with self.store_lock:
+            if data["type"] == "full_state":
+                # Replace our state with the received state
+                self.fish_store.clear()
+                for fish_data in data["fish"]:
+                    self.fish_store.add(Fish.from_dict(fish_data))
+                self.last_seq = data.get("last_seq") or self.last_seq
+                self.applied_epoch = data.get("epoch") or self.applied_epoch
+                self.sync_requested_at = None
+            else:
+                self.sync_requested_at = None
+                for entry in data["entries"]:
+                    self.apply_sequenced(entry)
+            
+            buffered = sorted(self.catch_up_buffer, key=lambda message: (message.get("epoch") or 0, message["seq"]))
+            self.catch_up_buffer.clear()
+            for message in buffered:
+                self.apply_sequenced(message)
+    
+    def apply_shard_delta(self, data):
+        """Apply another owner's shard tick, returns False for a duplicate"""
+        owner = data["replica_id"]
+        epoch, shard_seq = data["shard_epoch"], data["shard_seq"]
+        last_epoch, last_seq = self.shard_seqs.get(owner, (None, None))
+        if epoch == last_epoch:
+            if shard_seq <= last_seq:
+                return False
+            if shard_seq > last_seq + 1:
+                # Shard deltas are not in the primary's log, so only a full state repairs this;
+                # the primary has nobody to ask, and later deltas carry absolute values anyway
+                print(f"Missed shard deltas {last_seq + 1}..{shard_seq - 1} from {owner}")
+                if not self.is_primary and self.sync_requested_at is None:
+                    self.request_state_synchronization(full=True)
+        self.shard_seqs[owner] = (epoch, shard_seq)
+        
+        with self.store_lock:
+            if self.is_primary:
+                for record in data.get("departures", ()):
+                    if not self.migration.submit(Fish.from_dict(record)):
+                        self.return_fish(record)
+            self.apply_tick_delta(data)
+        return True
+    
+    def apply_tick_delta(self, data):
+        """Apply a whole tick batch from the primary in one pass"""
+        with self.store_lock:
+            self.fish_store.apply_updates(data["updates"])
+            self.fish_store.remove_many(data["removed"])
+            self.fish_store.remove_many(data["migrated"])
+    
+    def process_mqtt_relay(self, data):
+        """Process MQTT messages relayed by primary replica"""
+        if data.get("type") == "mqtt_message":
+            # Emit signal for UI or other components to handle
+            self.events.emit("mqtt_message", data)
+            
+            # Arriving fish reach us from the primary as an add_fish_batch
+            # with the ids it assigned, so nothing is created from the relay
+    
+    def process_status_update(self, data):
+        """Handle registrations, sync requests and primary changes; liveness comes from membership"""
+        current_time = time.time()
+        
+        # New Replica Detection
+        if data["type"] == "register" or data["type"] == "sync_request":
+            # A new replica has registered or requested sync
+            new_replica_id = data.get("replica_id")
+            
+            # Don't respond to our own registration
+            if new_replica_id != self.replica_id:
+                print(f"New replica detected: {new_replica_id}")
+                
+                # Known right away; the next membership read confirms or drops it
+                details = self.known_replicas.setdefault(new_replica_id, {})
+                details['last_seen'] = current_time
+                if data["type"] == "register":
+                    details.update(is_primary=data.get("is_primary", False), role_at=data.get("timestamp", current_time),
+                                   codecs=data.get("codecs"), sharded=data.get("sharded", False))
+                    self.negotiate_codec()
+                
+                # Only the primary answers, and only the sync request that follows every register
+                if self.is_primary and data["type"] == "sync_request":
+                    self.send_catch_up(new_replica_id, data.get("after_seq"), data.get("after_epoch"))
+        
+        # Replicas from before leases still heartbeat, which keeps them (and JSON) known
+        if data["type"] == "heartbeat" and data.get("replica_id") != self.replica_id:
+            if data["replica_id"] in self.known_replicas:
+                self.known_replicas[data["replica_id"]]['last_seen'] = current_time
+            else:
+                # One we never saw register, so it advertises no codecs
+                self.known_replicas[data["replica_id"]] = {'last_seen': current_time, 'codecs': None}
+                self.negotiate_codec()
+        
+        # A primary announcing the term it won; the election itself happens on the Redis lease
+        if data["type"] == "primary_declaration":
+            epoch = data.get("epoch", 0)
+            if epoch >= self.fence_epoch:
+                self.fence_epoch = epoch
+                for replica_id, details in list(self.known_replicas.items()):
+                    details.update(is_primary=replica_id == data["replica_id"],
+                                   role_at=data.get("timestamp", current_time))
+                self.known_replicas.setdefault(data["replica_id"], {}).update(
+                    last_seen=current_time, is_primary=True, role_at=data.get("timestamp", current_time)
+                )
+            
+            if data["replica_id"] != self.replica_id:
+                self.election.superseded(epoch)
+                # A sync we sent before there was a primary went unanswered
+                if self.sync_requested_at is not None:
+                    self.request_state_synchronization()
+        
+        # Notify status update
+        self.events.emit("status_update", data)
+    
+    def declare_primary(self, force=False):
+        """Take the primary lease now; force takes it from a live primary too"""
+        if not self.election.acquire(force=force):
+            print(f"Cannot declare primary. {self.election.holder()} holds the lease")
+    
+    def become_primary(self, epoch):
+        """Called by the election on winning the lease: continue the sequence, announce, open MQTT"""
+        self.fence_epoch = max(self.fence_epoch, epoch)
+        self.continue_sequence(epoch)
+        self.is_primary = True
+        primary_declaration = {
+            "type": "primary_declaration",
+            "replica_id": self.replica_id,
+            "timestamp": time.time(),
+            "is_primary": True,
+            "epoch": epoch
+        }
+        try:
+            self.publish(STATUS_CHANNEL, self.encode(primary_declaration))
+        except TransportBackpressure as e:
+            # The lease and our adverts still tell the others who holds the role
+            print(f"Dropped primary declaration: {e}")
+        print(f"Replica {self.replica_id} declared as PRIMARY (epoch {epoch})")
+        self.setup_mqtt_client()
+    
+    def step_down(self):
+        """Called by the election on losing the lease: the MQTT connection goes with it"""
+        self.is_primary = False
+        if self.mqtt_client:
+            try:
+                self.mqtt_client.disconnect()
+                self.mqtt_client.loop_stop()
+            except:
+                pass
+            self.mqtt_client = None
+    
+    def announce(self):
+        """Announce pond existence via primary replica's MQTT connection"""
+        if not self.is_primary:
+            return
+
+        message = {
+            "type": "hello",
+            "sender": self.name,
+            "timestamp": int(time.time()),
+            "data": {"accepts_batches": True}  # We take a JSON list of fish on user/<pond>
+        }
+        
+        if self.mqtt_client:
+            self.mqtt_client.publish("fishhaven/stream", json.dumps(message))
+            print(f"Announced pond existence: {message}")
+
+    def add_fish(self, fish, propagate=True, external=False):
+        """Add a fish to the pond with immediate eager propagation"""
+        with self.store_lock:
+            if not self.fish_store.add(fish):
+                return  # Already have this fish
+            print(f"Added fish {fish.name} to pond {self.name}")
+            
+            # Always propagate, regardless of primary status
+            # This ensures all replicas get updates quickly
+            if propagate:
+                update = {
+                    "type": "add_fish",
+                    "replica_id": self.replica_id,
+                    "timestamp": time.time(),
+                    "fish": fish.to_dict(),
+                    "source": "primary" if self.is_primary else "replica"
+                }
+                if self.is_primary:
+                    self.stamp(update)
+                self.publish_mutation(update)
+
+    def add_fish_batch(self, fish_list, propagate=True):
+        """Add several fish and replicate them as one message, returns how many were new"""
+        with self.store_lock:
+            added = [fish for fish in fish_list if self.fish_store.add(fish)]
+            if not added:
+                return 0
+            print(f"Added {len(added)} fish to pond {self.name}")
+            
+            if propagate:
+                update = {
+                    "type": "add_fish_batch",
+                    "replica_id": self.replica_id,
+                    "timestamp": time.time(),
+                    "fish": [fish.to_dict() for fish in added],
+                    "source": "primary" if self.is_primary else "replica"
+                }
+                if self.is_primary:
+                    self.stamp(update)
+                self.publish_mutation(update)
+            return len(added)
+    
+    def remove_fish(self, fish, propagate=True):
+        """Remove a fish from the pond with immediate eager propagation"""
+        with self.store_lock:
+            if self.fish_store.remove(fish.id) is None:
+                return  # Don't have this fish
+            print(f"Removed fish {fish.name} from pond {self.name}")
+            
+            # Always propagate removal
+            if propagate:
+                update = {
+                    "type": "remove_fish",
+                    "replica_id": self.replica_id,
+                    "timestamp": time.time(),
+                    "fish_id": fish.id,
+                    "source": "primary" if self.is_primary else "replica"
+                }
+                if self.is_primary:
+                    self.stamp(update)
+                self.publish_mutation(update)
+
+    def update(self, dt=1.0):
+        """Advance the pond dt simulated seconds and replicate the whole tick as one batch"""
+        # Primary replica handles state updates, or every owner its shard in sharded mode
+        if not (self.is_primary or self.sharded):
+            return
+        
+        start = time.perf_counter()
+        with self.store_lock:
+            self.advance(dt)
+        self.metrics.observe_tick(time.perf_counter() - start)
+    
+    def advance(self, dt=1.0):
+        """Age, move and migrate the fish we own over dt seconds, then publish the tick delta"""
+        store = self.fish_store
+        if len(store) == 0:
+            return
+        
+        # Lifetimes count whole seconds, so short ticks age the pond once per second's worth
+        self.unaged += dt
+        seconds = int(self.unaged + 1e-9)
+        self.unaged -= seconds
+        
+        # The role is read once, so a lease lapsing mid-tick cannot send some
+        # migrants into a delta that has nowhere to put them
+        hand_over = self.sharded and not self.is_primary
+        if self.sharded:
+            self.shard_map.update_owners(self.shard_owners())
+            owned_slots = self.shard_map.owned_slots(store)
+        else:
+            owned_slots = np.arange(len(store))
+        
+        # Age the whole pond (or shard) at once; fish already at zero expire
+        expired_slots = owned_slots[:0]
+        for _ in range(seconds):
+            expired_slots = np.union1d(expired_slots, store.age(owned_slots))
+        alive_slots = np.setdiff1d(owned_slots, expired_slots, assume_unique=True)
+        
+        # Move fish rules: fish beyond their cell's capacity leave, and a
+        # random share of the rest travel
+        capacity = self.cell_capacity
+        if len(owned_slots) < len(store):
+            # Each owner keeps its share of every cell's capacity
+            capacity = int(np.ceil(capacity * len(owned_slots) / len(store)))
+        leaving = self.grid.crowded(alive_slots, capacity)
+        # The same chance per second whatever the tick rate
+        migration_probability = 1 - (1 - self.migration_probability) ** dt
+        leaving |= self.rng.random(len(alive_slots)) < migration_probability
+        migrating_slots = alive_slots[leaving]
+        staying_slots = alive_slots[~leaving]
+        
+        # Random position update for everyone staying
+        # Scaled like a random walk's spread, so fish wander as far per second at any rate
+        store.random_walk(staying_slots, self.rng, max(1, round(WALK_STEP * dt ** 0.5)))
+        
+        # Resolve slots to columns and fish before any removal reshuffles them;
+        # the block covers every survivor, and keeps the ones that stay
+        block = store.updates(alive_slots)
+        keep = ~leaving
+        expired = [store.fish[slot] for slot in expired_slots.tolist()]
+        migrating = [store.fish[slot] for slot in migrating_slots.tolist()]
+        
+        migrated = []
+        departures = []
+        for index, fish in zip(np.flatnonzero(leaving).tolist(), migrating):
+            if hand_over:
+                # Only the primary talks MQTT, it sends what our shard delta hands over
+                departures.append(fish.to_dict())
+                self.remove_fish(fish, propagate=False)
+                migrated.append(fish.id)
+            elif self.move_fish(fish, propagate=False):
+                migrated.append(fish.id)
+            else:
+                # Still aged, so replicas need the new lifetime
+                keep[index] = True
+        updates = block.select(keep)
+        
+        removed = [fish.id for fish in store.remove_many([fish.id for fish in expired])]
+        if removed:
+            print(f"Removed {len(removed)} expired fish from pond {self.name}")
+        
+        if not (len(updates) or removed or migrated):
+            return
+        if self.sharded:
+            self.publish_shard_delta(updates, removed, migrated, departures)
+            return
+        
+        # One sequenced delta for the whole tick
+        batch = self.stamp({
+            "type": "tick_delta",
+            "replica_id": self.replica_id,
+            "timestamp": time.time(),
+            "updates": updates,
+            "removed": removed,
+            "migrated": migrated
+        })
+        
+        # Replicas acknowledge it cumulatively through self.acks
+        try:
+            self.publish(REPLICA_CHANNEL, self.encode(batch))
+        except TransportBackpressure as e:
+            # The delta is in the replication log; replicas see the gap and catch up
+            print(f"Dropped tick delta {batch['seq']}: {e}")
+
+    def publish_shard_delta(self, updates, removed, migrated, departures):
+        """Replicate one tick of our shard, numbered per owner"""
+        self.shard_seq += 1
+        delta = {
+            "type": "shard_delta",
+            "replica_id": self.replica_id,
+            "timestamp": time.time(),
+            "shard_epoch": self.shard_epoch,
+            "shard_seq": self.shard_seq,
+            "updates": updates,
+            "removed": removed,
+            "migrated": migrated,
+            "departures": departures
+        }
+        try:
+            self.publish(REPLICA_CHANNEL, self.encode(delta))
+        except TransportBackpressure as e:
+            # Replicas see the gap in our shard_seq and resync
+            print(f"Dropped shard delta {self.shard_seq}: {e}")
+    
+    def shard_owners(self):
+        """Live replicas taking part in sharded ticking"""
+        current_time = time.time()
+        return [
+            rid for rid, details in list(self.known_replicas.items())
+            if details.get('sharded') and current_time - details.get('last_seen', 0) < 15
+        ]
+    
+    def move_fish(self, fish, propagate=True):
+        """Hand a fish to the migration pipeline and take it out of the pond, returns True if queued"""
+        if not self.migration.submit(fish):
+            print(f"Migration queue full, {fish.name} stays in pond {self.name}")
+            return False
+        self.remove_fish(fish, propagate=propagate)
+        return True
+    
+    def return_fish(self, record):
+        """Put a fish that could not leave back into the pond, from the migration thread"""
+        self.add_fish(Fish.from_dict(record))  # add_fish takes store_lock
+
+    def reassign_primary(self, force_local=False):
+        """Hand the primary role on: free the lease for the others, or take it with force_local"""
+        if force_local:
+            self.declare_primary(force=True)
+        elif self.is_primary:
+            self.election.release()
+        else:
+            print("Not responsible for primary reassignment.")
@@ -0,0 +1,415 @@
+"""Qt window for a pond replica.
+
+The UI is only an observer: the engine ticks the pond and runs elections,
+and replica/engine events reach the window through ReplicationSignals so
+they are handled on the GUI thread.
+"""
+import random
+import sys
+import time
+from PyQt5.QtWidgets import QApplication, QLabel, QMainWindow, QVBoxLayout, QWidget, QPushButton, QHBoxLayout, QDialog, QTextEdit
+from PyQt5.QtGui import QPixmap, QMovie, QPainter
+from PyQt5.QtCore import Qt, QTimer, QSize, pyqtSignal, QObject
+from pond import Fish
+from engine import PondEngine, TICK_INTERVAL
+from coalescer import RefreshCoalescer, ALL, DEFAULT_FPS
+from spatial import POND_WIDTH, POND_HEIGHT
+
+FISH_SIZE = 50  # Smaller fish for less clutter
+
+class PondCanvas(QWidget):
+    """Retained-mode fish layer drawn over the pond image.
+
+    Keeps one sprite entry per fish id and only touches the entries whose
+    fish were added, moved or removed. Every fish from the same genesis pond
+    shares one decoded QMovie. The whole layer is painted in a single pass,
+    so an animation frame costs one repaint instead of one per fish. Sprites
+    are also bucketed by sprite-sized cell, so a paint of part of the pond
+    only visits the cells in the exposed rectangle.
+    """
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.sprites = {}  # fish id -> [x, y, genesis pond, cell]
+        self.cells = {}    # sprite-sized (column, row) -> {fish id: sprite}
+        self.movies = {}   # genesis pond -> shared QMovie
+    
+    def movie_for(self, genesis_pond):
+        movie = self.movies.get(genesis_pond)
+        if movie is None:
+            # Try to use specific pond gif, otherwise use default
+            movie = QMovie(f"{genesis_pond}.gif")
+            if not movie.isValid():
+                movie = QMovie("fish.gif")  # Default fish image
+            movie.setScaledSize(QSize(FISH_SIZE, FISH_SIZE))
+            movie.frameChanged.connect(lambda frame: self.update())
+            movie.start()
+            self.movies[genesis_pond] = movie
+        return movie
+    
+    def place(self, fish_id, x, y, genesis_pond):
+        """Add or move one sprite, keeping its cell bucket in step"""
+        sprite = self.sprites.get(fish_id)
+        cell = (x // FISH_SIZE, y // FISH_SIZE)
+        if sprite is None:
+            self.movie_for(genesis_pond)
+            sprite = self.sprites[fish_id] = [x, y, genesis_pond, cell]
+            self.cells.setdefault(cell, {})[fish_id] = sprite
+            return
+        sprite[0] = x
+        sprite[1] = y
+        if cell != sprite[3]:
+            del self.cells[sprite[3]][fish_id]
+            self.cells.setdefault(cell, {})[fish_id] = sprite
+            sprite[3] = cell
+    
+    def drop(self, fish_id):
+        """Remove one sprite, returns True if there was one"""
+        sprite = self.sprites.pop(fish_id, None)
+        if sprite is None:
+            return False
+        del self.cells[sprite[3]][fish_id]
+        return True
+    
+    def sync(self, sprites):
+        """Add, move or remove only the sprites whose fish changed.
+
+        sprites is FishStore.sprites(), a copy taken under the store lock, so
+        the tick and ingest threads can keep moving rows meanwhile.
+        """
+        changed = False
+        for fish_id, (x, y, genesis_pond) in sprites.items():
+            sprite = self.sprites.get(fish_id)
+            if sprite is None or sprite[0] != x or sprite[1] != y:
+                self.place(fish_id, x, y, genesis_pond)
+                changed = True
+        
+        for fish_id in self.sprites.keys() - sprites.keys():
+            self.drop(fish_id)
+            changed = True
+        
+        if changed:
+            self.update()
+    
+    def sync_ids(self, fish_ids, sprites):
+        """Refresh just the sprites of the given fish ids, from FishStore.sprites(fish_ids)"""
+        changed = False
+        for fish_id in fish_ids:
+            row = sprites.get(fish_id)
+            if row is None:
+                changed = self.drop(fish_id) or changed
+                continue
+            x, y, genesis_pond = row
+            sprite = self.sprites.get(fish_id)
+            if sprite is None or sprite[0] != x or sprite[1] != y:
+                self.place(fish_id, x, y, genesis_pond)
+                changed = True
+        
+        if changed:
+            self.update()
+    
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        frames = {pond: movie.currentPixmap() for pond, movie in self.movies.items()}
+        exposed = event.rect()
+        if exposed.width() >= POND_WIDTH and exposed.height() >= POND_HEIGHT:
+            visible = [self.sprites.values()]
+        else:
+            # Sprites are drawn from their top-left corner, so look one sprite up and left
+            cells = [
+                (column, row)
+                for column in range((exposed.left() - FISH_SIZE) // FISH_SIZE, exposed.right() // FISH_SIZE + 1)
+                for row in range((exposed.top() - FISH_SIZE) // FISH_SIZE, exposed.bottom() // FISH_SIZE + 1)
+            ]
+            visible = [self.cells[cell].values() for cell in cells if cell in self.cells]
+        for sprites in visible:
+            for x, y, genesis_pond, _ in sprites:
+                painter.drawPixmap(x, y, frames[genesis_pond])
+        painter.end()
+    
+    def __len__(self):
+        return len(self.sprites)
+
+class ReplicationSignals(QObject):
+    """Bridges plain replica events onto Qt signals.
+
+    Fish updates are deliberately not bridged: they go through the
+    RefreshCoalescer, which the UI drains once per frame.
+    """
+    status_update = pyqtSignal(dict)
+    membership_changed = pyqtSignal(dict)
+    mqtt_message = pyqtSignal(dict)
+    
+    def __init__(self, events):
+        super().__init__()
+        events.subscribe("status_update", self.status_update.emit)
+        events.subscribe("member_joined", self.membership_changed.emit)
+        events.subscribe("member_left", self.membership_changed.emit)
+        events.subscribe("mqtt_message", self.mqtt_message.emit)
+
+class PondUI(QMainWindow):
+    def __init__(self, replica, replica_id, engine, fps=DEFAULT_FPS):
+        super().__init__()
+        self.replica = replica
+        self.replica_id = replica_id
+        self.engine = engine
+        
+        # Connect signals from replica and engine
+        self.signals = ReplicationSignals(self.replica.events)
+        self.signals.status_update.connect(self.handle_status_update)
+        self.signals.membership_changed.connect(self.show_replicas)
+        self.coalescer = RefreshCoalescer(self.replica.events)
+        
+        self.setWindowTitle(f"Pond Replica {replica_id}")
+        self.setGeometry(100, 100, 600, 500)
+
+        # Central widget and layout
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        self.layout = QVBoxLayout()
+        central_widget.setLayout(self.layout)
+
+        # Pond image
+        self.pond_image = QLabel()
+        self.pond_image.setPixmap(QPixmap("pond.png"))
+        self.pond_image.setScaledContents(True)
+        self.layout.addWidget(self.pond_image)
+
+        # Status section
+        status_layout = QHBoxLayout()
+        
+        # Pond name and replica info
+        self.status_label = QLabel(f"Pond: {self.replica.name} (Replica {replica_id})")
+        self.status_label.setStyleSheet("font-size: 16px; font-weight: bold;")
+        status_layout.addWidget(self.status_label)
+        
+        # Primary indicator
+        self.primary_label = QLabel("Role: Replica")
+        self.primary_label.setStyleSheet("font-size: 14px;")
+        status_layout.addWidget(self.primary_label)
+        
+        self.layout.addLayout(status_layout)
+
+        # Fish counter label
+        self.fish_counter_label = QLabel(f"Number of Fish: {len(self.replica.fish_list)}")
+        self.fish_counter_label.setStyleSheet("font-size: 14px;")
+        self.layout.addWidget(self.fish_counter_label)
+        
+        # Replicas status
+        self.replicas_label = QLabel("Connected Replicas: None")
+        self.replicas_label.setStyleSheet("font-size: 14px;")
+        self.layout.addWidget(self.replicas_label)
+
+        # Button layout
+        button_layout = QHBoxLayout()
+        
+        # Add Fish button
+        self.add_fish_button = QPushButton("Add Fish")
+        self.add_fish_button.clicked.connect(self.add_fish)
+        button_layout.addWidget(self.add_fish_button)
+        
+        # Force Primary button
+        self.force_primary_button = QPushButton("Force Primary")
+        self.force_primary_button.clicked.connect(self.force_primary)
+        button_layout.addWidget(self.force_primary_button)
+        
+        # NEW: Replica Details button
+        self.replica_details_button = QPushButton("Replica Details")
+        self.replica_details_button.clicked.connect(self.print_replica_details)
+        button_layout.addWidget(self.replica_details_button)
+
+        # Quit button
+        self.quit_button = QPushButton("Quit")
+        self.quit_button.clicked.connect(self.quit_application)
+        button_layout.addWidget(self.quit_button)
+        
+        self.layout.addLayout(button_layout)
+
+        # Fish layer over the pond, kept between frames
+        self.canvas = PondCanvas(self.pond_image)
+        canvas_layout = QVBoxLayout(self.pond_image)
+        canvas_layout.setContentsMargins(0, 0, 0, 0)
+        canvas_layout.addWidget(self.canvas)
+
+        # Repaint at most once per frame, with whatever changed since the last one
+        self.frame_timer = QTimer()
+        self.frame_timer.timeout.connect(self.update_pond)
+        self.frame_timer.start(max(1, int(1000 / fps)))
+    
+    def handle_status_update(self, data):
+        """Enhanced status update to reflect primary changes"""
+        self.show_replicas()
+        
+        # Explicit primary status update
+        if self.replica.is_primary:
+            self.primary_label.setText("Role: PRIMARY")
+            self.primary_label.setStyleSheet("font-size: 14px; color: green; font-weight: bold;")
+        else:
+            self.primary_label.setText("Role: Replica")
+            self.primary_label.setStyleSheet("font-size: 14px;")
+
+    def show_replicas(self, data=None):
+        """List the replicas the membership read last found"""
+        self.replicas_label.setText(f"Connected Replicas: {', '.join(sorted(list(self.replica.known_replicas)))}")
+
+    def add_fish(self):
+        """Add a fish to the pond"""
+        fish = Fish(f"Fish{random.randint(1000, 9999)}", self.replica.name, 15)
+        self.replica.add_fish(fish)
+        self.coalescer.mark_dirty([fish.id])
+
+    def force_primary(self):
+        """Force this replica to become primary and print replica statuses"""
+        self.replica.declare_primary()
+        self.primary_label.setText("Role: PRIMARY")
+        self.primary_label.setStyleSheet("font-size: 14px; color: green; font-weight: bold;")
+        
+        # Print replica statuses
+        print("\n--- Replica Status Report ---")
+        current_time = time.time()
+        
+        # Summarize current known replicas
+        print(f"Total Known Replicas: {len(self.replica.known_replicas)}")
+        
+        for replica_id, replica_info in list(self.replica.known_replicas.items()):
+            # Calculate time since last seen
+            time_since_seen = current_time - replica_info.get('last_seen', 0)
+            
+            # Determine status
+            status = "Active" if time_since_seen < 15 else "Inactive"
+            primary_status = "PRIMARY" if replica_info.get('is_primary', False) else "Replica"
+            
+            print(f"Replica ID: {replica_id}")
+            print(f"  Status: {status}")
+            print(f"  Role: {primary_status}")
+            print(f"  Last Seen: {time_since_seen:.2f} seconds ago")
+            print("---")
+        
+        print("Forcibly declared this replica as PRIMARY")
+    
+    def print_replica_details(self):
+        """Print detailed information about known replicas"""
+        # Open a dialog to display replica details
+        details_dialog = QDialog(self)
+        details_dialog.setWindowTitle("Replica Details")
+        details_dialog.setGeometry(200, 200, 500, 400)
+        
+        # Layout for the dialog
+        layout = QVBoxLayout()
+        details_dialog.setLayout(layout)
+        
+        # Text area to show replica details
+        details_text = QTextEdit()
+        details_text.setReadOnly(True)
+        layout.addWidget(details_text)
+        
+        # Close button
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(details_dialog.close)
+        layout.addWidget(close_button)
+        
+        # Generate detailed replica information
+        details = ["--- Replica Status Report ---"]
+        details.append(f"Total Known Replicas: {len(self.replica.known_replicas)}")
+        details.append(f"Current Replica ID: {self.replica_id}")
+        details.append(f"Current Replica Role: {'PRIMARY' if self.replica.is_primary else 'Replica'}")
+        refresh = self.coalescer.stats()
+        details.append(f"UI Refresh: {refresh['events_received']} updates drawn in {refresh['frames']} frames "
+                       f"({refresh['events_coalesced']} coalesced)")
+        ticks = self.engine.stats()
+        details.append(f"Simulation: {ticks['steps']} ticks at {ticks['rate']:g} Hz, jitter p99 "
+                       f"{ticks['jitter_p99_ms']:.1f} ms, {ticks['overruns']} overruns, "
+                       f"{ticks['caught_up']} caught up, {ticks['dropped']} dropped\n")
+        
+        current_time = time.time()
+        
+        for replica_id, replica_info in list(self.replica.known_replicas.items()):
+            # Calculate time since last seen
+            time_since_seen = current_time - replica_info.get('last_seen', 0)
+            
+            # Determine status
+            status = "Active" if time_since_seen < 15 else "Inactive"
+            primary_status = "PRIMARY" if replica_info.get('is_primary', False) else "Replica"
+            
+            replica_details = [
+                f"Replica ID: {replica_id}",
+                f"  Status: {status}",
+                f"  Role: {primary_status}",
+                f"  Last Seen: {time_since_seen:.2f} seconds ago",
+                "---"
+            ]
+            details.extend(replica_details)
+        
+        # Set the text in the text area
+        details_text.setText("\n".join(details))
+        
+        # Show the dialog
+        details_dialog.exec_()
+    
+    def recover_from_crash(self):
+        """Recover from a simulated crash"""
+        self.setWindowTitle(f"Pond Replica {self.replica_id} - RECOVERED")
+        self.status_label.setText(f"Pond: {self.replica.name} (Replica {self.replica_id} - RECOVERED)")
+        self.status_label.setStyleSheet("font-size: 16px; font-weight: bold; color: green;")
+        
+        # Reload the local snapshot, then sync what changed since
+        self.replica.recover()
+        
+        # Reset crash UI after a moment
+        QTimer.singleShot(3000, self.reset_crash_ui)
+    
+    def reset_crash_ui(self):
+        """Reset the UI after crash recovery"""
+        self.setWindowTitle(f"Pond Replica {self.replica_id}")
+        self.status_label.setText(f"Pond: {self.replica.name} (Replica {self.replica_id})")
+        self.status_label.setStyleSheet("font-size: 16px; font-weight: bold;")
+
+    def update_fish_display(self, fish_ids=ALL):
+        """Update the fish display, only for the given fish ids if known"""
+        # Copy the rows out under the lock and draw from the copy, so a fish
+        # detached or moved by another thread meanwhile cannot fail this slot
+        with self.replica.store_lock:
+            sprites = self.replica.fish_store.sprites(None if fish_ids is ALL else fish_ids)
+        if fish_ids is ALL:
+            self.canvas.sync(sprites)
+        else:
+            self.canvas.sync_ids(fish_ids, sprites)
+
+    def update_pond(self):
+        """Render one frame from the changes coalesced since the last one"""
+        fish_ids = self.coalescer.take()
+        if fish_ids is None:
+            return  # Nothing changed
+        self.update_fish_display(fish_ids)
+        self.update_fish_counter()
+        
+        # Always update primary label to reflect current state
+        if self.replica.is_primary:
+            self.primary_label.setText("Role: PRIMARY")
+            self.primary_label.setStyleSheet("font-size: 14px; color: green; font-weight: bold;")
+        else:
+            self.primary_label.setText("Role: Replica")
+            self.primary_label.setStyleSheet("font-size: 14px;")
+            
+    def update_fish_counter(self):
+        """Update the fish counter"""
+        self.fish_counter_label.setText(f"Number of Fish: {len(self.replica.fish_list)}")
+
+    def quit_application(self):
+        """Quit the application with proper primary reassignment"""
+        # Stop ticking, and if this is the primary node, attempt to reassign
+        self.engine.shutdown()
+        
+        # Close the application
+        QApplication.quit()
+
+
+def launch_ui(replica, replica_id, fps=DEFAULT_FPS, tick_interval=TICK_INTERVAL):
+    """Run the Qt window for a replica until it is closed"""
+    app = QApplication(sys.argv)
+    engine = PondEngine(replica, tick_interval)
+    ui = PondUI(replica, replica_id, engine, fps)
+    ui.show()
+    engine.start()
+    replica.announce()
+    sys.exit(app.exec_())
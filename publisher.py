@@ -0,0 +1,139 @@
+"""Outbound publishing off the producer threads.
+
+Replicas publish from the engine tick, the Qt timer, the paho callback
+thread and the replication listener. Each publish used to be its own round
+trip on the caller's thread, so one slow Redis call stalled whichever of
+them made it. Publisher takes that work over:
+  - publish() and publish_many() append to a bounded queue and return at
+    once; when the queue is full they raise TransportBackpressure instead
+    of waiting
+  - one writer thread takes whatever is queued, up to MAX_FLUSH messages,
+    and hands it to the transport's write() as one pipelined round trip on
+    a pooled connection, so messages keep their publish order
+  - a failed flush is held and retried with backoff; replicas fill any gap
+    through catch-up anyway
+
+stats() reports the queue depth, flush sizes and per-flush latency.
+"""
+import collections
+import threading
+import time
+
+OUTBOUND_QUEUE_SIZE = 10000
+MAX_FLUSH = 500  # Messages per pipelined write
+CLOSE_TIMEOUT = 2  # Seconds close() waits for the queue to drain
+RETRY_MIN_DELAY = 0.5
+RETRY_MAX_DELAY = 10
+
+
+class TransportBackpressure(Exception):
+    """Raised when a publish would exceed the transport's outbound queue"""
+
+
+class Publisher:
+    def __init__(self, write, capacity=OUTBOUND_QUEUE_SIZE, max_flush=MAX_FLUSH):
+        self.write = write  # write(messages) sends (channel, payload) pairs in one round trip
+        self.capacity = capacity
+        self.max_flush = max_flush
+        self.queue = collections.deque()
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.running = False
+        self.thread = None
+        self.counters = {"published": 0, "flushes": 0, "rejected": 0, "publish_errors": 0}
+        self.max_depth = 0
+        self.last_flush_size = 0
+        self.max_flush_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def publish(self, channel, payload):
+        self.publish_many([(channel, payload)])
+
+    def publish_many(self, messages):
+        """Queue messages for the writer without blocking, or raise TransportBackpressure"""
+        with self.condition:
+            if len(self.queue) + len(messages) > self.capacity:
+                self.counters["rejected"] += len(messages)
+                raise TransportBackpressure(f"outbound queue full ({self.capacity} messages)")
+            self.queue.extend(messages)
+            self.max_depth = max(self.max_depth, len(self.queue))
+            self.condition.notify()
+
+    def take(self):
+        """Wait for queued messages and take up to max_flush of them"""
+        with self.condition:
+            while self.running and not self.queue:
+                self.condition.wait()
+            batch = [self.queue.popleft() for _ in range(min(len(self.queue), self.max_flush))]
+            self.in_flight = len(batch)
+            return batch
+
+    def run(self):
+        while self.running or self.queue:
+            batch = self.take()
+            if not batch:
+                continue
+            delay = RETRY_MIN_DELAY
+            written = False
+            while not written:
+                start = time.perf_counter()
+                try:
+                    self.write(batch)
+                    written = True
+                except Exception as e:
+                    self.counters["publish_errors"] += 1
+                    print(f"Publish failed, retrying: {e}")
+                    if not self.running:
+                        break  # Closing; nobody is left to retry for
+                    time.sleep(delay)
+                    delay = min(delay * 2, RETRY_MAX_DELAY)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self.condition:
+                self.in_flight = 0
+                self.condition.notify_all()
+                if not written:
+                    continue
+                self.counters["published"] += len(batch)
+                self.counters["flushes"] += 1
+                self.last_flush_size = len(batch)
+                self.max_flush_size = max(self.max_flush_size, len(batch))
+                self.last_flush_ms = elapsed_ms
+                self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+                self.total_flush_ms += elapsed_ms
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been written, returns False on timeout"""
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.queue and not self.in_flight, timeout)
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """Write what is still queued, then stop the writer"""
+        if self.thread is None:
+            return
+        self.flush(timeout)
+        with self.condition:
+            self.running = False
+            self.queue.clear()
+            self.condition.notify_all()
+        self.thread.join(timeout)
+
+    def stats(self):
+        flushes = self.counters["flushes"]
+        return dict(
+            self.counters,
+            queue_depth=len(self.queue),
+            max_queue_depth=self.max_depth,
+            last_flush_size=self.last_flush_size,
+            max_flush_size=self.max_flush_size,
+            mean_flush_size=self.counters["published"] / flushes if flushes else 0.0,
+            last_flush_ms=self.last_flush_ms,
+            max_flush_ms=self.max_flush_ms,
+            mean_flush_ms=self.total_flush_ms / flushes if flushes else 0.0
+        )
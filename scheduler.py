@@ -0,0 +1,108 @@
+"""Fixed-timestep scheduler for the simulation tick.
+
+The pond used to advance whenever a timer fired, first the Qt window's
+QTimer and then a sleep loop, so a busy thread made ticks slip and the
+lifetime clock drift. FixedStepScheduler runs on its own thread and calls
+``step(dt)`` with the same dt every time, at rate steps per second of wall
+time:
+  - steps are due at fixed points (start + n * dt), not dt after the last
+    one finished, so slow steps do not accumulate drift
+  - when it falls behind it runs the missed steps back to back, up to
+    max_catch_up of them; anything beyond that is dropped and counted,
+    so simulated time slips instead of a stall turning into a burst
+  - it measures how late each step started (jitter), how long steps took,
+    and how many ran over their dt (overruns)
+
+The simulation decides what a step means for dt. PondReplica.update(dt)
+still takes one second off every fish's lifetime per simulated second,
+whatever the rate. Rendering only samples the latest state, so the rate
+is independent of UI cost.
+"""
+import threading
+import time
+from collections import deque
+
+TICK_RATE = 1.0  # Steps per second
+MAX_CATCH_UP = 5  # Missed steps run back to back before the rest are dropped
+STATS_WINDOW = 1000  # Recent steps the jitter and duration stats cover
+
+
+class FixedStepScheduler:
+    def __init__(self, step, rate=TICK_RATE, max_catch_up=MAX_CATCH_UP, name="tick"):
+        self.step = step
+        self.rate = rate
+        self.dt = 1.0 / rate
+        self.max_catch_up = max_catch_up
+        self.name = name
+        self.running = False
+        self.thread = None
+        self.wake = threading.Event()
+        self.started_at = None
+        self.lateness = deque(maxlen=STATS_WINDOW)  # Seconds each recent step started after it was due
+        self.durations = deque(maxlen=STATS_WINDOW)
+        self.counters = {"steps": 0, "caught_up": 0, "dropped": 0, "overruns": 0, "errors": 0}
+
+    def start(self):
+        """Run the steps on a background thread"""
+        if self.running:
+            return
+        self.running = True
+        self.wake.clear()
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=max(self.dt * 2, 1))
+
+    def run(self):
+        # The first step is due one dt in, giving peers' status messages time to arrive
+        self.started_at = time.monotonic()
+        due = self.started_at + self.dt
+        while self.running:
+            self.wake.wait(max(0, due - time.monotonic()))
+            if not self.running:
+                break
+            now = time.monotonic()
+            behind = int((now - due) / self.dt)  # Steps due since this one, beyond it
+            if behind > self.max_catch_up:
+                skipped = behind - self.max_catch_up
+                self.counters["dropped"] += skipped
+                due += skipped * self.dt
+                behind = self.max_catch_up
+            self.counters["caught_up"] += behind
+            for _ in range(behind + 1):
+                started = time.monotonic()
+                self.lateness.append(max(0.0, started - due))
+                try:
+                    self.step(self.dt)
+                except Exception as e:
+                    self.counters["errors"] += 1
+                    print(f"Error in {self.name} step: {e}")
+                duration = time.monotonic() - started
+                self.durations.append(duration)
+                self.counters["steps"] += 1
+                if duration > self.dt:
+                    self.counters["overruns"] += 1
+                due += self.dt
+                if not self.running:
+                    break
+
+    def stats(self):
+        lateness = sorted(self.lateness)
+        durations = list(self.durations)
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        simulated = self.counters["steps"] * self.dt
+        return {
+            "rate": self.rate,
+            **self.counters,
+            "jitter_mean_ms": sum(lateness) / len(lateness) * 1000 if lateness else 0.0,
+            "jitter_p99_ms": lateness[min(len(lateness) - 1, int(len(lateness) * 0.99))] * 1000 if lateness else 0.0,
+            "jitter_max_ms": lateness[-1] * 1000 if lateness else 0.0,
+            "step_mean_ms": sum(durations) / len(durations) * 1000 if durations else 0.0,
+            "step_max_ms": max(durations, default=0.0) * 1000,
+            # How far simulated time trails wall time; grows only with dropped steps
+            "behind_s": max(0.0, elapsed - self.dt - simulated) if self.started_at else 0.0
+        }
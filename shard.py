@@ -0,0 +1,85 @@
+"""Hash sharding of the pond across owner replicas.
+
+In sharded mode every live replica that advertises ``sharded`` owns a share
+of the fish and ticks only that share: it ages, moves and migrates its fish
+and publishes a ``shard_delta`` for them. The primary keeps everything that
+needs a single writer: MQTT, inbound fish, sequenced adds/removes and the
+actual sending of migrating fish.
+
+Fish are assigned with rendezvous hashing over the sorted owner ids: each
+fish goes to the owner with the highest mix(fish key ^ owner key). When an
+owner joins or leaves, only the fish it wins or held change hands, and
+every replica computes the same assignment from its membership view.
+
+Shard deltas carry a per-owner ``shard_seq``. A replica that sees a gap in
+an owner's sequence cannot replay it from the primary's log, so it falls
+back to a full state transfer.
+"""
+import hashlib
+
+import numpy as np
+
+MASK = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def fish_key(fish_id):
+    """64-bit hash key of a fish or replica id"""
+    if isinstance(fish_id, str) and len(fish_id) == 36 and fish_id[8] == "-":
+        try:
+            return int(fish_id[:8] + fish_id[9:13] + fish_id[14:18], 16)
+        except ValueError:
+            pass
+    return int.from_bytes(hashlib.blake2b(str(fish_id).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def mix(keys):
+    """splitmix64 finalizer, vectorized over uint64 keys"""
+    keys = keys ^ (keys >> np.uint64(30))
+    keys = keys * np.uint64(0xBF58476D1CE4E5B9)
+    keys = keys ^ (keys >> np.uint64(27))
+    keys = keys * np.uint64(0x94D049BB133111EB)
+    return keys ^ (keys >> np.uint64(31))
+
+
+def owner_index(keys, owners):
+    """Index into owners of each key's rendezvous winner"""
+    best = np.zeros(len(keys), dtype=np.intp)
+    best_score = None
+    for index, owner in enumerate(owners):
+        score = mix(keys ^ np.uint64(fish_key(owner)))
+        if best_score is None:
+            best_score = score
+            continue
+        wins = score > best_score
+        best[wins] = index
+        best_score = np.where(wins, score, best_score)
+    return best
+
+
+class ShardMap:
+    """Which slots this replica owns, for the current owner set"""
+    def __init__(self, replica_id):
+        self.replica_id = replica_id
+        self.owners = [replica_id]
+        self.rebalances = 0
+        self.owned = 0
+
+    def update_owners(self, owners):
+        owners = sorted(set(owners) | {self.replica_id})
+        if owners != self.owners:
+            print(f"Shard ownership rebalanced across {len(owners)} owner(s): {', '.join(owners)}")
+            self.owners = owners
+            self.rebalances += 1
+
+    def owned_slots(self, store):
+        n = len(store)
+        if len(self.owners) == 1:
+            slots = np.arange(n)
+        else:
+            winners = owner_index(store.key[:n], self.owners)
+            slots = np.flatnonzero(winners == self.owners.index(self.replica_id))
+        self.owned = len(slots)
+        return slots
+
+    def stats(self):
+        return {"owners": len(self.owners), "rebalances": self.rebalances, "owned": self.owned}
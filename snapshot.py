@@ -0,0 +1,197 @@
+"""Pond snapshots for fast cold start and crash recovery.
+
+A snapshot is the pond's columns plus the sequence number of the last
+mutation they include:
+
+    MAGIC | VERSION | last_seq | fish count | x | y | lifetime | pond_code | strings
+
+The numeric columns are the FishStore arrays as raw little-endian bytes, so
+saving and loading them costs a memcpy. Ids, names and genesis pond names go
+in one trailing JSON block, along with the epoch (primary term) that
+numbered last_seq, since a seq is only ordered within its term.
+
+On startup a replica loads the newest snapshot it can find and then asks the
+primary only for mutations after its last_seq. The epoch, last_seq and the columns
+are copied together under the replica's store lock. A catch-up that
+replays mutations the snapshot already has would still be harmless,
+because every replication message is idempotent (adds skip known ids,
+removes skip unknown ones and updates overwrite).
+"""
+import json
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b"FHSN"
+VERSION = 1
+HEADER = struct.Struct("<4sHqI")
+SNAPSHOT_INTERVAL = 10  # Seconds between periodic snapshots
+
+
+def capture(replica):
+    """Serialize a replica's pond into a snapshot"""
+    store = replica.fish_store
+    # Under the store lock, so a swap-remove cannot pair one fish's id with another's row
+    with replica.store_lock:
+        epoch, last_seq = replica.applied_epoch, replica.last_seq
+        fish = list(store.fish)
+        n = len(fish)
+        ids = [f.id for f in fish]
+        names = [f.name for f in fish]
+        ponds = list(store.pond_names)
+        columns = (
+            store.x[:n].astype("<i4").tobytes(),
+            store.y[:n].astype("<i4").tobytes(),
+            store.lifetime[:n].astype("<i4").tobytes(),
+            store.pond_code[:n].astype("<i2").tobytes(),
+        )
+    strings = {"epoch": epoch, "ponds": ponds, "ids": ids, "names": names}
+    return b"".join((
+        HEADER.pack(MAGIC, VERSION, last_seq, n),
+        *columns,
+        json.dumps(strings, separators=(",", ":")).encode("utf-8"),
+    ))
+
+
+def decode(payload):
+    """Returns (last_seq, columns) from a snapshot, raises ValueError if it is not one"""
+    if len(payload) < HEADER.size:
+        raise ValueError("truncated snapshot")
+    magic, version, last_seq, n = HEADER.unpack_from(payload)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a pond snapshot")
+    offset = HEADER.size
+    columns = {}
+    for column, dtype in (("x", "<i4"), ("y", "<i4"), ("lifetime", "<i4"), ("pond_code", "<i2")):
+        columns[column] = np.frombuffer(payload, dtype=dtype, count=n, offset=offset)
+        offset += columns[column].nbytes
+    columns.update(json.loads(payload[offset:]))
+    return last_seq, columns
+
+
+class FileSnapshotStore:
+    """One snapshot file per replica, replaced atomically on every save"""
+    shared = False
+
+    def __init__(self, path):
+        self.path = path
+
+    def save(self, payload):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class RedisSnapshotStore:
+    """A snapshot in a Redis hash shared by the whole pond, written by the primary"""
+    shared = True
+
+    def __init__(self, redis_client, key):
+        self.redis_client = redis_client
+        self.key = key
+
+    def save(self, payload, replica_id=None, last_seq=None):
+        self.redis_client.hset(self.key, mapping={
+            "data": payload,
+            "last_seq": last_seq or 0,
+            "replica_id": replica_id or "",
+            "saved_at": time.time()
+        })
+
+    def load(self):
+        return self.redis_client.hget(self.key, "data")
+
+
+class Snapshotter:
+    def __init__(self, replica, stores, interval=SNAPSHOT_INTERVAL):
+        self.replica = replica
+        self.stores = list(stores)
+        self.interval = interval
+        self.saved_position = None
+        self.running = False
+        self.thread = None
+        self.stats = {"saves": 0, "save_ms": 0.0, "bytes": 0, "loaded_seq": None, "load_ms": 0.0}
+
+    def load(self):
+        """Restore the newest snapshot found in any store, returns True if one was loaded"""
+        start = time.perf_counter()
+        best = None
+        for store in self.stores:
+            try:
+                payload = store.load()
+                if payload is None:
+                    continue
+                last_seq, columns = decode(payload)
+            except Exception as e:
+                print(f"Ignoring unreadable snapshot from {type(store).__name__}: {e}")
+                continue
+            position = (columns.get("epoch", 0), last_seq)
+            if best is None or position > best[0]:
+                best = (position, columns)
+        if best is None:
+            return False
+
+        (_, last_seq), columns = best
+        self.replica.restore_snapshot(last_seq, columns)
+        self.saved_position = best[0]
+        self.stats["loaded_seq"] = last_seq
+        self.stats["load_ms"] = (time.perf_counter() - start) * 1000
+        print(f"Restored {len(columns['ids'])} fish from snapshot at seq {last_seq}")
+        return True
+
+    def save(self, force=False):
+        """Write a snapshot to every store if anything changed since the last one"""
+        last_seq = self.replica.last_seq
+        position = (self.replica.applied_epoch, last_seq)
+        if not force and position == self.saved_position:
+            return False
+        start = time.perf_counter()
+        payload = capture(self.replica)
+        for store in self.stores:
+            if store.shared and not self.replica.is_primary:
+                continue  # Only the primary's view goes into the shared snapshot
+            try:
+                if store.shared:
+                    store.save(payload, self.replica.replica_id, last_seq)
+                else:
+                    store.save(payload)
+            except Exception as e:
+                print(f"Snapshot save to {type(store).__name__} failed: {e}")
+        self.saved_position = position
+        self.stats["saves"] += 1
+        self.stats["save_ms"] = (time.perf_counter() - start) * 1000
+        self.stats["bytes"] = len(payload)
+        return True
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            time.sleep(self.interval)
+            if not self.running:
+                break
+            try:
+                self.save()
+            except Exception as e:
+                print(f"Snapshot error: {e}")
+
+    def stop(self):
+        """Stop the periodic thread and take a final snapshot"""
+        self.running = False
+        self.save()
@@ -0,0 +1,136 @@
+"""Uniform grid over fish positions.
+
+The pond is cut into CELL_SIZE squares, small enough that a 100k-fish pond
+has a few dozen fish per cell. The FishStore keeps a ``cell`` column next to x/y and updates it wherever a
+position is written, so the grid never rescans positions on its own.
+SpatialGrid groups slots by cell with one radix sort of that column, redone
+only when a position or the fish set changed since the last query, and
+answers region and nearest-neighbour queries from the cells they touch.
+
+Crowding is judged on coarser DENSITY_CELL squares, one fish sprite each:
+only fish beyond a square's capacity are sent away, instead of the whole
+pond once it passes a global threshold. The Qt canvas buckets its sprites
+the same way to draw only the exposed part of the pond.
+"""
+import numpy as np
+
+POND_WIDTH = 550
+POND_HEIGHT = 350
+CELL_SIZE = 10
+DENSITY_CELL = 50  # Matches the sprite size
+GRID_COLUMNS = POND_WIDTH // CELL_SIZE + 1  # Positions are clamped to the inclusive edge
+GRID_ROWS = POND_HEIGHT // CELL_SIZE + 1
+CELL_COUNT = GRID_COLUMNS * GRID_ROWS
+
+
+def cell_of(x, y):
+    """Cell index of a position; off-pond positions use the edge cell"""
+    return (min(max(y, 0), POND_HEIGHT) // CELL_SIZE) * GRID_COLUMNS + min(max(x, 0), POND_WIDTH) // CELL_SIZE
+
+
+def cells_of(x, y):
+    """Cell indices of position arrays"""
+    return (np.clip(y, 0, POND_HEIGHT) // CELL_SIZE) * GRID_COLUMNS + np.clip(x, 0, POND_WIDTH) // CELL_SIZE
+
+
+def ranks_in_cell(cells):
+    """Position of each entry among the entries of the same cell, in order"""
+    order = np.argsort(cells, kind="stable")
+    sorted_cells = cells[order]
+    starts = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+    run_lengths = np.diff(np.r_[starts, len(cells)])
+    ranks = np.empty(len(cells), dtype=np.intp)
+    ranks[order] = np.arange(len(cells)) - np.repeat(starts, run_lengths)
+    return ranks
+
+
+class SpatialGrid:
+    """Region and nearest-neighbour queries over a FishStore's cell column"""
+    def __init__(self, store):
+        self.store = store
+        self.version = None
+        self.order = np.zeros(0, dtype=np.intp)
+        self.starts = np.zeros(CELL_COUNT + 1, dtype=np.intp)
+        self.rebuilds = 0
+
+    def refresh(self):
+        store = self.store
+        if self.version == store.version:
+            return
+        cells = store.cell[:len(store)]
+        self.order = np.argsort(cells, kind="stable")  # Radix sort on int16
+        self.starts = np.r_[0, np.cumsum(np.bincount(cells, minlength=CELL_COUNT))]
+        self.version = store.version
+        self.rebuilds += 1
+
+    def counts(self):
+        """Fish per cell"""
+        self.refresh()
+        return np.diff(self.starts)
+
+    def span(self, row, c0, c1):
+        """Slots in cells c0..c1 of one grid row, contiguous in the sorted order"""
+        return self.order[self.starts[row * GRID_COLUMNS + c0]:self.starts[row * GRID_COLUMNS + c1 + 1]]
+
+    def slots_in_rect(self, c0, r0, c1, r1):
+        """Slots in a block of cells, clipped to the grid"""
+        c0, c1 = max(0, c0), min(GRID_COLUMNS - 1, c1)
+        r0, r1 = max(0, r0), min(GRID_ROWS - 1, r1)
+        if c0 > c1 or r0 > r1:
+            return np.zeros(0, dtype=np.intp)
+        self.refresh()
+        return np.concatenate([self.span(row, c0, c1) for row in range(r0, r1 + 1)])
+
+    def region(self, x0, y0, x1, y1):
+        """Slots of the fish inside the rectangle, inclusive corners"""
+        slots = self.slots_in_rect(int(x0) // CELL_SIZE, int(y0) // CELL_SIZE,
+                                   int(x1) // CELL_SIZE, int(y1) // CELL_SIZE)
+        x, y = self.store.x[slots], self.store.y[slots]
+        return slots[(x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)]
+
+    def ring(self, column, row, radius):
+        """Slots in the cells exactly radius cells away from (column, row)"""
+        if radius == 0:
+            return self.slots_in_rect(column, row, column, row)
+        parts = [self.slots_in_rect(column - radius, row - radius, column + radius, row - radius),
+                 self.slots_in_rect(column - radius, row + radius, column + radius, row + radius),
+                 self.slots_in_rect(column - radius, row - radius + 1, column - radius, row + radius - 1),
+                 self.slots_in_rect(column + radius, row - radius + 1, column + radius, row + radius - 1)]
+        return np.concatenate(parts)
+
+    def nearest(self, x, y, k=1):
+        """Slots of the k fish closest to a point, nearest first"""
+        k = min(k, len(self.store))
+        if k == 0:
+            return np.zeros(0, dtype=np.intp)
+        column = min(max(int(x), 0), POND_WIDTH) // CELL_SIZE
+        row = min(max(int(y), 0), POND_HEIGHT) // CELL_SIZE
+        found = []
+        for radius in range(max(GRID_COLUMNS, GRID_ROWS)):
+            found.append(self.ring(column, row, radius))
+            candidates = np.concatenate(found)
+            if len(candidates) < k:
+                continue
+            distances = (self.store.x[candidates] - x) ** 2 + (self.store.y[candidates] - y) ** 2
+            # Any fish outside the searched square is at least as far as its nearest
+            # edge; sides at the pond's border have nothing beyond them
+            edges = [np.inf]
+            if column - radius > 0:
+                edges.append(x - (column - radius) * CELL_SIZE)
+            if column + radius < GRID_COLUMNS - 1:
+                edges.append((column + radius + 1) * CELL_SIZE - x)
+            if row - radius > 0:
+                edges.append(y - (row - radius) * CELL_SIZE)
+            if row + radius < GRID_ROWS - 1:
+                edges.append((row + radius + 1) * CELL_SIZE - y)
+            if np.partition(distances, k - 1)[k - 1] <= min(edges) ** 2:
+                break
+        return candidates[np.argsort(distances, kind="stable")[:k]]
+
+    def crowded(self, slots, capacity):
+        """Mask over slots of the fish beyond capacity in their density square"""
+        if len(slots) == 0:
+            return np.zeros(0, dtype=bool)
+        x, y = self.store.x[slots], self.store.y[slots]
+        squares = ((y // DENSITY_CELL) * (POND_WIDTH // DENSITY_CELL + 1) + x // DENSITY_CELL).astype(np.int16)
+        return ranks_in_cell(squares) >= capacity
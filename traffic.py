@@ -0,0 +1,153 @@
+"""Recording replication and MQTT traffic, and replaying it offline.
+
+A replica started with a Recorder writes every message it receives to a
+capture file:
+  - everything the transport delivers to handle_message(), with its channel
+  - everything the MQTT client delivers to on_mqtt_message(), with its topic
+
+A capture is a gzip stream of length-prefixed records:
+
+    MAGIC | VERSION | record | record | ...
+    record = source | dup | arrived_at | name length | payload length | name | payload
+
+arrived_at is the wall-clock arrival time and the payload is kept as
+received, so codec negotiation and decoding are replayed too. Captures are
+append-only: reopening one adds a gzip member, which gzip readers chain
+transparently. A capture cut short by a crash reads up to its last whole
+record.
+
+replay() feeds a capture into PondReplica instances, keeping the recorded
+spacing scaled by a speed factor (1, 10, ...), or as fast as they take it
+with speed=None. benchmarks/bench_replay.py wraps it with profiling.
+"""
+import gzip
+import os
+import struct
+import threading
+import time
+from collections import Counter, namedtuple
+
+MAGIC = b"FHTC"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sH")
+RECORD_HEADER = struct.Struct("<BBdHI")
+FLUSH_INTERVAL = 1.0  # Seconds between flushes, so a crash loses at most this much
+
+REPLICATION = 0  # Channel message from the transport
+MQTT = 1  # MQTT message from the broker
+
+Record = namedtuple("Record", "source name payload arrived_at dup")
+ReplayedMessage = namedtuple("ReplayedMessage", "topic payload dup")  # The parts of paho's MQTTMessage we read
+
+
+class Recorder:
+    def __init__(self, path, compresslevel=6):
+        self.path = path
+        self.lock = threading.Lock()
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = gzip.open(path, "ab", compresslevel=compresslevel)
+        if new:
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION))
+        self.flushed_at = time.monotonic()
+        self.counters = {"records": 0, "bytes": 0, "errors": 0}
+
+    def record(self, source, name, payload, dup=False):
+        """Append one message as it arrived; never raises into the caller"""
+        arrived_at = time.time()
+        try:
+            if isinstance(payload, str):
+                payload = payload.encode("utf-8")
+            name = name.encode("utf-8")
+            header = RECORD_HEADER.pack(source, int(bool(dup)), arrived_at, len(name), len(payload))
+            with self.lock:
+                if self.file is None:
+                    return
+                self.file.write(header + name + payload)
+                self.counters["records"] += 1
+                self.counters["bytes"] += RECORD_HEADER.size + len(name) + len(payload)
+                if time.monotonic() - self.flushed_at >= FLUSH_INTERVAL:
+                    self.file.flush()
+                    self.flushed_at = time.monotonic()
+        except Exception as e:
+            self.counters["errors"] += 1
+            print(f"Error recording traffic: {e}")
+
+    def record_replication(self, channel, payload):
+        self.record(REPLICATION, channel, payload)
+
+    def record_mqtt(self, msg):
+        self.record(MQTT, msg.topic, msg.payload, getattr(msg, "dup", False))
+
+    def stats(self):
+        return dict(self.counters)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def read(path):
+    """Yield the records of a capture in order"""
+    with gzip.open(path, "rb") as f:
+        header = f.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size:
+            return
+        magic, version = FILE_HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a traffic capture")
+        while True:
+            try:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                source, dup, arrived_at, name_length, payload_length = RECORD_HEADER.unpack(header)
+                body = f.read(name_length + payload_length)
+            except (EOFError, gzip.BadGzipFile):
+                return  # Cut short by a crash
+            if len(body) < name_length + payload_length:
+                return
+            yield Record(source, body[:name_length].decode("utf-8"), body[name_length:], arrived_at, bool(dup))
+
+
+def deliver(replica, record):
+    """Hand one record to a replica the way its transport or MQTT client would have"""
+    if record.source == REPLICATION:
+        replica.handle_message(record.name, record.payload)
+    elif record.source == MQTT:
+        replica.on_mqtt_message(None, None, ReplayedMessage(record.name, record.payload, record.dup))
+
+
+def replay(path, replicas, speed=1.0, sources=(REPLICATION, MQTT)):
+    """Feed a capture into every replica, speed times faster than recorded (None: no waiting).
+
+    Returns the number of records replayed per source, the elapsed time and
+    how far behind the recorded schedule the replay fell at most.
+    """
+    counts = Counter()
+    max_behind = 0.0
+    first_at = None
+    start = time.perf_counter()
+    for record in read(path):
+        if record.source not in sources:
+            continue
+        if speed:
+            if first_at is None:
+                first_at = record.arrived_at
+            due = start + (record.arrived_at - first_at) / speed
+            now = time.perf_counter()
+            if due > now:
+                time.sleep(due - now)
+            else:
+                max_behind = max(max_behind, now - due)
+        for replica in replicas:
+            deliver(replica, record)
+        counts["replication" if record.source == REPLICATION else "mqtt"] += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "records": sum(counts.values()),
+        **counts,
+        "elapsed_s": elapsed,
+        "max_behind_s": max_behind
+    }
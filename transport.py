@@ -0,0 +1,288 @@
+"""Replication transports.
+
+A transport moves encoded messages between replicas. The replica only ever
+calls ``start``, ``publish``, ``publish_many``, ``prune``, ``stats`` and
+``close``, and receives every inbound message through the handler passed to
+``start`` as ``handler(channel, payload)``. The primary calls
+``prune(live)`` after each membership read, so a transport can let go of
+whatever it keeps in Redis for replicas that are gone.
+
+PubSubTransport is the original blocking Redis pub/sub listener.
+StreamTransport carries the durable channels over Redis Streams so a
+replica that drops off replays what it missed from its consumer group. The
+streams are trimmed by age rather than length: a tick_delta holds the
+pond's updates, tens of kilobytes at 1k fish and megabytes at 100k, so a
+length cap would put no bound on memory. A replica away for longer than
+STREAM_RETENTION finds a gap in the sequence numbers and catches up from
+the primary instead.
+
+Both publish through a Publisher (see publisher.py), so callers only queue
+their messages and one writer thread pipelines them to Redis. The asyncio
+variant lives in async_transport so redis.asyncio (and the optional async
+MQTT client) are only imported when it is selected.
+"""
+import threading
+import time
+
+import redis
+
+from publisher import Publisher, TransportBackpressure
+
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 10
+
+STREAM_RETENTION = 60  # Seconds of durable traffic kept for replicas that drop off; memory grows with tick rate
+STREAM_READ_COUNT = 1000  # Entries per XREADGROUP, so a replay arrives in bulk
+STREAM_BLOCK_MS = 1000
+
+
+class PubSubTransport:
+    """Redis pub/sub with a blocking listener thread"""
+    name = "threaded"
+
+    def __init__(self, redis_client, channels):
+        self.redis_client = redis_client
+        self.channels = list(channels)
+        self.handler = None
+        self.on_reconnect = None
+        self.running = False
+        self.pubsub = None
+        self.publisher = Publisher(self.write)
+        self.counters = {"received": 0, "reconnects": 0, "handler_errors": 0}
+
+    def start(self, handler, on_reconnect=None):
+        """Subscribe, then listen on a background thread.
+
+        Subscribing happens before returning so that replies to anything the
+        replica publishes right after start (register, sync_request) are seen.
+        """
+        self.handler = handler
+        self.on_reconnect = on_reconnect
+        self.running = True
+        self.subscribe()
+        self.publisher.start()
+        self.thread = threading.Thread(target=self.listen, daemon=True)
+        self.thread.start()
+
+    def subscribe(self):
+        self.pubsub = self.redis_client.pubsub()
+        self.pubsub.subscribe(*self.channels)
+
+    def listen(self):
+        """Listen until closed, reconnecting in a loop rather than by recursion"""
+        delay = RECONNECT_MIN_DELAY
+        while self.running:
+            try:
+                for message in self.pubsub.listen():
+                    if not self.running:
+                        return
+                    if message['type'] != 'message':
+                        continue
+                    delay = RECONNECT_MIN_DELAY
+                    self.counters["received"] += 1
+                    self.dispatch(message['channel'].decode('utf-8'), message['data'])
+            except Exception as e:
+                if not self.running:
+                    return  # Closed underneath us
+                print(f"Error in replication listener: {e}")
+
+            # Try to reconnect, backing off while Redis stays unreachable
+            while self.running:
+                time.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                try:
+                    self.subscribe()
+                    break
+                except Exception as e:
+                    print(f"Replication reconnect failed: {e}")
+            if self.running:
+                self.counters["reconnects"] += 1
+                if self.on_reconnect:
+                    self.on_reconnect()
+
+    def dispatch(self, channel, payload):
+        try:
+            self.handler(channel, payload)
+        except Exception as e:
+            self.counters["handler_errors"] += 1
+            print(f"Error handling message on {channel}: {e}")
+
+    def publish(self, channel, payload):
+        self.publisher.publish(channel, payload)
+
+    def publish_many(self, messages):
+        """Queue (channel, payload) pairs for the writer, or raise TransportBackpressure"""
+        self.publisher.publish_many(messages)
+
+    def write(self, messages):
+        """Writer thread: PUBLISH a flush in one pipelined round trip on a pooled connection"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for channel, payload in messages:
+            pipe.publish(channel, payload)
+        pipe.execute()
+
+    def stats(self):
+        return dict(self.counters, transport=self.name, **self.publisher.stats())
+
+    def prune(self, live):
+        """Pub/sub keeps nothing in Redis per replica"""
+
+    def close(self):
+        self.publisher.close()
+        self.running = False
+        try:
+            self.pubsub.close()
+        except Exception:
+            pass
+
+
+class StreamTransport:
+    """Durable channels over Redis Streams, everything else over pub/sub.
+
+    Every replica reads the streams through its own consumer group, named
+    after the consumer id, and acknowledges entries once handled. Redis
+    keeps the group's position while the replica is away, so after a
+    reconnect or a restart under the same id it replays the missed tail
+    instead of needing a state transfer.
+    """
+    name = "streams"
+
+    def __init__(self, redis_client, channels, consumer, durable, retention=STREAM_RETENTION):
+        self.redis_client = redis_client
+        self.consumer = consumer
+        self.durable = [channel for channel in channels if channel in durable]
+        self.streams = {stream_key(channel): channel for channel in self.durable}
+        self.retention = retention
+        self.pubsub = PubSubTransport(redis_client, [c for c in channels if c not in durable])
+        self.publisher = Publisher(self.write)
+        self.handler = None
+        self.running = False
+        self.counters = {"received": 0, "acked": 0, "reconnects": 0, "handler_errors": 0, "pruned_groups": 0}
+
+    def start(self, handler, on_reconnect=None):
+        """Join the consumer groups, then read on a background thread.
+
+        on_reconnect is not needed for the durable channels, which replay on
+        their own; the pub/sub side carries nothing that needs repairing.
+        """
+        self.handler = handler
+        self.running = True
+        self.create_groups()
+        self.pubsub.start(handler)
+        self.publisher.start()
+        self.thread = threading.Thread(target=self.listen, daemon=True)
+        self.thread.start()
+
+    def create_groups(self):
+        """Create our group at the end of each stream, or keep its position if it exists"""
+        for key in self.streams:
+            try:
+                self.redis_client.xgroup_create(key, self.consumer, id="$", mkstream=True)
+            except redis.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    def listen(self):
+        # Entries delivered but never acknowledged (we died mid-batch) come first
+        ids = {key: "0" for key in self.streams}
+        delay = RECONNECT_MIN_DELAY
+        while self.running:
+            try:
+                while self.running:
+                    response = self.redis_client.xreadgroup(
+                        self.consumer, self.consumer, ids, count=STREAM_READ_COUNT, block=STREAM_BLOCK_MS
+                    )
+                    delay = RECONNECT_MIN_DELAY
+                    if not any(entries for _, entries in response or ()):
+                        if "0" in ids.values():
+                            ids = {key: ">" for key in self.streams}
+                        else:
+                            time.sleep(0.01)  # Some servers answer a BLOCK read straight away
+                        continue
+                    for key, entries in response:
+                        self.deliver(key.decode("utf-8"), entries)
+            except Exception as e:
+                if not self.running:
+                    return
+                print(f"Error in stream listener: {e}")
+
+            while self.running:
+                time.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                try:
+                    self.create_groups()  # The stream may have been deleted meanwhile
+                    break
+                except Exception as e:
+                    print(f"Stream reconnect failed: {e}")
+            if self.running:
+                self.counters["reconnects"] += 1
+            ids = {key: "0" for key in self.streams}
+
+    def deliver(self, key, entries):
+        channel = self.streams[key]
+        for entry_id, fields in entries:
+            self.counters["received"] += 1
+            try:
+                self.handler(channel, fields[b"d"])
+            except Exception as e:
+                self.counters["handler_errors"] += 1
+                print(f"Error handling message on {channel}: {e}")
+        self.redis_client.xack(key, self.consumer, *[entry_id for entry_id, _ in entries])
+        self.counters["acked"] += len(entries)
+
+    def publish(self, channel, payload):
+        self.publisher.publish(channel, payload)
+
+    def publish_many(self, messages):
+        """Queue (channel, payload) pairs for the writer, or raise TransportBackpressure"""
+        self.publisher.publish_many(messages)
+
+    def write(self, messages):
+        """Writer thread: XADD durable messages and PUBLISH the rest, in one pipelined round trip"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for channel, payload in messages:
+            if channel in self.durable:
+                pipe.xadd(stream_key(channel), {"d": payload}, minid=self.oldest_kept(), approximate=True)
+            else:
+                pipe.publish(channel, payload)
+        pipe.execute()
+
+    def oldest_kept(self):
+        """Stream id before which entries are trimmed"""
+        return f"{int((time.time() - self.retention) * 1000)}-0"
+
+    def prune(self, live):
+        """Destroy the consumer groups of departed replicas once they fall out of the retained window.
+
+        Until then a replica restarting under the same id still replays what
+        it missed. After that the entries behind its position are trimmed,
+        so the group replays nothing useful and only holds its pending list.
+        """
+        cutoff = stream_id(self.oldest_kept())
+        for key in self.streams:
+            for group in self.redis_client.xinfo_groups(key):
+                name = group["name"].decode("utf-8")
+                if name == self.consumer or name in live:
+                    continue
+                if stream_id(group["last-delivered-id"].decode("utf-8")) < cutoff:
+                    self.redis_client.xgroup_destroy(key, name)
+                    self.counters["pruned_groups"] += 1
+                    print(f"Dropped the stream consumer group of departed replica {name}")
+
+    def stats(self):
+        return dict(self.counters, transport=self.name, pubsub=self.pubsub.stats(), **self.publisher.stats())
+
+    def close(self):
+        self.publisher.close()
+        self.running = False
+        self.pubsub.close()
+
+
+def stream_key(channel):
+    return f"stream:{channel}"
+
+
+def stream_id(entry_id):
+    """A stream entry id as a comparable (milliseconds, sequence) pair"""
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)